@@ -7,11 +7,11 @@ from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 from flask_cors import CORS
 import os
-import logging
-from logging.handlers import RotatingFileHandler
+
+from app.db_routing import RoutingSession
 
 # Inicializamos las instancias
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 login_manager = LoginManager()
 migrate = Migrate()
 csrf = CSRFProtect()
@@ -29,7 +29,8 @@ login_manager.login_message_category = 'info'
 @login_manager.user_loader
 def load_user(user_id):
     from app.models import User
-    return User.query.get(int(user_id))
+    from app.cache import obtener_por_clave
+    return obtener_por_clave(User, int(user_id), ttl=300, excluir=('password_hash',))
 
 def create_app(config_name=None):
     """Factory pattern para crear la aplicación"""
@@ -47,10 +48,18 @@ def create_app(config_name=None):
     login_manager.init_app(app)
     migrate.init_app(app, db)
     
+    # Lecturas a la réplica en los endpoints de solo lectura
+    from app.db_routing import init_db_routing
+    init_db_routing(db)
+    
     # CSRF Protection - Excluir rutas API
     csrf.init_app(app)
     csrf.exempt('app.routes.api_login')
     
+    # Tokens firmados (Bearer) para la API mobile
+    from app.auth_tokens import init_token_auth
+    init_token_auth(login_manager)
+    
     # Rate limiting
     if app.config.get('RATELIMIT_ENABLED', True):
         limiter.init_app(app)
@@ -58,39 +67,76 @@ def create_app(config_name=None):
     # CORS para APIs
     CORS(app, resources={r"/api/*": {"origins": "*", "supports_credentials": True}})
     
-    # Logging
-    if not app.debug and not app.testing:
-        if not os.path.exists('logs'):
-            os.mkdir('logs')
-        file_handler = RotatingFileHandler('logs/turnero.log', maxBytes=10240, backupCount=10)
-        file_handler.setFormatter(logging.Formatter(
-            '%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]'
-        ))
-        file_handler.setLevel(logging.INFO)
-        app.logger.addHandler(file_handler)
-        app.logger.setLevel(logging.INFO)
-        app.logger.info('Turnero Municipal startup')
+    # Logging (JSON lines asíncrono, con request-id)
+    from app.logging_config import init_logging
+    init_logging(app)
+    app.logger.info('Turnero Municipal startup')
     
     # Registrar blueprints
     from app.routes import main
     from app.turns import turns_bp
     from app.notifications import notifications_bp
+    from app.metrics import metrics_bp, init_metrics
+    from app.catalog import catalog_bp
+    from app.appointments import citas_bp
+    from app.lobby import lobby_bp
+    from app.desks import puestos_bp
     
     app.register_blueprint(main)
     app.register_blueprint(turns_bp)
     app.register_blueprint(notifications_bp)
+    app.register_blueprint(metrics_bp)
+    app.register_blueprint(catalog_bp)
+    app.register_blueprint(citas_bp)
+    app.register_blueprint(lobby_bp)
+    app.register_blueprint(puestos_bp)
+    
+    # Las pantallas del hall refrescan cada pocos segundos todo el día
+    limiter.exempt(lobby_bp)
+    
+    # Comandos CLI de mantenimiento
+    from app.commands import register_commands
+    register_commands(app)
+    
+    # Caché de lecturas frecuentes (memoria del worker + archivo compartido opcional)
+    from app.cache import init_cache
+    init_cache(app)
+    
+    # Agrupación de notificaciones push por destinatario y cliente HTTP del gateway
+    from app.push_coalescer import init_coalescer
+    from app.push_client import init_push_client
+    init_coalescer(app)
+    init_push_client(app)
+    
+    # Recibos de entrega de Expo (opcional, si no se usa cron)
+    from app.push_receipts import init_receipts_poller
+    init_receipts_poller(app)
+    
+    # Cierre automático de turnos vencidos al final de la jornada
+    from app.sweeper import init_barrido
+    init_barrido(app)
+    
+    # Instrumentación por request (latencias, consultas SQL) y bus de eventos entre workers
+    from app.events import init_event_bus
+    with app.app_context():
+        init_metrics(app, db.engine)
+        init_event_bus(app, db.engine)
     
     # Excluir rutas API del CSRF
     csrf.exempt(turns_bp)
     csrf.exempt(notifications_bp)
+    csrf.exempt(catalog_bp)
+    csrf.exempt(citas_bp)
+    csrf.exempt(puestos_bp)
     
     # Context processors
     @app.context_processor
     def inject_config():
         """Inyectar configuración en los templates"""
+        from app.catalog import get_catalog
         return {
             'app_name': app.config.get('APP_NAME', 'Turnero Municipal'),
-            'areas': app.config.get('AREAS_MUNICIPALES_NORMALIZADAS', [])
+            'areas': get_catalog().areas
         }
     
     # Error handlers
@@ -112,10 +158,17 @@ def create_app(config_name=None):
     
     # Crear tablas
     with app.app_context():
-        from app.models import User, VisitorTurn, ChatMessage
-        from app.notifications import DeviceToken
+        from app.models import User, VisitorTurn, ChatMessage, Visitor, Area, CatalogVariant, CatalogVersion, RevokedToken
+        from app.models import AppointmentTemplate, AppointmentSlot, Appointment, TurnStatsHourly, TurnStatsDaily, JobCheckpoint
+        from app.models import Desk, DeskDailyStats, TurnEvent
+        from app.notifications import DeviceToken, PushTicket
+        from app.catalog import seed_catalog
         db.create_all()
         
+        # Catálogo inicial de áreas y variantes desde la configuración
+        if seed_catalog(app.config):
+            app.logger.info('Catálogo de áreas inicializado')
+        
         # Crear usuario admin por defecto si no existe
         if User.query.filter_by(username='admin').first() is None:
             admin = User(username='admin', email='admin@municipio.gob.ar', role='admin')
@@ -124,5 +177,10 @@ def create_app(config_name=None):
             db.session.commit()
             app.logger.info('Usuario admin creado')
     
+    # Índice en memoria para autocompletar visitantes (después de crear las tablas: la
+    # carga inicial lee visitor)
+    from app.typeahead import init_typeahead
+    init_typeahead(app)
+    
     return app
 
@@ -0,0 +1,454 @@
+"""
+Turnos programados: plantillas semanales por área, franjas con cupo y reservas
+"""
+from datetime import datetime, timedelta, time as dtime
+
+from flask import Blueprint, request, jsonify, current_app
+from flask_login import login_required, current_user
+from sqlalchemy import update, exists
+
+from . import db
+from .models import AppointmentTemplate, AppointmentSlot, Appointment, ahora_local
+from .utils import normalize_dni
+from .catalog import get_catalog
+
+citas_bp = Blueprint('citas', __name__, url_prefix='/api/citas')
+
+def _parse_hora(valor):
+    try:
+        return datetime.strptime(valor.strip(), '%H:%M').time()
+    except (AttributeError, ValueError):
+        return None
+
+def _parse_fecha(valor):
+    try:
+        return datetime.strptime(valor.strip(), '%Y-%m-%d').date()
+    except (AttributeError, ValueError):
+        return None
+
+def _inicios_del_dia(plantilla, fecha):
+    """Inicios de franja de una plantilla en una fecha (solo franjas completas)"""
+    paso = timedelta(minutes=plantilla.duracion_minutos)
+    inicio = datetime.combine(fecha, plantilla.hora_inicio)
+    limite = datetime.combine(fecha, plantilla.hora_fin)
+    while inicio + paso <= limite:
+        yield inicio
+        inicio += paso
+
+def generar_franjas(semanas=None, plantillas=None, desde=None):
+    """Crear las franjas faltantes del horizonte de reserva (idempotente, sin commit)"""
+    semanas = semanas or current_app.config.get('CITAS_HORIZONTE_SEMANAS', 4)
+    desde = desde or ahora_local().date()
+    hasta = desde + timedelta(weeks=semanas)
+    if plantillas is None:
+        plantillas = AppointmentTemplate.query.filter_by(is_active=True).all()
+    if not plantillas:
+        return 0
+    
+    areas = {p.area_key for p in plantillas}
+    existentes = set(
+        db.session.query(AppointmentSlot.area_key, AppointmentSlot.inicio)
+        .filter(
+            AppointmentSlot.area_key.in_(areas),
+            AppointmentSlot.inicio >= datetime.combine(desde, dtime.min),
+            AppointmentSlot.inicio < datetime.combine(hasta, dtime.min),
+        )
+        .all()
+    )
+    
+    nuevas = []
+    for plantilla in plantillas:
+        fecha = desde + timedelta(days=(plantilla.dia_semana - desde.weekday()) % 7)
+        while fecha < hasta:
+            for inicio in _inicios_del_dia(plantilla, fecha):
+                if (plantilla.area_key, inicio) in existentes:
+                    continue
+                existentes.add((plantilla.area_key, inicio))
+                nuevas.append({
+                    'area_key': plantilla.area_key,
+                    'template_id': plantilla.id,
+                    'inicio': inicio,
+                    'fin': inicio + timedelta(minutes=plantilla.duracion_minutos),
+                    'capacidad': plantilla.capacidad,
+                    'reservados': 0,
+                    'completo': False,
+                })
+            fecha += timedelta(weeks=1)
+    
+    if nuevas:
+        db.session.execute(AppointmentSlot.__table__.insert(), nuevas)
+    return len(nuevas)
+
+def reservar_cupo(slot_id):
+    """Ocupar un lugar de la franja de forma atómica; False si ya no hay cupo"""
+    filas = db.session.execute(
+        update(AppointmentSlot)
+        .where(AppointmentSlot.id == slot_id, AppointmentSlot.reservados < AppointmentSlot.capacidad)
+        .values(
+            reservados=AppointmentSlot.reservados + 1,
+            completo=AppointmentSlot.reservados + 1 >= AppointmentSlot.capacidad,
+        )
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    return filas == 1
+
+def liberar_cupo(slot_id):
+    """Devolver un lugar a la franja (vuelve a figurar como disponible si no está cerrada)"""
+    db.session.execute(
+        update(AppointmentSlot)
+        .where(AppointmentSlot.id == slot_id, AppointmentSlot.reservados > 0)
+        .values(
+            reservados=AppointmentSlot.reservados - 1,
+            completo=AppointmentSlot.reservados - 1 >= AppointmentSlot.capacidad,
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+def cerrar_reserva(cita_id, estado):
+    """Pasar una reserva RESERVADA a `estado` de forma atómica; False si otro pedido ya la cerró"""
+    filas = db.session.execute(
+        update(Appointment)
+        .where(Appointment.id == cita_id, Appointment.estado == 'RESERVADA')
+        .values(estado=estado)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    return filas == 1
+
+def prioridad_de_llegada(cita, ahora=None):
+    """TURNO_PROGRAMADO si llega dentro de la tolerancia de su franja; si no, NORMAL"""
+    ahora = ahora or ahora_local()
+    tolerancia = timedelta(minutes=current_app.config.get('CITAS_TOLERANCIA_MINUTOS', 15))
+    if cita.slot.inicio - tolerancia <= ahora <= cita.slot.fin + tolerancia:
+        return 'TURNO_PROGRAMADO'
+    return 'NORMAL'
+
+# ============================================
+# API
+# ============================================
+
+def _solo_admin():
+    if current_user.role != 'admin':
+        return jsonify({'success': False, 'message': 'No tienes acceso a esta sección'}), 403
+    return None
+
+def _solo_recepcion():
+    if current_user.role not in ['admin', 'recepcion']:
+        return jsonify({'success': False, 'message': 'No tienes acceso a esta sección'}), 403
+    return None
+
+def _validar_plantilla(data, plantilla=None):
+    """Aplicar los campos recibidos a la plantilla; devuelve (plantilla, error)"""
+    plantilla = plantilla or AppointmentTemplate()
+    dias_validos = {d['value'] for d in current_app.config.get('DIAS_SEMANA', [])}
+    
+    if 'area_key' in data or plantilla.area_key is None:
+        if not get_catalog().area(data.get('area_key')):
+            return None, f'Área no válida: {data.get("area_key")}'
+        plantilla.area_key = data['area_key']
+    if 'dia_semana' in data or plantilla.dia_semana is None:
+        try:
+            dia = int(data.get('dia_semana'))
+        except (TypeError, ValueError):
+            dia = None
+        if dia not in dias_validos:
+            return None, 'dia_semana debe ser uno de Config.DIAS_SEMANA (0 = lunes)'
+        plantilla.dia_semana = dia
+    for campo in ('hora_inicio', 'hora_fin'):
+        if campo in data or getattr(plantilla, campo) is None:
+            hora = _parse_hora(data.get(campo))
+            if hora is None:
+                return None, f'{campo} debe tener formato HH:MM'
+            setattr(plantilla, campo, hora)
+    for campo, minimo in (('duracion_minutos', 5), ('capacidad', 1)):
+        if campo in data:
+            try:
+                valor = int(data[campo])
+            except (TypeError, ValueError):
+                valor = 0
+            if valor < minimo:
+                return None, f'{campo} debe ser al menos {minimo}'
+            setattr(plantilla, campo, valor)
+    if plantilla.duracion_minutos is None:
+        plantilla.duracion_minutos = 15
+    if plantilla.capacidad is None:
+        plantilla.capacidad = 1
+    if 'is_active' in data:
+        plantilla.is_active = bool(data['is_active'])
+    
+    if plantilla.hora_fin <= plantilla.hora_inicio:
+        return None, 'hora_fin debe ser posterior a hora_inicio'
+    return plantilla, None
+
+def _encaja(plantilla, franja):
+    """La franja sigue coincidiendo con un inicio y duración del horario actual de la plantilla"""
+    return (
+        franja.inicio.weekday() == plantilla.dia_semana
+        and franja.fin - franja.inicio == timedelta(minutes=plantilla.duracion_minutos)
+        and franja.inicio in set(_inicios_del_dia(plantilla, franja.inicio.date()))
+    )
+
+def _ajustar_franjas(plantilla):
+    """Alinear las franjas futuras de una plantilla modificada o desactivada (sin commit).
+    
+    Las libres que nadie referencia se borran (generar_franjas las vuelve a crear con el
+    horario nuevo). Las que tienen reservas, activas o canceladas, no se pueden borrar
+    (appointment.slot_id las referencia): si la plantilla sigue activa y la franja encaja en
+    su horario toman la capacidad actual; si no, se cierran (capacidad 0) y solo conservan
+    sus reservas, así cancelar una no las vuelve a abrir.
+    """
+    futuras = AppointmentSlot.query.filter(
+        AppointmentSlot.template_id == plantilla.id,
+        AppointmentSlot.inicio >= ahora_local(),
+    )
+    con_historial = exists().where(Appointment.slot_id == AppointmentSlot.id)
+    futuras.filter(AppointmentSlot.reservados == 0, ~con_historial).delete(synchronize_session=False)
+    
+    vigentes, cerradas = [], []
+    for franja in futuras.all():
+        (vigentes if plantilla.is_active and _encaja(plantilla, franja) else cerradas).append(franja.id)
+    if vigentes:
+        # reservados se lee en el UPDATE: una reserva concurrente no deja el flag desfasado
+        db.session.execute(
+            update(AppointmentSlot)
+            .where(AppointmentSlot.id.in_(vigentes))
+            .values(capacidad=plantilla.capacidad, completo=AppointmentSlot.reservados >= plantilla.capacidad)
+            .execution_options(synchronize_session=False)
+        )
+    if cerradas:
+        db.session.execute(
+            update(AppointmentSlot)
+            .where(AppointmentSlot.id.in_(cerradas))
+            .values(capacidad=0, completo=True)
+            .execution_options(synchronize_session=False)
+        )
+    db.session.expire_all()
+
+@citas_bp.route('/plantillas', methods=['GET'])
+@login_required
+def api_listar_plantillas():
+    """Listar plantillas semanales"""
+    query = AppointmentTemplate.query
+    area_key = request.args.get('area_key')
+    if area_key:
+        query = query.filter_by(area_key=area_key)
+    plantillas = query.order_by(AppointmentTemplate.area_key, AppointmentTemplate.dia_semana, AppointmentTemplate.hora_inicio).all()
+    
+    return jsonify({'success': True, 'data': [p.to_dict() for p in plantillas], 'count': len(plantillas)})
+
+@citas_bp.route('/plantillas', methods=['POST'])
+@login_required
+def api_crear_plantilla():
+    """Crear plantilla y generar sus franjas del horizonte - solo admin"""
+    denegado = _solo_admin()
+    if denegado:
+        return denegado
+    
+    plantilla, error = _validar_plantilla(request.get_json() or {})
+    if error:
+        return jsonify({'success': False, 'message': error}), 400
+    
+    db.session.add(plantilla)
+    db.session.flush()
+    creadas = generar_franjas(plantillas=[plantilla])
+    db.session.commit()
+    
+    return jsonify({'success': True, 'message': f'Plantilla creada ({creadas} franjas)', 'data': plantilla.to_dict()}), 201
+
+@citas_bp.route('/plantillas/<int:plantilla_id>', methods=['PUT'])
+@login_required
+def api_actualizar_plantilla(plantilla_id):
+    """Actualizar plantilla; las franjas libres se regeneran y las reservadas toman la capacidad nueva - solo admin"""
+    denegado = _solo_admin()
+    if denegado:
+        return denegado
+    
+    plantilla = AppointmentTemplate.query.get_or_404(plantilla_id)
+    plantilla, error = _validar_plantilla(request.get_json() or {}, plantilla)
+    if error:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': error}), 400
+    
+    _ajustar_franjas(plantilla)
+    creadas = generar_franjas(plantillas=[plantilla]) if plantilla.is_active else 0
+    db.session.commit()
+    
+    return jsonify({'success': True, 'message': f'Plantilla actualizada ({creadas} franjas nuevas)', 'data': plantilla.to_dict()})
+
+@citas_bp.route('/plantillas/<int:plantilla_id>', methods=['DELETE'])
+@login_required
+def api_desactivar_plantilla(plantilla_id):
+    """Desactivar plantilla: se cierran sus franjas futuras (las reservas existentes se mantienen) - solo admin"""
+    denegado = _solo_admin()
+    if denegado:
+        return denegado
+    
+    plantilla = AppointmentTemplate.query.get_or_404(plantilla_id)
+    plantilla.is_active = False
+    _ajustar_franjas(plantilla)
+    db.session.commit()
+    
+    return jsonify({'success': True, 'message': 'Plantilla desactivada', 'data': plantilla.to_dict()})
+
+@citas_bp.route('/disponibilidad', methods=['GET'])
+@login_required
+def api_disponibilidad():
+    """Franjas con cupo de un área (recorre el índice de disponibilidad, no las reservas)"""
+    area_key = request.args.get('area_key')
+    if not area_key:
+        return jsonify({'success': False, 'message': 'area_key es requerida'}), 400
+    
+    desde = _parse_fecha(request.args.get('desde'))
+    hasta = _parse_fecha(request.args.get('hasta'))
+    limite = min(request.args.get('limit', 50, type=int), 500)
+    
+    inicio = ahora_local()
+    if desde:
+        inicio = max(inicio, datetime.combine(desde, dtime.min))
+    
+    query = AppointmentSlot.query.filter(
+        AppointmentSlot.area_key == area_key,
+        AppointmentSlot.completo.is_(False),
+        AppointmentSlot.inicio >= inicio,
+    )
+    if hasta:
+        query = query.filter(AppointmentSlot.inicio < datetime.combine(hasta + timedelta(days=1), dtime.min))
+    franjas = query.order_by(AppointmentSlot.inicio).limit(limite).all()
+    
+    return jsonify({'success': True, 'data': [f.to_dict() for f in franjas], 'count': len(franjas)})
+
+@citas_bp.route('', methods=['GET'])
+@login_required
+def api_listar_citas():
+    """Reservas de un día (hoy por defecto), filtrables por área, DNI y estado"""
+    denegado = _solo_recepcion()
+    if denegado:
+        return denegado
+    
+    fecha = _parse_fecha(request.args.get('fecha')) or ahora_local().date()
+    query = Appointment.query.join(AppointmentSlot).filter(
+        AppointmentSlot.inicio >= datetime.combine(fecha, dtime.min),
+        AppointmentSlot.inicio < datetime.combine(fecha + timedelta(days=1), dtime.min),
+    )
+    if request.args.get('area_key'):
+        query = query.filter(Appointment.area_key == request.args['area_key'])
+    if request.args.get('estado'):
+        query = query.filter(Appointment.estado == request.args['estado'])
+    dni = normalize_dni(request.args.get('dni'))
+    if dni:
+        query = query.filter(Appointment.dni == dni)
+    citas = query.order_by(AppointmentSlot.inicio, Appointment.id).all()
+    
+    return jsonify({'success': True, 'data': [c.to_dict() for c in citas], 'count': len(citas)})
+
+@citas_bp.route('', methods=['POST'])
+@login_required
+def api_reservar():
+    """Reservar un lugar en una franja"""
+    denegado = _solo_recepcion()
+    if denegado:
+        return denegado
+    
+    data = request.get_json() or {}
+    nombre = (data.get('nombre') or '').strip()
+    if not nombre:
+        return jsonify({'success': False, 'message': 'Nombre es requerido'}), 400
+    
+    franja = AppointmentSlot.query.get(data.get('slot_id')) if data.get('slot_id') else None
+    if not franja:
+        return jsonify({'success': False, 'message': 'Franja no válida'}), 400
+    if franja.inicio < ahora_local():
+        return jsonify({'success': False, 'message': 'La franja ya pasó'}), 400
+    
+    dni = normalize_dni(data.get('dni'))
+    if dni and Appointment.query.filter_by(slot_id=franja.id, dni=dni, estado='RESERVADA').first():
+        return jsonify({'success': False, 'message': 'Ya existe una reserva para ese DNI en la franja'}), 400
+    
+    try:
+        if not reservar_cupo(franja.id):
+            db.session.rollback()
+            return jsonify({'success': False, 'message': 'La franja no tiene cupo disponible'}), 409
+        
+        cita = Appointment(
+            slot_id=franja.id,
+            area_key=franja.area_key,
+            nombre=nombre,
+            dni=dni,
+            motivo_texto=(data.get('motivo_texto') or '').strip() or None,
+            creado_por=current_user.username,
+        )
+        db.session.add(cita)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        current_app.logger.exception('Error reservando franja %s', franja.id)
+        return jsonify({'success': False, 'message': 'Error registrando la reserva'}), 500
+    
+    return jsonify({'success': True, 'message': 'Reserva registrada', 'data': cita.to_dict()}), 201
+
+@citas_bp.route('/<int:cita_id>/cancelar', methods=['POST'])
+@login_required
+def api_cancelar_cita(cita_id):
+    """Cancelar una reserva y liberar su lugar"""
+    denegado = _solo_recepcion()
+    if denegado:
+        return denegado
+    
+    cita = Appointment.query.get_or_404(cita_id)
+    if cita.estado != 'RESERVADA':
+        return jsonify({'success': False, 'message': 'La reserva no está activa'}), 400
+    
+    # Un doble envío no debe liberar el lugar dos veces
+    if not cerrar_reserva(cita.id, 'CANCELADA'):
+        db.session.rollback()
+        return jsonify({'success': False, 'message': 'La reserva ya fue cancelada o presentada'}), 409
+    liberar_cupo(cita.slot_id)
+    db.session.commit()
+    
+    return jsonify({'success': True, 'message': 'Reserva cancelada', 'data': cita.to_dict()})
+
+@citas_bp.route('/<int:cita_id>/presentar', methods=['POST'])
+@login_required
+def api_presentar_cita(cita_id):
+    """El visitante llegó: convertir la reserva en un turno de la cola del piso"""
+    from .turns import nuevo_turno, despues_de_crear_turno
+    
+    denegado = _solo_recepcion()
+    if denegado:
+        return denegado
+    
+    cita = Appointment.query.get_or_404(cita_id)
+    if cita.estado != 'RESERVADA':
+        return jsonify({'success': False, 'message': 'La reserva no está activa'}), 400
+    
+    area = get_catalog().area(cita.area_key)
+    if not area:
+        return jsonify({'success': False, 'message': f'Área no válida: {cita.area_key}'}), 400
+    
+    # Se reclama la reserva antes de crear el turno: un doble envío no genera dos turnos
+    if not cerrar_reserva(cita.id, 'PRESENTADA'):
+        db.session.rollback()
+        return jsonify({'success': False, 'message': 'La reserva ya fue cancelada o presentada'}), 409
+    
+    try:
+        turno = nuevo_turno(
+            area,
+            cita.nombre,
+            dni=cita.dni,
+            motivo_texto=cita.motivo_texto,
+            prioridad=prioridad_de_llegada(cita)
+        )
+        db.session.flush()
+        cita.turno_id = turno.id
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        current_app.logger.exception('Error presentando reserva %s', cita_id)
+        return jsonify({'success': False, 'message': 'Error creando el turno'}), 500
+    
+    despues_de_crear_turno(turno)
+    
+    return jsonify({
+        'success': True,
+        'message': 'Turno registrado desde la reserva',
+        'data': {'cita': cita.to_dict(), 'turno': turno.to_dict()}
+    }), 201
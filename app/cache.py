@@ -0,0 +1,411 @@
+"""
+Caché de la aplicación en dos niveles: un LRU con vencimiento en la memoria de cada proceso
+y, opcionalmente, un archivo SQLite compartido por los workers de la máquina (sin servicios
+externos). Así una lectura cara se calcula una vez por máquina y no una vez por worker.
+
+Cada entrada se guarda con la versión de sus etiquetas ('turnos', 'visitantes', 'user:5',
+...) tomada antes de calcularla; invalidar una etiqueta sube su versión y toda entrada con
+una versión anterior deja de valer en los dos niveles. Las versiones viven en el archivo
+compartido y cada proceso las relee como mucho cada CACHE_VERSIONES_SEGUNDOS. Las
+transiciones de turnos llegan por el bus de eventos e invalidan sus etiquetas; las filas
+cacheadas con obtener_por_clave se invalidan solas al modificarse por el ORM, en este proceso
+al confirmar y en los demás workers e instancias por el bus (evento 'cache.fila').
+"""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import Response, current_app, has_request_context, make_response, request
+from flask_login import current_user
+from sqlalchemy import event, inspect as sa_inspect
+from sqlalchemy.orm import make_transient_to_detached
+
+from . import db
+from .events import publicar_evento
+from .metrics import cache_requests_total, cache_invalidations_total
+
+# Etiquetas que invalida cada evento del bus
+ETIQUETAS_EVENTO = {
+    'turno.creado': ('turnos', 'visitantes'),
+    'turno.autorizado': ('turnos',),
+    'turno.atendido': ('turnos',),
+    'turno.rechazado': ('turnos',),
+    'turno.vencidos': ('turnos',),
+    'puesto.estado': ('puestos',),
+}
+# Fila cacheada por clave modificada en otro proceso: su etiqueta viaja en el evento
+EVENTO_FILA = 'cache.fila'
+
+_FALTA = object()
+
+def _espacio(clave):
+    return clave.split(':', 1)[0]
+
+class _Entrada:
+    __slots__ = ('valor', 'expira', 'versiones')
+    
+    def __init__(self, valor, expira, versiones):
+        self.valor = valor
+        self.expira = expira
+        self.versiones = versiones
+
+class _MemoriaLRU:
+    """Nivel en proceso: descarta la entrada usada hace más tiempo al pasar de `maximo`"""
+    
+    def __init__(self, maximo):
+        self.maximo = maximo
+        self._entradas = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def obtener(self, clave):
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is not None:
+                self._entradas.move_to_end(clave)
+            return entrada
+    
+    def guardar(self, clave, entrada):
+        with self._lock:
+            self._entradas[clave] = entrada
+            self._entradas.move_to_end(clave)
+            while len(self._entradas) > self.maximo:
+                self._entradas.popitem(last=False)
+    
+    def borrar(self, clave):
+        with self._lock:
+            self._entradas.pop(clave, None)
+    
+    def __len__(self):
+        return len(self._entradas)
+
+class _ArchivoCompartido:
+    """Nivel compartido entre procesos: entradas serializadas y versiones de etiquetas en SQLite (WAL)"""
+    
+    PURGA_CADA = 500  # escrituras entre purgas de vencidas
+    
+    def __init__(self, ruta, maximo):
+        self.ruta = ruta
+        self.maximo = maximo
+        self._local = threading.local()
+        self._escrituras = 0
+    
+    def _conexion(self):
+        # Una conexión por hilo y por proceso (los workers de gunicorn se crean con fork)
+        conexion = getattr(self._local, 'conexion', None)
+        if conexion is not None and self._local.pid == os.getpid():
+            return conexion
+        conexion = sqlite3.connect(self.ruta, timeout=1, isolation_level=None, check_same_thread=False)
+        conexion.execute('PRAGMA journal_mode=WAL')
+        conexion.execute('PRAGMA synchronous=OFF')  # es una caché: perder escrituras al caer no importa
+        conexion.execute(
+            'CREATE TABLE IF NOT EXISTS entrada (clave TEXT PRIMARY KEY, valor BLOB NOT NULL, '
+            'expira REAL NOT NULL, versiones BLOB NOT NULL)'
+        )
+        conexion.execute('CREATE INDEX IF NOT EXISTS ix_entrada_expira ON entrada(expira)')
+        conexion.execute('CREATE TABLE IF NOT EXISTS etiqueta (nombre TEXT PRIMARY KEY, version INTEGER NOT NULL)')
+        self._local.conexion = conexion
+        self._local.pid = os.getpid()
+        return conexion
+    
+    def obtener(self, clave):
+        fila = self._conexion().execute(
+            'SELECT valor, expira, versiones FROM entrada WHERE clave = ? AND expira > ?', (clave, time.time())
+        ).fetchone()
+        if fila is None:
+            return None
+        return _Entrada(pickle.loads(fila[0]), fila[1], pickle.loads(fila[2]))
+    
+    def guardar(self, clave, entrada):
+        conexion = self._conexion()
+        conexion.execute(
+            'INSERT OR REPLACE INTO entrada (clave, valor, expira, versiones) VALUES (?, ?, ?, ?)',
+            (clave, pickle.dumps(entrada.valor, pickle.HIGHEST_PROTOCOL), entrada.expira,
+             pickle.dumps(entrada.versiones, pickle.HIGHEST_PROTOCOL)),
+        )
+        self._escrituras += 1
+        if self._escrituras % self.PURGA_CADA == 0:
+            self._purgar(conexion)
+    
+    def _purgar(self, conexion):
+        conexion.execute('DELETE FROM entrada WHERE expira <= ?', (time.time(),))
+        sobran = conexion.execute('SELECT COUNT(*) FROM entrada').fetchone()[0] - self.maximo
+        if sobran > 0:
+            conexion.execute(
+                'DELETE FROM entrada WHERE clave IN (SELECT clave FROM entrada ORDER BY expira LIMIT ?)', (sobran,)
+            )
+    
+    def borrar(self, clave):
+        self._conexion().execute('DELETE FROM entrada WHERE clave = ?', (clave,))
+    
+    def versiones(self):
+        return dict(self._conexion().execute('SELECT nombre, version FROM etiqueta').fetchall())
+    
+    def invalidar(self, etiquetas):
+        self._conexion().executemany(
+            'INSERT INTO etiqueta (nombre, version) VALUES (?, 1) '
+            'ON CONFLICT(nombre) DO UPDATE SET version = version + 1',
+            [(e,) for e in etiquetas],
+        )
+
+class Cache:
+    """LRU+TTL en memoria con un nivel compartido opcional e invalidación por etiquetas"""
+    
+    def __init__(self, maximo=2048, ttl=60, ruta=None, maximo_compartido=20000, verificacion=1.0, logger=None):
+        self.ttl = ttl
+        self.memoria = _MemoriaLRU(maximo)
+        self.compartido = _ArchivoCompartido(ruta, maximo_compartido) if ruta else None
+        self.verificacion = verificacion
+        self.logger = logger
+        self.cancelar = None
+        self._versiones = {}
+        self._verificado = 0.0
+        self._lock = threading.Lock()
+    
+    def _error(self, operacion, e):
+        # El nivel compartido nunca debe tirar un request: se sigue como si fuera un miss
+        if self.logger:
+            self.logger.warning('Caché compartida no disponible (%s): %s', operacion, e)
+    
+    def _versiones_vigentes(self):
+        if self.compartido is None or time.monotonic() - self._verificado < self.verificacion:
+            return self._versiones
+        with self._lock:
+            if time.monotonic() - self._verificado >= self.verificacion:
+                try:
+                    self._versiones = self.compartido.versiones()
+                except sqlite3.Error as e:
+                    self._error('versiones', e)
+                self._verificado = time.monotonic()
+        return self._versiones
+    
+    def versiones(self, etiquetas):
+        """Versión actual de cada etiqueta; tomarla antes de calcular el valor a guardar"""
+        vigentes = self._versiones_vigentes()
+        return {e: vigentes.get(e, 0) for e in etiquetas}
+    
+    def _vigente(self, entrada):
+        if entrada.expira <= time.time():
+            return False
+        vigentes = self._versiones_vigentes()
+        return all(vigentes.get(e, 0) == v for e, v in entrada.versiones.items())
+    
+    def obtener(self, clave, defecto=None):
+        espacio = _espacio(clave)
+        entrada = self.memoria.obtener(clave)
+        if entrada is not None and self._vigente(entrada):
+            cache_requests_total.inc(espacio=espacio, nivel='memoria', resultado='hit')
+            return entrada.valor
+        cache_requests_total.inc(espacio=espacio, nivel='memoria', resultado='miss')
+        if self.compartido is None:
+            return defecto
+        
+        try:
+            entrada = self.compartido.obtener(clave)
+        except (sqlite3.Error, pickle.UnpicklingError) as e:
+            self._error('lectura', e)
+            entrada = None
+        if entrada is not None and self._vigente(entrada):
+            cache_requests_total.inc(espacio=espacio, nivel='compartido', resultado='hit')
+            self.memoria.guardar(clave, entrada)
+            return entrada.valor
+        cache_requests_total.inc(espacio=espacio, nivel='compartido', resultado='miss')
+        return defecto
+    
+    def guardar(self, clave, valor, ttl=None, etiquetas=(), versiones=None):
+        """Guardar en los dos niveles; `versiones` debe tomarse antes de calcular el valor"""
+        entrada = _Entrada(valor, time.time() + (self.ttl if ttl is None else ttl),
+                           versiones if versiones is not None else self.versiones(etiquetas))
+        self.memoria.guardar(clave, entrada)
+        if self.compartido is not None:
+            try:
+                self.compartido.guardar(clave, entrada)
+            except (sqlite3.Error, pickle.PicklingError) as e:
+                self._error('escritura', e)
+    
+    def obtener_o_calcular(self, clave, calcular, ttl=None, etiquetas=()):
+        valor = self.obtener(clave, _FALTA)
+        if valor is not _FALTA:
+            return valor
+        versiones = self.versiones(etiquetas)
+        valor = calcular()
+        self.guardar(clave, valor, ttl, etiquetas, versiones)
+        return valor
+    
+    def borrar(self, clave):
+        self.memoria.borrar(clave)
+        if self.compartido is not None:
+            try:
+                self.compartido.borrar(clave)
+            except sqlite3.Error as e:
+                self._error('borrado', e)
+    
+    def invalidar(self, *etiquetas):
+        """Subir la versión de las etiquetas: sus entradas dejan de valer en todos los procesos"""
+        if not etiquetas:
+            return
+        for e in etiquetas:
+            cache_invalidations_total.inc(etiqueta=_espacio(e))
+        with self._lock:
+            if self.compartido is not None:
+                try:
+                    self.compartido.invalidar(etiquetas)
+                    self._versiones = self.compartido.versiones()
+                    self._verificado = time.monotonic()
+                    return
+                except sqlite3.Error as e:
+                    self._error('invalidación', e)
+            # Sin nivel compartido (o caído) la invalidación es local al proceso
+            versiones = dict(self._versiones)
+            for e in etiquetas:
+                versiones[e] = versiones.get(e, 0) + 1
+            self._versiones = versiones
+    
+    def recibir(self, evento):
+        """Suscriptor del bus de eventos: cada transición invalida sus etiquetas"""
+        if evento.get('tipo') == EVENTO_FILA:
+            self.invalidar((evento.get('data') or {})['etiqueta'])
+            return
+        etiquetas = ETIQUETAS_EVENTO.get(evento.get('tipo'))
+        if etiquetas:
+            piso = (evento.get('data') or {}).get('piso')
+            self.invalidar(*etiquetas, *((f'piso:{piso}',) if piso else ()))
+    
+    def estadisticas(self):
+        return {
+            'entradas_memoria': len(self.memoria),
+            'compartida': self.compartido.ruta if self.compartido else None,
+            'etiquetas': len(self._versiones),
+        }
+
+# ============================================
+# INTEGRACIÓN CON LA APP
+# ============================================
+
+_modelos_por_clave = set()
+_hooks_registrados = False
+
+def init_cache(app):
+    """Crear la caché del proceso según CACHE_*; con CACHE_ENABLED=False todo lee de la base"""
+    global _hooks_registrados
+    
+    if not app.config.get('CACHE_ENABLED', True):
+        app.extensions['cache'] = None
+        return None
+    
+    cache = Cache(
+        maximo=app.config.get('CACHE_MEMORIA_MAX_ENTRADAS', 2048),
+        ttl=app.config.get('CACHE_TTL_SEGUNDOS', 60),
+        ruta=app.config.get('CACHE_COMPARTIDA_PATH') or None,
+        maximo_compartido=app.config.get('CACHE_COMPARTIDA_MAX_ENTRADAS', 20000),
+        verificacion=app.config.get('CACHE_VERSIONES_SEGUNDOS', 1.0),
+        logger=app.logger,
+    )
+    app.extensions['cache'] = cache
+    
+    if not _hooks_registrados:
+        event.listen(db.Model, 'after_update', _fila_modificada, propagate=True)
+        event.listen(db.Model, 'after_delete', _fila_modificada, propagate=True)
+        event.listen(db.session, 'after_commit', _despues_de_commit)
+        event.listen(db.session, 'after_soft_rollback', _despues_de_rollback)
+        _hooks_registrados = True
+    return cache
+
+def obtener_cache():
+    """Caché del proceso (None si está deshabilitada); se suscribe al bus en el primer uso"""
+    cache = current_app.extensions.get('cache')
+    # Solo los workers web escuchan el bus (los comandos CLI no necesitan el hilo de LISTEN)
+    if cache is not None and cache.cancelar is None and has_request_context() and 'event_bus' in current_app.extensions:
+        with cache._lock:
+            if cache.cancelar is None:
+                from .events import suscribir
+                cache.cancelar = suscribir(cache.recibir)
+    return cache
+
+def invalidar_al_confirmar(*etiquetas):
+    """Invalidar las etiquetas cuando confirme la transacción actual (nada si se revierte)"""
+    db.session.info.setdefault('cache_invalidar', set()).update(etiquetas)
+
+def _fila_modificada(mapper, connection, objeto):
+    if mapper.class_ in _modelos_por_clave:
+        clave = ':'.join(str(v) for v in mapper.primary_key_from_instance(objeto))
+        etiqueta = f'{mapper.local_table.name}:{clave}'
+        invalidar_al_confirmar(etiqueta)
+        # Sin nivel compartido la invalidación local no llega a los otros workers
+        publicar_evento(EVENTO_FILA, etiqueta=etiqueta)
+
+def _despues_de_commit(session):
+    etiquetas = session.info.pop('cache_invalidar', None)
+    if etiquetas:
+        cache = current_app.extensions.get('cache')
+        if cache is not None:
+            cache.invalidar(*etiquetas)
+
+def _despues_de_rollback(session, transaccion_previa):
+    session.info.pop('cache_invalidar', None)
+
+def obtener_por_clave(modelo, clave, ttl=None, excluir=()):
+    """Como db.session.get(modelo, clave) pero con la fila cacheada.
+    
+    La instancia se arma desde las columnas cacheadas y entra a la sesión sin consultar la
+    base (merge con load=False): se puede modificar y confirmar como cualquier otra, y al
+    hacerlo su entrada se invalida. Las columnas de `excluir` no se cachean (se leen de la
+    base recién si se usan).
+    """
+    cache = obtener_cache()
+    if cache is None:
+        return db.session.get(modelo, clave)
+    _modelos_por_clave.add(modelo)
+    
+    etiqueta = f'{modelo.__table__.name}:{clave}'
+    
+    def leer():
+        objeto = db.session.get(modelo, clave)
+        if objeto is None:
+            return None
+        return {a.key: getattr(objeto, a.key) for a in sa_inspect(modelo).column_attrs if a.key not in excluir}
+    
+    columnas = cache.obtener_o_calcular(f'fila:{etiqueta}', leer, ttl, (etiqueta,))
+    if columnas is None:
+        return None
+    objeto = modelo(**columnas)
+    make_transient_to_detached(objeto)
+    return db.session.merge(objeto, load=False)
+
+def cached(ttl=None, etiquetas=('turnos',), por_usuario=False):
+    """Cachear la respuesta de una vista GET de turns_bp (solo las 200).
+    
+    La clave es el endpoint con sus argumentos y la query string; con por_usuario=True
+    también el usuario (para vistas cuya respuesta depende de quién pregunta). Va debajo
+    de @login_required, así el control de acceso corre siempre.
+    """
+    def decorador(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            cache = obtener_cache()
+            if cache is None or request.method != 'GET':
+                return f(*args, **kwargs)
+            
+            partes = [request.endpoint, repr(sorted(kwargs.items())), repr(sorted(request.args.items(multi=True)))]
+            if por_usuario:
+                partes.append(str(current_user.get_id()))
+            clave = 'vista:' + '|'.join(partes)
+            
+            guardada = cache.obtener(clave)
+            if guardada is not None:
+                cuerpo, status, mimetype = guardada
+                response = Response(cuerpo, status=status, mimetype=mimetype)
+                response.headers['X-Cache'] = 'HIT'
+                return response
+            
+            versiones = cache.versiones(etiquetas)
+            response = make_response(f(*args, **kwargs))
+            if response.status_code == 200 and not response.is_streamed:
+                cache.guardar(clave, (response.get_data(), response.status_code, response.mimetype), ttl, etiquetas, versiones)
+            response.headers['X-Cache'] = 'MISS'
+            return response
+        return wrapper
+    return decorador
@@ -0,0 +1,297 @@
+"""
+Catálogo de áreas, pisos y variantes con caché en memoria versionada
+"""
+import threading
+import time
+
+from flask import Blueprint, request, jsonify, current_app
+from flask_login import login_required, current_user
+from sqlalchemy import update
+
+from . import db
+from .models import Area, CatalogVariant, CatalogVersion
+
+catalog_bp = Blueprint('catalog', __name__, url_prefix='/api/catalogo')
+
+CATALOGO_AREAS = 'areas'
+TIPOS_VARIANTE = ('area', 'motivo')
+
+class AreaCatalog:
+    """Foto inmutable del catálogo con índices por clave, piso y variante"""
+    
+    def __init__(self, version, areas, variantes):
+        self.version = version
+        self.verificado = time.monotonic()
+        self.areas = [a.to_dict() for a in areas if a.is_active]
+        self.por_key = {a['key']: a for a in self.areas}
+        self.por_piso = {}
+        for a in self.areas:
+            self.por_piso.setdefault(a.get('piso'), []).append(a)
+        
+        self.area_variants = {}
+        self.motivo_variants = {}
+        for v in variantes:
+            destino = self.area_variants if v.tipo == 'area' else self.motivo_variants
+            destino[v.variante] = v.clave
+        self.area_variants_lower = {k.lower(): v for k, v in self.area_variants.items()}
+        self.motivo_variants_lower = {k.lower(): v for k, v in self.motivo_variants.items()}
+        # Para coincidencia parcial: las más largas primero y sin siglas cortas ('AC')
+        self.area_variants_parcial = sorted(
+            ((k, v) for k, v in self.area_variants_lower.items() if len(k) >= 4),
+            key=lambda kv: -len(kv[0]),
+        )
+    
+    def area(self, key):
+        return self.por_key.get(key)
+    
+    def areas_por_piso(self, piso):
+        return self.por_piso.get(str(piso), [])
+
+class _CatalogState:
+    def __init__(self):
+        self.catalogo = None
+        self.lock = threading.Lock()
+
+def _state():
+    state = current_app.extensions.get('area_catalog')
+    if state is None:
+        state = current_app.extensions.setdefault('area_catalog', _CatalogState())
+    return state
+
+def _leer_version():
+    version = db.session.query(CatalogVersion.version).filter_by(nombre=CATALOGO_AREAS).scalar()
+    return version or 0
+
+def get_catalog():
+    """Catálogo vigente; verifica la versión en la base como mucho cada CATALOG_VERSION_CHECK_SECONDS"""
+    state = _state()
+    catalogo = state.catalogo
+    intervalo = current_app.config.get('CATALOG_VERSION_CHECK_SECONDS', 5)
+    if catalogo is not None and time.monotonic() - catalogo.verificado < intervalo:
+        return catalogo
+    
+    with state.lock:
+        catalogo = state.catalogo
+        if catalogo is not None and time.monotonic() - catalogo.verificado < intervalo:
+            return catalogo
+        version = _leer_version()
+        if catalogo is not None and catalogo.version == version:
+            catalogo.verificado = time.monotonic()
+            return catalogo
+        catalogo = _cargar(version)
+        state.catalogo = catalogo
+        return catalogo
+
+def _cargar(version):
+    """Catálogo de esa versión: de la caché compartida si otro worker ya lo armó, si no de la base"""
+    from .cache import obtener_cache
+    
+    def armar():
+        return AreaCatalog(
+            version,
+            Area.query.order_by(Area.orden, Area.id).all(),
+            CatalogVariant.query.all(),
+        )
+    
+    cache = obtener_cache()
+    if cache is None:
+        return armar()
+    # La clave lleva la versión: una entrada vieja nunca se confunde con la vigente
+    catalogo = cache.obtener_o_calcular(f'catalogo:{version}', armar, ttl=3600)
+    catalogo.verificado = time.monotonic()
+    return catalogo
+
+def invalidar_catalogo():
+    """Incrementar la versión (en la transacción actual) para que todos los workers recarguen"""
+    filas = db.session.execute(
+        update(CatalogVersion)
+        .where(CatalogVersion.nombre == CATALOGO_AREAS)
+        .values(version=CatalogVersion.version + 1)
+    ).rowcount
+    if not filas:
+        db.session.add(CatalogVersion(nombre=CATALOGO_AREAS, version=1))
+    _state().catalogo = None
+    # Las respuestas cacheadas que muestran nombres de áreas
+    from .cache import invalidar_al_confirmar
+    invalidar_al_confirmar('catalogo')
+
+def seed_catalog(config):
+    """Cargar el catálogo inicial desde la configuración si las tablas están vacías"""
+    if Area.query.first() is not None:
+        return False
+    
+    for orden, a in enumerate(config.get('AREAS_MUNICIPALES_NORMALIZADAS', [])):
+        db.session.add(Area(key=a['key'], nombre=a['nombre'], piso=a.get('piso'), icon=a.get('icon'), orden=orden))
+    for variante, clave in config.get('AREA_VARIANTS_MAP', {}).items():
+        db.session.add(CatalogVariant(tipo='area', variante=variante, clave=clave))
+    for variante, clave in config.get('MOTIVO_VARIANTS_MAP', {}).items():
+        db.session.add(CatalogVariant(tipo='motivo', variante=variante, clave=clave))
+    invalidar_catalogo()
+    db.session.commit()
+    return True
+
+# ============================================
+# API ADMIN DEL CATÁLOGO
+# ============================================
+
+def _solo_admin():
+    if current_user.role != 'admin':
+        return jsonify({'success': False, 'message': 'No tienes acceso a esta sección'}), 403
+    return None
+
+def _parse_orden(valor):
+    try:
+        return int(valor)
+    except (TypeError, ValueError):
+        return None
+
+@catalog_bp.route('/areas', methods=['GET'])
+@login_required
+def api_listar_areas():
+    """Listar áreas (activas por defecto)"""
+    if request.args.get('incluir_inactivas'):
+        areas = [a.to_dict() for a in Area.query.order_by(Area.orden, Area.id).all()]
+    else:
+        areas = get_catalog().areas
+    
+    piso = request.args.get('piso')
+    if piso:
+        areas = [a for a in areas if a.get('piso') == piso]
+    
+    return jsonify({'success': True, 'data': areas, 'count': len(areas), 'version': get_catalog().version})
+
+@catalog_bp.route('/areas', methods=['POST'])
+@login_required
+def api_crear_area():
+    """Crear área - solo admin"""
+    denegado = _solo_admin()
+    if denegado:
+        return denegado
+    
+    data = request.get_json() or {}
+    key = (data.get('key') or '').strip().upper()
+    nombre = (data.get('nombre') or '').strip()
+    if not key or not nombre:
+        return jsonify({'success': False, 'message': 'key y nombre son requeridos'}), 400
+    if Area.query.filter_by(key=key).first():
+        return jsonify({'success': False, 'message': f'Ya existe el área {key}'}), 400
+    orden = _parse_orden(data.get('orden', 0))
+    if orden is None:
+        return jsonify({'success': False, 'message': 'orden debe ser un número entero'}), 400
+    
+    area = Area(
+        key=key,
+        nombre=nombre,
+        piso=str(data['piso']) if data.get('piso') is not None else None,
+        icon=data.get('icon'),
+        orden=orden,
+    )
+    db.session.add(area)
+    invalidar_catalogo()
+    db.session.commit()
+    
+    return jsonify({'success': True, 'message': 'Área creada', 'data': area.to_dict()}), 201
+
+@catalog_bp.route('/areas/<key>', methods=['PUT'])
+@login_required
+def api_actualizar_area(key):
+    """Actualizar área - solo admin"""
+    denegado = _solo_admin()
+    if denegado:
+        return denegado
+    
+    area = Area.query.filter_by(key=key).first_or_404()
+    data = request.get_json() or {}
+    orden = _parse_orden(data.get('orden'))
+    if 'orden' in data and orden is None:
+        return jsonify({'success': False, 'message': 'orden debe ser un número entero'}), 400
+    
+    if 'nombre' in data:
+        area.nombre = data['nombre'].strip()
+    if 'piso' in data:
+        area.piso = str(data['piso']) if data['piso'] is not None else None
+    if 'icon' in data:
+        area.icon = data['icon']
+    if 'orden' in data:
+        area.orden = orden
+    if 'is_active' in data:
+        area.is_active = bool(data['is_active'])
+    
+    invalidar_catalogo()
+    db.session.commit()
+    
+    return jsonify({'success': True, 'message': 'Área actualizada', 'data': area.to_dict()})
+
+@catalog_bp.route('/areas/<key>', methods=['DELETE'])
+@login_required
+def api_desactivar_area(key):
+    """Desactivar área (los turnos históricos conservan la clave) - solo admin"""
+    denegado = _solo_admin()
+    if denegado:
+        return denegado
+    
+    area = Area.query.filter_by(key=key).first_or_404()
+    area.is_active = False
+    invalidar_catalogo()
+    db.session.commit()
+    
+    return jsonify({'success': True, 'message': 'Área desactivada', 'data': area.to_dict()})
+
+@catalog_bp.route('/variantes', methods=['GET'])
+@login_required
+def api_listar_variantes():
+    """Listar variantes de normalización"""
+    query = CatalogVariant.query
+    tipo = request.args.get('tipo')
+    if tipo:
+        query = query.filter_by(tipo=tipo)
+    variantes = query.order_by(CatalogVariant.tipo, CatalogVariant.variante).all()
+    
+    return jsonify({'success': True, 'data': [v.to_dict() for v in variantes], 'count': len(variantes)})
+
+@catalog_bp.route('/variantes', methods=['POST'])
+@login_required
+def api_crear_variante():
+    """Agregar variante de área o motivo - solo admin"""
+    denegado = _solo_admin()
+    if denegado:
+        return denegado
+    
+    data = request.get_json() or {}
+    tipo = data.get('tipo')
+    variante = (data.get('variante') or '').strip()
+    clave = (data.get('clave') or '').strip()
+    
+    if tipo not in TIPOS_VARIANTE:
+        return jsonify({'success': False, 'message': f'tipo debe ser uno de {", ".join(TIPOS_VARIANTE)}'}), 400
+    if not variante or not clave:
+        return jsonify({'success': False, 'message': 'variante y clave son requeridas'}), 400
+    if tipo == 'area' and not Area.query.filter_by(key=clave).first():
+        return jsonify({'success': False, 'message': f'Área no válida: {clave}'}), 400
+    
+    existente = CatalogVariant.query.filter_by(tipo=tipo, variante=variante).first()
+    if existente:
+        existente.clave = clave
+        v = existente
+    else:
+        v = CatalogVariant(tipo=tipo, variante=variante, clave=clave)
+        db.session.add(v)
+    invalidar_catalogo()
+    db.session.commit()
+    
+    return jsonify({'success': True, 'message': 'Variante guardada', 'data': v.to_dict()}), 201
+
+@catalog_bp.route('/variantes/<int:variante_id>', methods=['DELETE'])
+@login_required
+def api_eliminar_variante(variante_id):
+    """Eliminar variante - solo admin"""
+    denegado = _solo_admin()
+    if denegado:
+        return denegado
+    
+    v = CatalogVariant.query.get_or_404(variante_id)
+    db.session.delete(v)
+    invalidar_catalogo()
+    db.session.commit()
+    
+    return jsonify({'success': True, 'message': 'Variante eliminada'})
@@ -0,0 +1,363 @@
+"""
+Comandos de mantenimiento (flask --app run <comando>)
+"""
+import click
+from flask.cli import with_appcontext
+
+@click.command('backfill-visitors')
+@click.option('--lote', default=5000, show_default=True, help='Filas por lote de lectura/escritura')
+@with_appcontext
+def backfill_visitors(lote):
+    """Reconstruir los perfiles de visitantes desde el historial de turnos"""
+    from .visitors import reconstruir_visitantes
+    
+    def progreso(turnos, visitantes):
+        click.echo(f'  {turnos} turnos procesados, {visitantes} perfiles escritos')
+    
+    turnos, visitantes = reconstruir_visitantes(lote=lote, progreso=progreso)
+    click.echo(f'✓ {visitantes} perfiles de visitantes a partir de {turnos} turnos')
+
+@click.command('typeahead-report')
+@click.option('--visitantes', default=500000, show_default=True, help='Visitantes distintos a simular')
+@click.option('--consultas', default=5000, show_default=True, help='Búsquedas por prefijo a medir')
+@click.option('--seed', default=42, show_default=True)
+def typeahead_report(visitantes, consultas, seed):
+    """Presupuesto de memoria y latencia del índice de autocompletado con datos sintéticos"""
+    import random
+    import time
+    from .typeahead import VisitorTypeahead
+    
+    rng = random.Random(seed)
+    nombres = ['Juan', 'María', 'José', 'Ana', 'Luis', 'Sofía', 'Carlos', 'Lucía', 'Jorge', 'Martín',
+               'Valentina', 'Nicolás', 'Camila', 'Matías', 'Florencia', 'Agustín', 'Rocío', 'Ramón']
+    apellidos = ['González', 'Rodríguez', 'Gómez', 'Fernández', 'López', 'Díaz', 'Martínez', 'Pérez',
+                 'Núñez', 'Sánchez', 'Romero', 'Sosa', 'Álvarez', 'Benítez', 'Acuña', 'Ibáñez']
+    
+    def nombre_aleatorio():
+        partes = [rng.choice(nombres)]
+        if rng.random() < 0.4:
+            partes.append(rng.choice(nombres))
+        partes.append(rng.choice(apellidos) + ('' if rng.random() < 0.5 else f'{rng.randint(1, 9999)}'))
+        return ' '.join(partes)
+    
+    filas = [(str(10000000 + i * 7), nombre_aleatorio(), int(rng.paretovariate(1.2))) for i in range(visitantes)]
+    
+    indice = VisitorTypeahead()
+    inicio = time.perf_counter()
+    indice.construir(filas)
+    construccion = time.perf_counter() - inicio
+    
+    prefijos = []
+    for _ in range(consultas):
+        dni, nombre, _ = rng.choice(filas)
+        texto = dni if rng.random() < 0.3 else nombre
+        prefijos.append(texto[:rng.randint(2, min(len(texto), 12))])
+    
+    for p in prefijos:  # calentar el top-k de prefijos frecuentes
+        indice.buscar(p)
+    latencias = []
+    for p in prefijos:
+        t0 = time.perf_counter()
+        indice.buscar(p)
+        latencias.append((time.perf_counter() - t0) * 1000)
+    latencias.sort()
+    
+    reporte = indice.reporte_memoria()
+    click.echo(f"Visitantes: {reporte['visitantes']}  claves nombre: {reporte['claves_nombre']}  claves DNI: {reporte['claves_dni']}")
+    click.echo(f'Construcción: {construccion:.2f} s')
+    for parte, tamanio in reporte['bytes'].items():
+        click.echo(f'  {parte:<16} {tamanio / 1024 / 1024:8.1f} MB')
+    click.echo(f"  {'total':<16} {reporte['total_bytes'] / 1024 / 1024:8.1f} MB  ({reporte['bytes_por_visitante']} bytes/visitante)")
+    click.echo(f'Búsqueda: p50 {latencias[len(latencias) // 2]:.3f} ms  '
+               f'p99 {latencias[int(len(latencias) * 0.99)]:.3f} ms  max {latencias[-1]:.3f} ms')
+
+@click.command('generate-slots')
+@click.option('--semanas', default=None, type=int, help='Horizonte en semanas (por defecto CITAS_HORIZONTE_SEMANAS)')
+@with_appcontext
+def generate_slots(semanas):
+    """Crear las franjas de turnos programados que falten en el horizonte de reserva"""
+    from . import db
+    from .appointments import generar_franjas
+    
+    creadas = generar_franjas(semanas=semanas)
+    db.session.commit()
+    click.echo(f'✓ {creadas} franjas nuevas')
+
+@click.command('sweep-turns')
+@click.option('--antes', default=None, help='Corte "YYYY-MM-DD HH:MM" (por defecto el último BARRIDO_HORA_CORTE)')
+@click.option('--dry-run', is_flag=True, help='Solo contar los turnos que se cerrarían')
+@with_appcontext
+def sweep_turns(antes, dry_run):
+    """Cerrar como VENCIDO los turnos abiertos llegados antes del corte"""
+    from datetime import datetime
+    from flask import current_app
+    from .sweeper import ultimo_corte, contar_vencidos, barrer_turnos
+    
+    if antes:
+        try:
+            corte = datetime.strptime(antes, '%Y-%m-%d %H:%M')
+        except ValueError:
+            raise click.BadParameter('formato esperado "YYYY-MM-DD HH:MM"', param_hint='--antes')
+    else:
+        corte = ultimo_corte(current_app.config)
+    
+    if dry_run:
+        click.echo(f'{contar_vencidos(corte)} turnos abiertos llegados antes de {corte:%d/%m/%Y %H:%M}')
+        return
+    click.echo(f'✓ {barrer_turnos(corte)} turnos cerrados como VENCIDO (corte {corte:%d/%m/%Y %H:%M})')
+
+@click.command('push-receipts')
+@click.option('--lote', default=1000, show_default=True, help='Tickets por consulta a Expo (máximo 1000)')
+@with_appcontext
+def push_receipts(lote):
+    """Consultar los recibos de Expo pendientes y desactivar los dispositivos muertos"""
+    from flask import current_app
+    from .push_receipts import procesar_recibos
+    
+    t = procesar_recibos(current_app.config, lote=lote)
+    click.echo(f"✓ {t['lotes']} lotes: {t['ok']} entregados, {t['errores']} con error, "
+               f"{t['expirados']} expirados, {t['desactivados']} dispositivos desactivados")
+
+@click.command('build-stats')
+@click.option('--desde', default=None, help='Primer día YYYY-MM-DD (por defecto, el siguiente al último construido)')
+@click.option('--hasta', default=None, help='Último día YYYY-MM-DD (por defecto, ayer)')
+@click.option('--chunk-dias', default=7, show_default=True, help='Días por tramo (un commit por tramo)')
+@with_appcontext
+def build_stats(desde, hasta, chunk_dias):
+    """Construir el cubo de estadísticas históricas (nocturno incremental o backfill por tramos)"""
+    from datetime import datetime
+    from .stats_cube import construir_cubo
+    
+    def parsear(valor, opcion):
+        if not valor:
+            return None
+        try:
+            return datetime.strptime(valor, '%Y-%m-%d').date()
+        except ValueError:
+            raise click.BadParameter('formato esperado YYYY-MM-DD', param_hint=opcion)
+    
+    def progreso(inicio, fin, filas):
+        click.echo(f'  {inicio:%d/%m/%Y} - {fin:%d/%m/%Y}: {filas} filas diarias acumuladas')
+    
+    dias, filas = construir_cubo(parsear(desde, '--desde'), parsear(hasta, '--hasta'), max(chunk_dias, 1), progreso)
+    click.echo(f'✓ {dias} días construidos, {filas} filas diarias')
+
+@click.command('renormalize')
+@click.option('--lote', default=5000, show_default=True, help='Turnos por tramo (un commit y checkpoint por tramo)')
+@click.option('--procesos', default=0, show_default=True, help='Procesos para clasificar textos nuevos (0 = en este proceso)')
+@click.option('--reiniciar', is_flag=True, help='Ignorar el checkpoint y recorrer todo el historial')
+@with_appcontext
+def renormalize(lote, procesos, reiniciar):
+    """Re-clasificar motivos y áreas del historial de turnos con las reglas vigentes del catálogo"""
+    from .renormalize import renormalizar, dias_pendientes, limpiar_pendientes
+    
+    def progreso(ultimo_id, t):
+        click.echo(f"  hasta id {ultimo_id}: {t['turnos']} turnos, {t['motivos']} motivos y {t['areas']} áreas corregidos")
+    
+    t = renormalizar(lote=lote, procesos=procesos, reiniciar=reiniciar, progreso=progreso)
+    click.echo(f"✓ {t['turnos']} turnos revisados ({t['textos']} textos distintos): "
+               f"{t['motivos']} motivos y {t['areas']} áreas corregidos")
+    
+    # Días corregidos en esta corrida o en una anterior que se cortó antes de llegar acá
+    desde, hasta = dias_pendientes()
+    if desde is None:
+        return
+    
+    # Rehacer los días del cubo hasta el último construido; los posteriores los arma la
+    # corrida nocturna de build-stats
+    from .stats_cube import construir_cubo, ultimo_dia_construido
+    ultimo = ultimo_dia_construido()
+    if ultimo is None or desde > ultimo:
+        click.echo(f"  Turnos corregidos entre {desde:%d/%m/%Y} y {hasta:%d/%m/%Y} (días todavía sin cubo)")
+    else:
+        dias, filas = construir_cubo(desde, min(hasta, ultimo))
+        click.echo(f"✓ Cubo reconstruido desde {desde:%d/%m/%Y}: {dias} días, {filas} filas diarias")
+    limpiar_pendientes()
+
+@click.command('import-visits')
+@click.argument('archivos', nargs=-1, required=True, type=click.Path(exists=True, dir_okay=False))
+@click.option('--lote', default=5000, show_default=True, help='Filas por lote de inserción (un commit por lote)')
+@click.option('--hoja', default=None, help='Hoja del XLSX (por defecto, la primera)')
+@with_appcontext
+def import_visits(archivos, lote, hoja):
+    """Importar planillas históricas de visitas (CSV o XLSX); re-importar un archivo no duplica filas"""
+    from .importer import importar_archivo
+    
+    def progreso(t):
+        click.echo(f"  {t['leidas']} filas leídas, {t['insertadas']} insertadas")
+    
+    for archivo in archivos:
+        click.echo(f'{archivo}:')
+        try:
+            t = importar_archivo(archivo, lote=lote, hoja=hoja, progreso=progreso)
+        except ValueError as e:
+            raise click.ClickException(f'{archivo}: {e}')
+        click.echo(f"✓ {t['insertadas']} turnos importados, {t['duplicadas']} ya existentes, "
+                   f"{t['invalidas']} filas inválidas, {t['sin_mapear']} valores sin mapear (ver {t['reporte']})")
+    click.echo('  Luego conviene correr flask backfill-visitors y flask build-stats --desde <primera fecha importada>')
+
+@click.command('generate-data')
+@click.option('--turnos', default=100000, show_default=True, help='Turnos a generar')
+@click.option('--dias', default=365, show_default=True, help='Días de historia (terminando en --hasta)')
+@click.option('--hasta', default=None, help='Último día generado YYYY-MM-DD (por defecto ayer)')
+@click.option('--seed', default=42, show_default=True, help='Semilla: con los mismos parámetros se generan las mismas filas')
+@click.option('--mensajes', default=0.3, show_default=True, help='Mensajes de chat por turno')
+@click.option('--lote', default=20000, show_default=True, help='Turnos por lote de inserción (un commit por lote)')
+@with_appcontext
+def generate_data(turnos, dias, hasta, seed, mensajes, lote):
+    """Generar turnos y mensajes de chat sintéticos de alto volumen para pruebas de rendimiento"""
+    import time
+    from datetime import datetime
+    from .synthetic import generar_datos
+    
+    if hasta:
+        try:
+            hasta = datetime.strptime(hasta, '%Y-%m-%d').date()
+        except ValueError:
+            raise click.BadParameter('formato esperado YYYY-MM-DD', param_hint='--hasta')
+    
+    inicio = time.perf_counter()
+    
+    def progreso(dia, t):
+        click.echo(f"  hasta {dia:%d/%m/%Y}: {t['turnos']} turnos, {t['mensajes']} mensajes "
+                   f"({t['turnos'] / (time.perf_counter() - inicio):.0f} turnos/s)")
+    
+    try:
+        t = generar_datos(turnos, dias=max(dias, 1), hasta=hasta, seed=seed, mensajes=mensajes,
+                          lote=max(lote, 1), progreso=progreso)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    click.echo(f"✓ {t['turnos']} turnos de {t['visitantes']} visitantes y {t['mensajes']} mensajes "
+               f"entre {t['desde']:%d/%m/%Y} y {t['hasta']:%d/%m/%Y} en {time.perf_counter() - inicio:.1f} s")
+    click.echo(f"  Luego conviene correr flask backfill-visitors y flask build-stats --desde {t['desde']:%Y-%m-%d}")
+
+@click.command('backfill-turn-events')
+@click.option('--lote', default=5000, show_default=True, help='Turnos por tramo (un commit por tramo)')
+@with_appcontext
+def backfill_turn_events(lote):
+    """Inferir el historial de eventos de los turnos anteriores al registro de transiciones"""
+    from .turn_events import completar_historial
+    
+    def progreso(ultimo_id, t):
+        click.echo(f"  hasta id {ultimo_id}: {t['turnos']} turnos, {t['eventos']} eventos inferidos")
+    
+    t = completar_historial(lote=max(lote, 1), progreso=progreso)
+    click.echo(f"✓ {t['eventos']} eventos inferidos para {t['turnos']} turnos")
+
+@click.command('replay-events')
+@click.option('--agrupar', type=click.Choice(['dia', 'hora', 'actor']), default='dia', show_default=True,
+              help='Agregado a recalcular desde el historial')
+@click.option('--hasta-id', default=None, type=int, help='Reproducir solo hasta este evento (estado a ese momento)')
+@click.option('--salida', default=None, type=click.Path(dir_okay=False, writable=True), help='Escribir el agregado en un CSV')
+@click.option('--verificar', is_flag=True, help='Comparar el estado reconstruido con el actual de cada turno')
+@click.option('--lote', default=10000, show_default=True, help='Eventos por lectura')
+@with_appcontext
+def replay_events(agrupar, hasta_id, salida, verificar, lote):
+    """Recorrer el historial de eventos de turnos y recalcular estadísticas o verificar estados"""
+    import csv
+    import sys
+    import time
+    from .turn_events import PorActor, PorPeriodo, reproducir, verificar as verificar_estados
+    
+    inicio = time.perf_counter()
+    if verificar:
+        r = verificar_estados(lote=max(lote, 1))
+        click.echo(f"✓ {r['eventos']} eventos, {r['turnos']} turnos: {r['coinciden']} coinciden, "
+                   f"{r['distintos']} distintos, {r['sin_eventos']} sin eventos ({time.perf_counter() - inicio:.1f} s)")
+        for turno_id, actual, reconstruido in r['ejemplos']:
+            click.echo(f'  turno {turno_id}: {actual} en la tabla, {reconstruido} según el historial')
+        if r['sin_eventos']:
+            click.echo('  Los turnos sin eventos se completan con flask backfill-turn-events')
+        return
+    
+    agregador = PorActor() if agrupar == 'actor' else PorPeriodo(agrupar)
+    filas, eventos = reproducir(agregador, hasta_id=hasta_id, lote=max(lote, 1))
+    click.echo(f'✓ {eventos} eventos reproducidos en {time.perf_counter() - inicio:.1f} s', err=True)
+    if not filas:
+        return
+    
+    destino = open(salida, 'w', newline='', encoding='utf-8') if salida else sys.stdout
+    try:
+        writer = csv.DictWriter(destino, fieldnames=list(filas[0]))
+        writer.writeheader()
+        writer.writerows(filas)
+    finally:
+        if salida:
+            destino.close()
+
+@click.command('snapshot')
+@click.option('--completo', is_flag=True, help='Exportar todo aunque haya un snapshot anterior')
+@click.option('--directorio', default=None, help='Directorio de snapshots (por defecto SNAPSHOT_DIR)')
+@click.option('--max-mb-s', default=None, type=float, help='Tope de lectura en MB/s (por defecto SNAPSHOT_MAX_MB_S, 0 = sin tope)')
+@click.option('--replica', is_flag=True, help='Leer de la réplica configurada en lugar de la primaria')
+@with_appcontext
+def snapshot(completo, directorio, max_mb_s, replica):
+    """Exportar un snapshot consistente (completo o incremental) de turnos, chat, usuarios y dispositivos"""
+    from flask import current_app
+    from . import db
+    from .db_routing import REPLICA
+    from .snapshot import crear_snapshot
+    
+    config = current_app.config
+    engine = None
+    if replica:
+        if REPLICA not in (config.get('SQLALCHEMY_BINDS') or {}):
+            raise click.ClickException('No hay réplica configurada (DATABASE_REPLICA_URL)')
+        engine = db.engines[REPLICA]
+    max_mb_s = config['SNAPSHOT_MAX_MB_S'] if max_mb_s is None else max_mb_s
+    
+    def progreso(tabla, filas):
+        click.echo(f'  {tabla}: {filas} filas')
+    
+    m = crear_snapshot(
+        directorio or config['SNAPSHOT_DIR'],
+        completo=completo,
+        filas=config['SNAPSHOT_FILAS_POR_ARCHIVO'],
+        max_bytes_s=max(max_mb_s, 0) * 1024 * 1024,
+        margen_segundos=config['SNAPSHOT_MARGEN_SEGUNDOS'],
+        engine=engine,
+        progreso=progreso,
+    )
+    detalle = ', '.join(f"{tabla} {info['filas']}" for tabla, info in m['tablas'].items())
+    click.echo(f"✓ Snapshot {m['tipo']} {m['nombre']} en {m['segundos']} s: {detalle}")
+
+@click.command('restore-snapshot')
+@click.argument('destino')
+@click.option('--directorio', default=None, help='Directorio de snapshots (por defecto SNAPSHOT_DIR)')
+@click.option('--hasta', default=None, help='Nombre del último snapshot a aplicar (por defecto, el más reciente)')
+@with_appcontext
+def restore_snapshot(destino, directorio, hasta):
+    """Restaurar la cadena de snapshots en otra base (URL SQLite o Postgres) para depurar en local"""
+    from flask import current_app
+    from sqlalchemy.engine import make_url
+    from .snapshot import restaurar_snapshot
+    
+    config = current_app.config
+    if make_url(destino) == make_url(config['SQLALCHEMY_DATABASE_URI']):
+        raise click.ClickException('El destino es la base de la aplicación; restaurar en una base nueva')
+    
+    def progreso(manifest, totales):
+        click.echo(f"  {manifest['nombre']} aplicado ({sum(totales.values())} filas acumuladas)")
+    
+    try:
+        cadena, totales = restaurar_snapshot(directorio or config['SNAPSHOT_DIR'], destino, hasta=hasta, progreso=progreso)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    detalle = ', '.join(f'{tabla} {filas}' for tabla, filas in totales.items())
+    click.echo(f"✓ {len(cadena)} snapshots aplicados hasta {cadena[-1]['nombre']}: {detalle}")
+
+def register_commands(app):
+    """Registrar los comandos CLI en la app"""
+    app.cli.add_command(backfill_visitors)
+    app.cli.add_command(typeahead_report)
+    app.cli.add_command(generate_slots)
+    app.cli.add_command(sweep_turns)
+    app.cli.add_command(push_receipts)
+    app.cli.add_command(build_stats)
+    app.cli.add_command(renormalize)
+    app.cli.add_command(import_visits)
+    app.cli.add_command(generate_data)
+    app.cli.add_command(backfill_turn_events)
+    app.cli.add_command(replay_events)
+    app.cli.add_command(snapshot)
+    app.cli.add_command(restore_snapshot)
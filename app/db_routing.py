@@ -0,0 +1,148 @@
+"""
+Ruteo lectura/escritura: los endpoints marcados como solo lectura leen de la réplica
+(bind 'replica' de SQLALCHEMY_BINDS) salvo que el usuario acabe de escribir o la
+réplica esté atrasada; todo lo demás, y toda escritura, va a la primaria.
+"""
+import threading
+import time
+from functools import wraps
+
+from flask import current_app, g, has_request_context, session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event, text
+from sqlalchemy.exc import DBAPIError
+
+from .metrics import db_read_routing_total
+
+REPLICA = 'replica'
+
+# Segundos de atraso de una réplica Postgres (0 si está al día o no es standby)
+LAG_POSTGRES = text("""
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+""")
+
+class RoutingSession(Session):
+    """Session de Flask-SQLAlchemy que manda los SELECT a la réplica cuando g.db_replica está activo"""
+    
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (
+            bind is None
+            and not self._flushing
+            and has_request_context()
+            and g.get('db_replica')
+            and getattr(clause, 'is_select', False)
+        ):
+            engine = self._db.engines.get(REPLICA)
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+class _EstadoReplica:
+    def __init__(self):
+        self.lag = 0.0
+        self.verificado = None
+        self.caida_hasta = 0.0
+        self.lock = threading.Lock()
+
+def _estado():
+    estado = current_app.extensions.get('db_replica')
+    if estado is None:
+        estado = current_app.extensions.setdefault('db_replica', _EstadoReplica())
+    return estado
+
+def _medir_lag(engine):
+    if engine.dialect.name != 'postgresql':
+        return 0.0
+    with engine.connect() as conn:
+        return float(conn.execute(LAG_POSTGRES).scalar() or 0)
+
+def marcar_caida(estado=None):
+    estado = estado or _estado()
+    estado.caida_hasta = time.monotonic() + current_app.config.get('REPLICA_RETRY_SECONDS', 30)
+
+def _motivo_primaria():
+    """None si se puede leer de la réplica; si no, el motivo para usar la primaria"""
+    from . import db
+    
+    if REPLICA not in (current_app.config.get('SQLALCHEMY_BINDS') or {}):
+        return 'sin_replica'
+    
+    ventana = current_app.config.get('READ_YOUR_WRITES_SECONDS', 10)
+    if session.get('db_ultima_escritura', 0) > time.time() - ventana:
+        return 'escritura_reciente'
+    
+    estado = _estado()
+    if time.monotonic() < estado.caida_hasta:
+        return 'replica_caida'
+    
+    intervalo = current_app.config.get('REPLICA_LAG_CHECK_SECONDS', 5)
+    if estado.verificado is None or time.monotonic() - estado.verificado >= intervalo:
+        with estado.lock:
+            if estado.verificado is None or time.monotonic() - estado.verificado >= intervalo:
+                try:
+                    estado.lag = _medir_lag(db.engines[REPLICA])
+                except Exception as e:
+                    current_app.logger.warning('Réplica no disponible, se lee de la primaria: %s', e)
+                    marcar_caida(estado)
+                    return 'replica_caida'
+                finally:
+                    estado.verificado = time.monotonic()
+    
+    if estado.lag > current_app.config.get('REPLICA_MAX_LAG_SECONDS', 5):
+        return 'replica_atrasada'
+    return None
+
+def solo_lectura(f):
+    """Decorador para endpoints que solo leen: sus SELECT van a la réplica si corresponde"""
+    @wraps(f)
+    def wrapper(*args, **kwargs):
+        from . import db
+        
+        motivo = _motivo_primaria()
+        g.db_replica = motivo is None
+        db_read_routing_total.inc(destino='replica' if g.db_replica else 'primaria', motivo=motivo or '')
+        try:
+            return f(*args, **kwargs)
+        except DBAPIError as e:
+            if not g.db_replica:
+                raise
+            # La réplica falló a mitad del request: reintentar una vez contra la primaria
+            current_app.logger.warning('Error leyendo de la réplica, se reintenta en la primaria: %s', e.orig)
+            db.session.rollback()
+            marcar_caida()
+            g.db_replica = False
+            db_read_routing_total.inc(destino='primaria', motivo='error_replica')
+            return f(*args, **kwargs)
+        finally:
+            g.db_replica = False
+    return wrapper
+
+def _registrar_escritura(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        orm_execute_state.session.info['escribio'] = True
+
+def _despues_de_flush(sesion, contexto):
+    sesion.info['escribio'] = True
+
+def _despues_de_commit(sesion):
+    # Read-your-writes: el usuario que escribió lee de la primaria durante la ventana
+    if sesion.info.pop('escribio', False) and has_request_context():
+        session['db_ultima_escritura'] = time.time()
+
+def _despues_de_rollback(sesion):
+    sesion.info.pop('escribio', None)
+
+_hooks_registrados = False
+
+def init_db_routing(db):
+    global _hooks_registrados
+    if not _hooks_registrados:
+        event.listen(db.session, 'do_orm_execute', _registrar_escritura)
+        event.listen(db.session, 'after_flush', _despues_de_flush)
+        event.listen(db.session, 'after_commit', _despues_de_commit)
+        event.listen(db.session, 'after_soft_rollback', lambda sesion, previa: _despues_de_rollback(sesion))
+        _hooks_registrados = True
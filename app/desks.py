@@ -0,0 +1,408 @@
+"""
+Puestos de atención por piso y despacho automático del próximo turno.
+
+Cada puesto (box, escritorio) atiende algunas áreas de su piso y pasa por
+CERRADO -> LIBRE -> OCUPADO -> LIBRE ... (con PAUSA en el medio). Al quedar LIBRE se le
+asigna el próximo turno de sus áreas según el scheduler del piso. Las dos escrituras son
+condicionales, así dos puestos nunca llaman a la misma persona y un doble click no despacha
+dos veces:
+
+    UPDATE visitor_turn SET estado = 'AUTORIZADO_SUBIR', ... WHERE id = :turno AND estado = 'ESPERA'
+    UPDATE desk SET estado = 'OCUPADO', version = version + 1, ... WHERE id = :puesto AND version = :leida
+
+Cada transición suma el tiempo pasado en el estado anterior a desk_stats_daily, de donde
+sale el rendimiento por puesto (atendidos por hora abierta, ocupación y tiempo ocioso).
+"""
+from datetime import datetime, time, timedelta
+
+from flask import Blueprint, request, jsonify, current_app
+from flask_login import login_required, current_user
+from sqlalchemy import update, func
+
+from . import db
+from .models import VisitorTurn, Desk, DeskDailyStats, now_argentina, ahora_local
+from .catalog import get_catalog
+from .scheduler import scheduler_para_piso
+from .events import publicar_evento
+from .metrics import desk_dispatch_total
+
+puestos_bp = Blueprint('puestos', __name__, url_prefix='/api/puestos')
+
+ESTADOS_PUESTO = ('CERRADO', 'LIBRE', 'OCUPADO', 'PAUSA')
+RESULTADOS = ('atendido', 'ausente')
+# Columna de desk_stats_daily donde se acumula el tiempo de cada estado (CERRADO no cuenta)
+_SEGUNDOS_ESTADO = {'LIBRE': 'segundos_libre', 'OCUPADO': 'segundos_ocupado', 'PAUSA': 'segundos_pausa'}
+
+class PuestoModificado(Exception):
+    """Otro request cambió el puesto desde que se leyó (doble click, dos pestañas)"""
+
+# ============================================
+# DESPACHO
+# ============================================
+
+def reclamar_turno(turno, llamado_por, atendido_por=None, puesto_id=None):
+    """Pasar el turno de ESPERA a AUTORIZADO_SUBIR solo si sigue en ESPERA (sin commit).
+    
+    Devuelve False si otro puesto o agente lo llamó antes; si no, publica turno.autorizado.
+    """
+    ahora = now_argentina()
+    valores = {'estado': 'AUTORIZADO_SUBIR', 'hora_autorizado': ahora, 'llamado_por': llamado_por, 'updated_at': ahora}
+    if atendido_por:
+        valores['atendido_por'] = atendido_por
+    if puesto_id is not None:
+        valores['puesto_id'] = puesto_id
+    filas = db.session.execute(
+        update(VisitorTurn)
+        .where(VisitorTurn.id == turno.id, VisitorTurn.estado == 'ESPERA')
+        .values(**valores)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if filas != 1:
+        return False
+    db.session.refresh(turno)
+    publicar_evento('turno.autorizado', turno)
+    return True
+
+def _acumular(puesto_id, estado, desde, hasta, atendidos=0, ausentes=0):
+    """Sumar el tiempo en 'estado' entre desde y hasta al día que corresponde (cortando en la medianoche)"""
+    por_dia = {}
+    columna = _SEGUNDOS_ESTADO.get(estado)
+    if columna and desde is not None:
+        inicio = desde
+        while inicio < hasta:
+            fin = min(hasta, datetime.combine(inicio.date() + timedelta(days=1), time.min))
+            por_dia.setdefault(inicio.date(), {})[columna] = int((fin - inicio).total_seconds())
+            inicio = fin
+    if atendidos or ausentes:
+        dia = por_dia.setdefault(hasta.date(), {})
+        dia['atendidos'] = atendidos
+        dia['ausentes'] = ausentes
+    
+    # Las transiciones de un puesto están serializadas por su versión: no hay carreras por la fila
+    for fecha, valores in por_dia.items():
+        fila = db.session.get(DeskDailyStats, (puesto_id, fecha))
+        if fila is None:
+            fila = DeskDailyStats(desk_id=puesto_id, fecha=fecha, atendidos=0, ausentes=0,
+                                  segundos_libre=0, segundos_ocupado=0, segundos_pausa=0)
+            db.session.add(fila)
+        for campo, valor in valores.items():
+            setattr(fila, campo, getattr(fila, campo) + valor)
+
+def _transicion(puesto, estado, ahora, atendidos=0, ausentes=0, **valores):
+    """Cambiar el estado del puesto si nadie lo cambió desde que se leyó; PuestoModificado si no"""
+    filas = db.session.execute(
+        update(Desk)
+        .where(Desk.id == puesto.id, Desk.version == puesto.version)
+        .values(estado=estado, estado_desde=ahora, version=Desk.version + 1, **valores)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if filas != 1:
+        raise PuestoModificado()
+    _acumular(puesto.id, puesto.estado, puesto.estado_desde, ahora, atendidos, ausentes)
+    db.session.refresh(puesto)
+    publicar_evento('puesto.estado', puesto_id=puesto.id, piso=puesto.piso, estado=estado, turno_id=puesto.turno_id)
+
+def despachar(puesto, ahora=None):
+    """Asignar al puesto LIBRE el próximo turno de sus áreas (sin commit); None si no hay.
+    
+    Los candidatos salen en el orden del scheduler; los que otro puesto reclamó primero se saltean.
+    """
+    ahora = ahora or ahora_local()
+    scheduler = scheduler_para_piso(puesto.piso, puesto.area_keys())
+    for turno, _ in scheduler.orden(current_app.config.get('PUESTOS_CANDIDATOS', 5)):
+        if reclamar_turno(turno, puesto.nombre, puesto.agente, puesto.id):
+            _transicion(puesto, 'OCUPADO', ahora, turno_id=turno.id)
+            desk_dispatch_total.inc(resultado='asignado')
+            return turno
+        desk_dispatch_total.inc(resultado='reclamado_por_otro')
+    desk_dispatch_total.inc(resultado='sin_turnos')
+    return None
+
+def _cerrar_turno_en_curso(puesto, resultado):
+    """Cerrar el turno asignado al puesto; devuelve (atendidos, ausentes) para sus estadísticas"""
+    turno = db.session.get(VisitorTurn, puesto.turno_id) if puesto.turno_id else None
+    if turno is None:
+        return 0, 0
+    if turno.estado != 'AUTORIZADO_SUBIR':
+        # Ya lo cerraron desde la lista del piso
+        return (1, 0) if turno.estado == 'ATENDIDO' else (0, 0)
+    if resultado == 'ausente':
+        turno.estado = 'RECHAZADO'
+        turno.notas = (turno.notas + "\n" if turno.notas else "") + f"Rechazado: no se presentó en {puesto.nombre}"
+        publicar_evento('turno.rechazado', turno)
+        return 0, 1
+    turno.estado = 'ATENDIDO'
+    turno.hora_atendido = now_argentina()
+    if puesto.agente:
+        turno.atendido_por = puesto.agente
+    publicar_evento('turno.atendido', turno)
+    return 1, 0
+
+def abrir(puesto, agente=None, ahora=None):
+    """Abrir (o reanudar tras una pausa) el puesto y despacharle el próximo turno"""
+    if puesto.estado not in ('CERRADO', 'PAUSA'):
+        raise ValueError('El puesto ya está abierto')
+    ahora = ahora or ahora_local()
+    _transicion(puesto, 'LIBRE', ahora, agente=(agente or puesto.agente))
+    return despachar(puesto, ahora)
+
+def liberar(puesto, resultado='atendido', estado='LIBRE', ahora=None):
+    """Cerrar el turno en curso y dejar el puesto en 'estado'; si queda LIBRE, despachar el próximo"""
+    if puesto.estado == 'CERRADO':
+        raise ValueError('El puesto está cerrado')
+    ahora = ahora or ahora_local()
+    atendidos, ausentes = _cerrar_turno_en_curso(puesto, resultado) if puesto.estado == 'OCUPADO' else (0, 0)
+    if estado != puesto.estado:
+        valores = {'turno_id': None}
+        if estado == 'CERRADO':
+            valores['agente'] = None
+        _transicion(puesto, estado, ahora, atendidos, ausentes, **valores)
+    if estado == 'LIBRE':
+        return despachar(puesto, ahora)
+    return None
+
+def despachar_libres(piso):
+    """Repartir turnos en espera entre los puestos LIBRES del piso, primero el más ocioso (con commit)"""
+    puestos = Desk.query.filter(
+        Desk.piso == str(piso),
+        Desk.estado == 'LIBRE',
+        Desk.is_active == True
+    ).order_by(Desk.estado_desde).all()
+    
+    asignados = []
+    for puesto in puestos:
+        try:
+            turno = despachar(puesto)
+            db.session.commit()
+        except PuestoModificado:
+            db.session.rollback()
+            continue
+        if turno is not None:
+            asignados.append(turno)
+    for turno in asignados:
+        _notificar_llamado(turno)
+    return len(asignados)
+
+def _notificar_llamado(turno):
+    try:
+        from app.notifications import notify_turn_authorized
+        notify_turn_authorized(turno)
+    except Exception as e:
+        current_app.logger.warning('Error enviando notificación: %s', e)
+
+# ============================================
+# RENDIMIENTO
+# ============================================
+
+def rendimiento(desde, hasta, piso=None, ahora=None):
+    """Por puesto, en [desde, hasta]: turnos cerrados, horas abiertas, atendidos por hora, ocupación y tiempo ocioso"""
+    ahora = ahora or ahora_local()
+    s = DeskDailyStats
+    filas = db.session.query(
+        s.desk_id,
+        func.sum(s.atendidos), func.sum(s.ausentes),
+        func.sum(s.segundos_libre), func.sum(s.segundos_ocupado), func.sum(s.segundos_pausa),
+    ).filter(s.fecha >= desde, s.fecha <= hasta).group_by(s.desk_id).all()
+    acumulado = {f[0]: dict(zip(('atendidos', 'ausentes', 'segundos_libre', 'segundos_ocupado', 'segundos_pausa'),
+                                (int(v or 0) for v in f[1:]))) for f in filas}
+    
+    query = Desk.query
+    if piso:
+        query = query.filter(Desk.piso == str(piso))
+    inicio_rango = datetime.combine(desde, time.min)
+    fin_rango = min(ahora, datetime.combine(hasta + timedelta(days=1), time.min))
+    
+    resultado = []
+    for puesto in query.order_by(Desk.piso, Desk.nombre).all():
+        t = acumulado.get(puesto.id, {'atendidos': 0, 'ausentes': 0, 'segundos_libre': 0, 'segundos_ocupado': 0, 'segundos_pausa': 0})
+        # El estado actual recién se acumula en la próxima transición: sumar lo transcurrido
+        columna = _SEGUNDOS_ESTADO.get(puesto.estado)
+        if columna and puesto.estado_desde:
+            transcurrido = (fin_rango - max(puesto.estado_desde, inicio_rango)).total_seconds()
+            t[columna] += max(int(transcurrido), 0)
+        if puesto.id not in acumulado and not columna and not puesto.is_active:
+            continue
+        
+        abierto = t['segundos_libre'] + t['segundos_ocupado']
+        t.update({
+            'puesto_id': puesto.id,
+            'nombre': puesto.nombre,
+            'piso': puesto.piso,
+            'estado': puesto.estado,
+            'horas_abierto': round(abierto / 3600, 2),
+            'atendidos_por_hora': round(t['atendidos'] / (abierto / 3600), 2) if abierto else None,
+            'ocupacion': round(t['segundos_ocupado'] / abierto, 3) if abierto else None,
+            'atencion_promedio_segundos': round(t['segundos_ocupado'] / t['atendidos']) if t['atendidos'] else None,
+        })
+        resultado.append(t)
+    return resultado
+
+# ============================================
+# API
+# ============================================
+
+def _solo_admin():
+    if current_user.role != 'admin':
+        return jsonify({'success': False, 'message': 'No tienes acceso a esta sección'}), 403
+    return None
+
+def _puede_operar(puesto):
+    return current_user.role == 'admin' or current_user.role == f'piso{puesto.piso}'
+
+def _detalle(puesto):
+    data = puesto.to_dict()
+    turno = db.session.get(VisitorTurn, puesto.turno_id) if puesto.turno_id else None
+    data['turno'] = turno.to_dict() if turno else None
+    return data
+
+def _validar_puesto(data, puesto=None):
+    """Aplicar los campos recibidos al puesto; devuelve (puesto, error)"""
+    puesto = puesto or Desk()
+    catalog = get_catalog()
+    
+    if 'nombre' in data or puesto.nombre is None:
+        nombre = (data.get('nombre') or '').strip()[:100]
+        if not nombre:
+            return None, 'Nombre es requerido'
+        existente = Desk.query.filter_by(nombre=nombre).first()
+        if existente is not None and existente.id != puesto.id:
+            return None, f'Ya existe un puesto llamado {nombre}'
+        puesto.nombre = nombre
+    if 'piso' in data or puesto.piso is None:
+        piso = str(data.get('piso') or '').strip()
+        if not catalog.areas_por_piso(piso):
+            return None, f'Piso no válido: {piso}'
+        puesto.piso = piso
+    if 'areas' in data:
+        areas = data['areas'] or []
+        if isinstance(areas, str):
+            areas = [a.strip() for a in areas.split(',')]
+        puesto.areas = ','.join(a for a in areas if a) or None
+    
+    validas = {a['key'] for a in catalog.areas_por_piso(puesto.piso)}
+    invalidas = [a for a in puesto.area_keys() if a not in validas]
+    if invalidas:
+        return None, f'Áreas que no son del piso {puesto.piso}: {", ".join(invalidas)}'
+    if 'is_active' in data:
+        if not data['is_active'] and puesto.estado not in (None, 'CERRADO'):
+            return None, 'Cerrar el puesto antes de desactivarlo'
+        puesto.is_active = bool(data['is_active'])
+    return puesto, None
+
+def _operar(puesto_id, accion):
+    """Ejecutar una acción del agente sobre su puesto y responder con el puesto actualizado"""
+    puesto = Desk.query.get_or_404(puesto_id)
+    if not _puede_operar(puesto):
+        return jsonify({'success': False, 'message': 'No tienes acceso a este puesto'}), 403
+    if not puesto.is_active:
+        return jsonify({'success': False, 'message': 'El puesto está desactivado'}), 400
+    
+    try:
+        turno = accion(puesto)
+        db.session.commit()
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': str(e)}), 400
+    except PuestoModificado:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': 'El puesto cambió mientras tanto, actualizá la pantalla'}), 409
+    
+    if turno is not None:
+        _notificar_llamado(turno)
+    return jsonify({'success': True, 'data': _detalle(puesto)})
+
+@puestos_bp.route('', methods=['GET'])
+@login_required
+def api_listar_puestos():
+    """Listar puestos (de un piso con ?piso=) con su estado y turno en curso"""
+    query = Desk.query.filter_by(is_active=True)
+    piso = request.args.get('piso')
+    if piso:
+        query = query.filter_by(piso=str(piso))
+    puestos = query.order_by(Desk.piso, Desk.nombre).all()
+    return jsonify({'success': True, 'data': [_detalle(p) for p in puestos], 'count': len(puestos)})
+
+@puestos_bp.route('', methods=['POST'])
+@login_required
+def api_crear_puesto():
+    """Crear puesto - solo admin"""
+    denegado = _solo_admin()
+    if denegado:
+        return denegado
+    
+    puesto, error = _validar_puesto(request.get_json() or {})
+    if error:
+        return jsonify({'success': False, 'message': error}), 400
+    db.session.add(puesto)
+    db.session.commit()
+    return jsonify({'success': True, 'data': puesto.to_dict()}), 201
+
+@puestos_bp.route('/<int:puesto_id>', methods=['PUT'])
+@login_required
+def api_actualizar_puesto(puesto_id):
+    """Cambiar nombre, piso, áreas o activar/desactivar un puesto - solo admin"""
+    denegado = _solo_admin()
+    if denegado:
+        return denegado
+    
+    puesto = Desk.query.get_or_404(puesto_id)
+    puesto, error = _validar_puesto(request.get_json() or {}, puesto)
+    if error:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': error}), 400
+    db.session.commit()
+    return jsonify({'success': True, 'data': puesto.to_dict()})
+
+@puestos_bp.route('/<int:puesto_id>/abrir', methods=['POST'])
+@login_required
+def api_abrir_puesto(puesto_id):
+    """El agente abre (o reanuda) su puesto y recibe el próximo turno"""
+    agente = ((request.get_json() or {}).get('agente') or '').strip()[:150] or None
+    return _operar(puesto_id, lambda puesto: abrir(puesto, agente))
+
+@puestos_bp.route('/<int:puesto_id>/siguiente', methods=['POST'])
+@login_required
+def api_siguiente_puesto(puesto_id):
+    """Cerrar el turno en curso (atendido o ausente) y recibir el próximo"""
+    resultado = (request.get_json() or {}).get('resultado', 'atendido')
+    if resultado not in RESULTADOS:
+        return jsonify({'success': False, 'message': f'resultado debe ser uno de {", ".join(RESULTADOS)}'}), 400
+    return _operar(puesto_id, lambda puesto: liberar(puesto, resultado, 'LIBRE'))
+
+@puestos_bp.route('/<int:puesto_id>/pausa', methods=['POST'])
+@login_required
+def api_pausar_puesto(puesto_id):
+    """Cerrar el turno en curso y pausar el puesto (no recibe turnos hasta reanudar)"""
+    resultado = (request.get_json() or {}).get('resultado', 'atendido')
+    if resultado not in RESULTADOS:
+        return jsonify({'success': False, 'message': f'resultado debe ser uno de {", ".join(RESULTADOS)}'}), 400
+    return _operar(puesto_id, lambda puesto: liberar(puesto, resultado, 'PAUSA'))
+
+@puestos_bp.route('/<int:puesto_id>/cerrar', methods=['POST'])
+@login_required
+def api_cerrar_puesto(puesto_id):
+    """Cerrar el turno en curso y el puesto (fin de jornada del agente)"""
+    resultado = (request.get_json() or {}).get('resultado', 'atendido')
+    if resultado not in RESULTADOS:
+        return jsonify({'success': False, 'message': f'resultado debe ser uno de {", ".join(RESULTADOS)}'}), 400
+    return _operar(puesto_id, lambda puesto: liberar(puesto, resultado, 'CERRADO'))
+
+@puestos_bp.route('/estadisticas', methods=['GET'])
+@login_required
+def api_rendimiento_puestos():
+    """Rendimiento por puesto en un rango (?desde=&hasta= YYYY-MM-DD, por defecto hoy)"""
+    hoy = ahora_local().date()
+    try:
+        desde = datetime.strptime(request.args['desde'], '%Y-%m-%d').date() if request.args.get('desde') else hoy
+        hasta = datetime.strptime(request.args['hasta'], '%Y-%m-%d').date() if request.args.get('hasta') else hoy
+    except ValueError:
+        return jsonify({'success': False, 'message': 'Fechas con formato YYYY-MM-DD'}), 400
+    if hasta < desde:
+        return jsonify({'success': False, 'message': 'hasta debe ser posterior a desde'}), 400
+    
+    piso = request.args.get('piso')
+    if current_user.role != 'admin' and current_user.role != f'piso{piso}':
+        return jsonify({'success': False, 'message': 'No tienes acceso a esta sección'}), 403
+    
+    datos = rendimiento(desde, hasta, piso)
+    return jsonify({'success': True, 'data': datos, 'desde': desde.isoformat(), 'hasta': hasta.isoformat()})
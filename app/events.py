@@ -0,0 +1,207 @@
+"""
+Bus de eventos de turnos y chat compartido entre workers (Postgres LISTEN/NOTIFY o en proceso)
+"""
+import json
+import re
+import threading
+import time
+
+from flask import current_app, has_app_context
+from sqlalchemy import event, text
+
+from . import db
+
+# NOTIFY admite payloads de hasta 8000 bytes
+MAX_PAYLOAD_BYTES = 7900
+
+def _serializar(tipo, objeto, datos):
+    """Evento como dict JSON; los turnos viajan resumidos (los clientes piden el detalle por API)"""
+    from .models import VisitorTurn, ChatMessage
+    
+    evento = {'tipo': tipo, 'ts': time.time()}
+    if isinstance(objeto, VisitorTurn):
+        evento['data'] = {
+            'id': objeto.id,
+            'estado': objeto.estado,
+            'piso': objeto.piso,
+            'area_key': objeto.area_key,
+            'prioridad': objeto.prioridad,
+        }
+    elif isinstance(objeto, ChatMessage):
+        evento['data'] = objeto.to_dict()
+    else:
+        evento['data'] = {}
+    evento['data'].update(datos)
+    return evento
+
+class BusEnMemoria:
+    """Entrega los eventos a los suscriptores del mismo proceso (SQLite, tests, un solo worker)"""
+    
+    backend = 'memoria'
+    
+    def __init__(self, logger=None):
+        self.logger = logger
+        self._suscriptores = []
+        self._lock = threading.Lock()
+    
+    def suscribir(self, callback):
+        """Registrar un callback(evento); devuelve la función para cancelar la suscripción"""
+        with self._lock:
+            self._suscriptores.append(callback)
+        
+        def cancelar():
+            with self._lock:
+                if callback in self._suscriptores:
+                    self._suscriptores.remove(callback)
+        return cancelar
+    
+    def entregar(self, evento):
+        with self._lock:
+            suscriptores = list(self._suscriptores)
+        for callback in suscriptores:
+            try:
+                callback(evento)
+            except Exception:
+                if self.logger:
+                    self.logger.exception('Error en suscriptor de eventos')
+    
+    def antes_de_commit(self, session, eventos):
+        pass
+    
+    def despues_de_commit(self, eventos):
+        for evento in eventos:
+            self.entregar(evento)
+
+class BusPostgres(BusEnMemoria):
+    """Publica con pg_notify dentro de la transacción y escucha con LISTEN en un hilo por proceso.
+    
+    El NOTIFY sale recién con el COMMIT, así que nadie ve eventos de transacciones revertidas,
+    y todos los workers (incluido el que publica) los reciben por la misma vía.
+    """
+    
+    backend = 'postgres'
+    
+    def __init__(self, engine, canal, logger=None):
+        super().__init__(logger)
+        if not re.fullmatch(r'[a-z_][a-z0-9_]*', canal):
+            raise ValueError(f'Canal de eventos inválido: {canal}')
+        self.engine = engine
+        self.canal = canal
+        self._escuchando = False
+    
+    def suscribir(self, callback):
+        self._iniciar_escucha()
+        return super().suscribir(callback)
+    
+    def antes_de_commit(self, session, eventos):
+        for evento in eventos:
+            payload = json.dumps(evento, default=str)
+            if len(payload.encode('utf-8')) > MAX_PAYLOAD_BYTES:
+                payload = json.dumps({'tipo': evento['tipo'], 'ts': evento['ts'], 'data': {'id': evento['data'].get('id')}})
+            session.execute(text('SELECT pg_notify(:canal, :payload)'), {'canal': self.canal, 'payload': payload})
+    
+    def despues_de_commit(self, eventos):
+        pass  # la entrega local llega por LISTEN, igual que en los demás workers
+    
+    def _iniciar_escucha(self):
+        with self._lock:
+            if self._escuchando:
+                return
+            self._escuchando = True
+        threading.Thread(target=self._escuchar, name='event-bus-listen', daemon=True).start()
+    
+    def _escuchar(self):
+        espera = 1
+        while True:
+            raw = None
+            try:
+                # Conexión dedicada, fuera del pool, en autocommit
+                raw = self.engine.raw_connection()
+                raw.detach()
+                conexion = raw.driver_connection
+                conexion.autocommit = True
+                conexion.execute(f'LISTEN {self.canal}')
+                espera = 1
+                while True:
+                    for notificacion in conexion.notifies(timeout=30):
+                        try:
+                            evento = json.loads(notificacion.payload)
+                        except ValueError:
+                            continue
+                        self.entregar(evento)
+            except Exception:
+                if self.logger:
+                    self.logger.exception('Conexión LISTEN perdida; reintentando en %s s', espera)
+                time.sleep(espera)
+                espera = min(espera * 2, 30)
+            finally:
+                if raw is not None:
+                    try:
+                        raw.close()
+                    except Exception:
+                        pass
+
+# ============================================
+# PUBLICACIÓN TRANSACCIONAL
+# ============================================
+
+def publicar_evento(tipo, objeto=None, **datos):
+    """Encolar un evento en la transacción actual; se entrega solo si la transacción confirma"""
+    db.session.info.setdefault('eventos_pendientes', []).append((tipo, objeto, datos))
+
+def obtener_bus():
+    return current_app.extensions['event_bus']
+
+def suscribir(callback):
+    return obtener_bus().suscribir(callback)
+
+def _antes_de_commit(session):
+    if not has_app_context():
+        return
+    # Asignar ids a los objetos nuevos antes de serializar; el flush también puede publicar
+    # (filas cacheadas modificadas, ver app.cache)
+    session.flush()
+    pendientes = session.info.get('eventos_pendientes')
+    if not pendientes:
+        return
+    session.info['eventos_pendientes'] = []
+    # Historial de transiciones de turnos, en la misma transacción que el cambio
+    from .turn_events import registrar_transiciones
+    registrar_transiciones(session, pendientes)
+    if 'event_bus' not in current_app.extensions:
+        return
+    eventos = [_serializar(tipo, objeto, datos) for tipo, objeto, datos in pendientes]
+    session.info['eventos_confirmados'] = eventos
+    obtener_bus().antes_de_commit(session, eventos)
+
+def _despues_de_commit(session):
+    eventos = session.info.pop('eventos_confirmados', None)
+    if eventos and has_app_context() and 'event_bus' in current_app.extensions:
+        obtener_bus().despues_de_commit(eventos)
+
+def _despues_de_rollback(session, transaccion_previa):
+    session.info.pop('eventos_pendientes', None)
+    session.info.pop('eventos_confirmados', None)
+
+_hooks_registrados = False
+
+def init_event_bus(app, engine):
+    """Elegir backend según EVENT_BUS_BACKEND ('auto' usa Postgres si la base lo es)"""
+    global _hooks_registrados
+    
+    backend = app.config.get('EVENT_BUS_BACKEND', 'auto')
+    if backend == 'auto':
+        backend = 'postgres' if engine.dialect.name == 'postgresql' else 'memoria'
+    
+    if backend == 'postgres':
+        bus = BusPostgres(engine, app.config.get('EVENT_BUS_CHANNEL', 'turnero_eventos'), app.logger)
+    else:
+        bus = BusEnMemoria(app.logger)
+    app.extensions['event_bus'] = bus
+    
+    if not _hooks_registrados:
+        event.listen(db.session, 'before_commit', _antes_de_commit)
+        event.listen(db.session, 'after_commit', _despues_de_commit)
+        event.listen(db.session, 'after_soft_rollback', _despues_de_rollback)
+        _hooks_registrados = True
+    return bus
@@ -0,0 +1,318 @@
+"""
+Importación de planillas históricas de visitas (CSV o XLSX) a visitor_turn.
+
+Lee el archivo fila por fila (memoria constante), normaliza área y motivo con las reglas
+del catálogo (una vez por texto distinto), inserta por lotes (COPY a una tabla temporal en
+Postgres, executemany en SQLite) y saltea las filas ya importadas por su huella. Los valores
+que no se pudieron mapear se vuelcan a un reporte CSV por archivo.
+"""
+import csv
+import hashlib
+import os
+import re
+from collections import Counter
+from datetime import datetime, date, time
+
+from sqlalchemy import insert, text
+
+from . import db
+from .catalog import get_catalog
+from .models import VisitorTurn, now_argentina
+from .renormalize import clasificar_motivo, clasificar_area
+from .typeahead import plegar
+
+ESTADOS_FINALES = ('ATENDIDO', 'RECHAZADO', 'VENCIDO')
+
+# Encabezados aceptados (plegados, sin espacios ni signos) para cada campo
+ALIAS_COLUMNAS = {
+    'nombre': ('nombre', 'apellidoynombre', 'nombreyapellido', 'nombrecompleto', 'visitante'),
+    'dni': ('dni', 'documento', 'nrodocumento', 'nrodni'),
+    'area_key': ('areakey',),
+    'area': ('area', 'areanombre', 'areadestino', 'destino', 'direccion', 'oficina'),
+    'motivo': ('motivo', 'motivotexto', 'motivodeconsulta', 'consulta'),
+    'estado': ('estado',),
+    'fecha_hora': ('horallegada', 'fechahora', 'fechayhora', 'ingreso'),
+    'fecha': ('fecha', 'dia'),
+    'hora': ('hora', 'horaingreso'),
+    'hora_autorizado': ('horaautorizado',),
+    'hora_atendido': ('horaatendido',),
+    'atendido_por': ('atendidopor', 'agente'),
+    'notas': ('notas', 'observaciones'),
+}
+
+# Fechas de planilla: dd/mm/aaaa [hh:mm[:ss]] (también con '-' y año de dos dígitos) o ISO
+_FECHA_DMY = re.compile(r'(\d{1,2})[/-](\d{1,2})[/-](\d{2}|\d{4})(?:[ T]+(\d{1,2}):(\d{2})(?::(\d{2}))?)?$')
+_HORA = re.compile(r'(\d{1,2}):(\d{2})(?::(\d{2}))?$')
+
+COLUMNAS_INSERT = (
+    'nombre', 'dni', 'area_key', 'area_nombre', 'piso', 'motivo_key', 'motivo_texto', 'estado', 'prioridad',
+    'hora_llegada', 'hora_autorizado', 'hora_atendido', 'atendido_por', 'notas', 'created_at', 'updated_at',
+    'import_hash',
+)
+
+class FilaInvalida(ValueError):
+    pass
+
+def _clave_encabezado(valor):
+    return ''.join(c for c in plegar(str(valor or '')) if c.isalnum())
+
+def mapear_encabezados(encabezados):
+    """{campo: índice de columna} según los alias; ValueError si faltan columnas obligatorias"""
+    indices = {}
+    claves = [_clave_encabezado(e) for e in encabezados]
+    for campo, alias in ALIAS_COLUMNAS.items():
+        for i, clave in enumerate(claves):
+            if clave in alias:
+                indices[campo] = i
+                break
+    faltantes = [c for c in ('nombre', 'area') if c not in indices and not (c == 'area' and 'area_key' in indices)]
+    if 'fecha_hora' not in indices and 'fecha' not in indices:
+        faltantes.append('fecha')
+    if faltantes:
+        raise ValueError(f"Faltan columnas obligatorias: {', '.join(faltantes)}")
+    return indices
+
+def _fecha_hora(valor):
+    """datetime sin zona a partir de una celda (datetime de Excel o texto); None si no se entiende"""
+    if valor is None or valor == '':
+        return None
+    if isinstance(valor, datetime):
+        return valor.replace(tzinfo=None, microsecond=0)
+    if isinstance(valor, date):
+        return datetime.combine(valor, time.min)
+    valor = str(valor).strip()
+    # Sin strptime: con un millón de filas el costo de probar formatos domina la importación
+    m = _FECHA_DMY.match(valor)
+    try:
+        if m:
+            dia, mes, anio, hora, minuto, segundo = m.groups()
+            anio = int(anio) + (2000 if len(anio) == 2 else 0)
+            return datetime(anio, int(mes), int(dia), int(hora or 0), int(minuto or 0), int(segundo or 0))
+        return datetime.fromisoformat(valor).replace(tzinfo=None, microsecond=0)
+    except ValueError:
+        return None
+
+def _hora(valor):
+    if isinstance(valor, time):
+        return valor
+    if isinstance(valor, datetime):
+        return valor.time()
+    m = _HORA.match(str(valor).strip()) if valor not in (None, '') else None
+    try:
+        return time(int(m.group(1)), int(m.group(2)), int(m.group(3) or 0)) if m else None
+    except ValueError:
+        return None
+
+def _texto(valor):
+    if valor is None:
+        return ''
+    if isinstance(valor, float) and valor.is_integer():
+        valor = int(valor)  # DNI leídos como número desde Excel
+    return str(valor).strip()
+
+# ============================================
+# LECTURA EN STREAMING
+# ============================================
+
+def leer_csv(ruta):
+    """Filas del CSV (detecta ';' o ',' y el BOM de Excel); la primera es el encabezado"""
+    with open(ruta, newline='', encoding='utf-8-sig', errors='replace') as f:
+        muestra = f.read(64 * 1024)
+        f.seek(0)
+        try:
+            dialecto = csv.Sniffer().sniff(muestra, delimiters=';,\t|')
+        except csv.Error:
+            dialecto = csv.excel
+        yield from csv.reader(f, dialecto)
+
+def leer_xlsx(ruta, hoja=None):
+    """Filas de la hoja (modo read-only de openpyxl: no carga el libro en memoria)"""
+    from openpyxl import load_workbook
+    
+    wb = load_workbook(ruta, read_only=True, data_only=True)
+    try:
+        ws = wb[hoja] if hoja else wb.worksheets[0]
+        yield from ws.iter_rows(values_only=True)
+    finally:
+        wb.close()
+
+def leer_filas(ruta, hoja=None):
+    if os.path.splitext(ruta)[1].lower() in ('.xlsx', '.xlsm'):
+        return leer_xlsx(ruta, hoja)
+    return leer_csv(ruta)
+
+# ============================================
+# NORMALIZACIÓN
+# ============================================
+
+class _Normalizador:
+    """Normaliza filas con el catálogo vigente, clasificando cada texto distinto una sola vez"""
+    
+    def __init__(self, catalog):
+        self.catalog = catalog
+        self.areas = {}
+        self.motivos = {}
+        self.anotaciones = Counter()
+        self.primera_fila = {}
+    
+    def _area(self, texto, area_key):
+        if area_key and area_key in self.catalog.por_key:
+            area = self.catalog.por_key[area_key]
+            return area['key'], area['nombre'], area.get('piso')
+        if texto not in self.areas:
+            self.areas[texto] = clasificar_area(texto, self.catalog)
+        return self.areas[texto]
+    
+    def _motivo(self, texto):
+        if texto not in self.motivos:
+            self.motivos[texto] = clasificar_motivo(texto, self.catalog)
+        return self.motivos[texto]
+    
+    def anotar(self, tipo, valor, numero):
+        """Registrar un valor sin mapear ('area', 'motivo') o una fila descartada ('fila_invalida')"""
+        self.anotaciones[(tipo, valor)] += 1
+        self.primera_fila.setdefault((tipo, valor), numero)
+    
+    def fila(self, valores, indices, numero, ahora):
+        """Dict listo para insertar; FilaInvalida si falta el nombre o la fecha"""
+        def campo(nombre):
+            i = indices.get(nombre)
+            return valores[i] if i is not None and i < len(valores) else None
+        
+        nombre = _texto(campo('nombre'))
+        if not nombre:
+            raise FilaInvalida('sin nombre')
+        
+        llegada = _fecha_hora(campo('fecha_hora')) if 'fecha_hora' in indices else None
+        if llegada is None and 'fecha' in indices:
+            llegada = _fecha_hora(campo('fecha'))
+            hora = _hora(campo('hora')) if llegada and 'hora' in indices else None
+            if llegada and hora:
+                llegada = datetime.combine(llegada.date(), hora)
+        if llegada is None:
+            raise FilaInvalida('fecha inválida')
+        
+        area_texto = _texto(campo('area'))
+        area = self._area(area_texto, _texto(campo('area_key')))
+        if area is None:
+            self.anotar('area', area_texto, numero)
+            area = ('DESCONOCIDO', area_texto or 'Área desconocida', None)
+        
+        motivo_texto = _texto(campo('motivo'))
+        motivo_key = self._motivo(motivo_texto)
+        if motivo_key is None:
+            self.anotar('motivo', motivo_texto, numero)
+        
+        # Las planillas son historia: un turno que quedó abierto se importa como VENCIDO
+        estado = _texto(campo('estado')).upper()
+        if estado not in ESTADOS_FINALES:
+            estado = 'VENCIDO' if estado in ('ESPERA', 'AUTORIZADO_SUBIR') else 'ATENDIDO'
+        
+        dni = _texto(campo('dni'))[:20] or None
+        huella = hashlib.sha1('\x1f'.join((
+            plegar(nombre), dni or '', llegada.isoformat(), plegar(area_texto), plegar(motivo_texto),
+        )).encode('utf-8')).hexdigest()
+        
+        return {
+            'nombre': nombre[:200],
+            'dni': dni,
+            'area_key': area[0],
+            'area_nombre': area[1][:200],
+            'piso': area[2],
+            'motivo_key': motivo_key,
+            'motivo_texto': (motivo_texto or 'SIN ESPECIFICAR')[:300],
+            'estado': estado,
+            'prioridad': 'NORMAL',
+            'hora_llegada': llegada,
+            'hora_autorizado': _fecha_hora(campo('hora_autorizado')),
+            'hora_atendido': _fecha_hora(campo('hora_atendido')),
+            'atendido_por': _texto(campo('atendido_por'))[:150] or None,
+            'notas': _texto(campo('notas')) or None,
+            'created_at': ahora,
+            'updated_at': ahora,
+            'import_hash': huella,
+        }
+
+# ============================================
+# INSERCIÓN POR LOTES
+# ============================================
+
+def _insertar_sqlite(filas):
+    """executemany con INSERT OR IGNORE: las huellas ya importadas no se duplican"""
+    stmt = insert(VisitorTurn.__table__).prefix_with('OR IGNORE')
+    return db.session.connection().execute(stmt, filas).rowcount
+
+def _insertar_postgres(filas):
+    """COPY a una tabla temporal y de ahí INSERT ... ON CONFLICT (import_hash) DO NOTHING"""
+    columnas = ', '.join(COLUMNAS_INSERT)
+    conexion = db.session.connection()
+    conexion.execute(text(
+        'CREATE TEMP TABLE IF NOT EXISTS import_visitor_turn '
+        '(LIKE visitor_turn INCLUDING DEFAULTS) ON COMMIT DELETE ROWS'
+    ))
+    driver = conexion.connection.driver_connection
+    with driver.cursor() as cursor:
+        with cursor.copy(f'COPY import_visitor_turn ({columnas}) FROM STDIN') as copy:
+            for fila in filas:
+                copy.write_row([fila[c] for c in COLUMNAS_INSERT])
+    return conexion.execute(text(
+        f'INSERT INTO visitor_turn ({columnas}) SELECT {columnas} FROM import_visitor_turn '
+        'ON CONFLICT (import_hash) DO NOTHING'
+    )).rowcount
+
+def _insertar(filas, dialecto):
+    if dialecto == 'postgresql':
+        insertadas = _insertar_postgres(filas)
+    else:
+        insertadas = _insertar_sqlite(filas)
+    db.session.commit()
+    return insertadas
+
+def escribir_reporte(ruta, normalizador):
+    """CSV con los valores sin mapear y las filas descartadas, de más a menos frecuente"""
+    with open(ruta, 'w', newline='', encoding='utf-8-sig') as f:
+        writer = csv.writer(f)
+        writer.writerow(['tipo', 'valor', 'apariciones', 'primera_fila'])
+        for (tipo, valor), cantidad in sorted(normalizador.anotaciones.items(), key=lambda kv: (kv[0][0], -kv[1])):
+            writer.writerow([tipo, valor, cantidad, normalizador.primera_fila[(tipo, valor)]])
+
+def importar_archivo(ruta, lote=5000, hoja=None, reporte=None, progreso=None):
+    """Importar una planilla; devuelve el resumen (leídas, insertadas, duplicadas, inválidas, ...)"""
+    filas = leer_filas(ruta, hoja)
+    try:
+        encabezados = next(filas)
+    except StopIteration:
+        raise ValueError('El archivo está vacío')
+    indices = mapear_encabezados(encabezados)
+    
+    dialecto = db.session.get_bind(mapper=VisitorTurn.__mapper__).dialect.name
+    normalizador = _Normalizador(get_catalog())
+    ahora = now_argentina()
+    totales = {'leidas': 0, 'insertadas': 0, 'duplicadas': 0, 'invalidas': 0}
+    
+    pendientes = []
+    for numero, valores in enumerate(filas, start=2):
+        if not any(v not in (None, '') for v in valores):
+            continue
+        totales['leidas'] += 1
+        try:
+            pendientes.append(normalizador.fila(valores, indices, numero, ahora))
+        except FilaInvalida as e:
+            totales['invalidas'] += 1
+            normalizador.anotar('fila_invalida', str(e), numero)
+            continue
+        if len(pendientes) >= lote:
+            totales['insertadas'] += _insertar(pendientes, dialecto)
+            pendientes = []
+            if progreso:
+                progreso(totales)
+    if pendientes:
+        totales['insertadas'] += _insertar(pendientes, dialecto)
+    
+    totales['duplicadas'] = totales['leidas'] - totales['invalidas'] - totales['insertadas']
+    totales['sin_mapear'] = sum(n for (tipo, _), n in normalizador.anotaciones.items() if tipo != 'fila_invalida')
+    totales['reporte'] = reporte or f'{ruta}.reporte.csv'
+    escribir_reporte(totales['reporte'], normalizador)
+    if progreso:
+        progreso(totales)
+    return totales
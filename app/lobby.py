@@ -0,0 +1,104 @@
+"""
+Pantalla pública del hall ("Llamados ahora"): muestra los turnos autorizados a subir hace
+poco, con nombres enmascarados. El JSON se arma una sola vez por transición de turnos y
+se sirve con ETag y Cache-Control, así cada pantalla que refresca casi no cuesta nada.
+"""
+import hashlib
+import json
+import threading
+import time
+from datetime import timedelta
+
+from flask import Blueprint, Response, current_app, render_template, request
+
+from .models import VisitorTurn, ahora_local
+
+lobby_bp = Blueprint('lobby', __name__, url_prefix='/pantalla')
+
+# Transiciones que agregan o sacan turnos del tablero
+EVENTOS_TABLERO = ('turno.autorizado', 'turno.atendido', 'turno.rechazado', 'turno.vencidos')
+
+def enmascarar_nombre(nombre):
+    """'juan carlos PÉREZ' -> 'Juan P.'"""
+    partes = (nombre or '').split()
+    if not partes:
+        return ''
+    if len(partes) == 1:
+        return partes[0].capitalize()
+    return f'{partes[0].capitalize()} {partes[-1][0].upper()}.'
+
+class _Tablero:
+    """Snapshot serializado del tablero; se regenera si hubo una transición o vence un llamado"""
+    
+    def __init__(self):
+        self.cuerpo = None
+        self.etag = None
+        self.sucio = True
+        self.vence = 0.0
+        self.cancelar = None
+        self.lock = threading.Lock()
+    
+    def recibir(self, evento):
+        if evento['tipo'] in EVENTOS_TABLERO:
+            self.sucio = True
+
+def _generar(config):
+    ventana = timedelta(minutes=config.get('LOBBY_VENTANA_MINUTOS', 10))
+    ahora = ahora_local()
+    turnos = (
+        VisitorTurn.query
+        .filter(VisitorTurn.estado == 'AUTORIZADO_SUBIR', VisitorTurn.hora_autorizado >= ahora - ventana)
+        .order_by(VisitorTurn.hora_autorizado.desc())
+        .limit(config.get('LOBBY_MAX_LLAMADOS', 8))
+        .all()
+    )
+    llamados = [{
+        'nombre': enmascarar_nombre(t.nombre),
+        'piso': t.piso,
+        'area': t.area_nombre,
+        'hora': t.hora_autorizado.strftime('%H:%M'),
+    } for t in turnos]
+    
+    # El llamado más viejo sale de pantalla al cumplir la ventana aunque no haya transiciones
+    if turnos:
+        restante = (turnos[-1].hora_autorizado.replace(tzinfo=None) + ventana - ahora).total_seconds()
+    else:
+        restante = float('inf')
+    cuerpo = json.dumps({'llamados': llamados}, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    return cuerpo, max(restante, 1)
+
+def obtener_tablero():
+    """(cuerpo JSON, etag) del snapshot vigente, regenerándolo solo si hace falta"""
+    tablero = current_app.extensions.get('lobby')
+    if tablero is None:
+        tablero = current_app.extensions.setdefault('lobby', _Tablero())
+    
+    if tablero.sucio or time.monotonic() >= tablero.vence:
+        with tablero.lock:
+            if tablero.cancelar is None:
+                from .events import suscribir
+                tablero.cancelar = suscribir(tablero.recibir)
+            if tablero.sucio or time.monotonic() >= tablero.vence:
+                # Se limpia antes de consultar: una transición durante la consulta vuelve a ensuciarlo
+                tablero.sucio = False
+                cuerpo, restante = _generar(current_app.config)
+                tablero.vence = time.monotonic() + restante
+                if cuerpo != tablero.cuerpo:
+                    tablero.cuerpo = cuerpo
+                    tablero.etag = hashlib.sha1(cuerpo).hexdigest()
+    return tablero.cuerpo, tablero.etag
+
+@lobby_bp.route('')
+def pantalla():
+    """Vista para los televisores del hall (pública, sin sesión)"""
+    return render_template('turns/pantalla.html', refresco=current_app.config.get('LOBBY_CACHE_SEGUNDOS', 5))
+
+@lobby_bp.route('/llamados')
+def llamados():
+    """Snapshot del tablero; responde 304 si la pantalla ya tiene la versión vigente"""
+    cuerpo, etag = obtener_tablero()
+    response = Response(cuerpo, mimetype='application/json')
+    response.set_etag(etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = current_app.config.get('LOBBY_CACHE_SEGUNDOS', 5)
+    return response.make_conditional(request)
@@ -0,0 +1,119 @@
+"""
+Logging estructurado y no bloqueante (JSON lines vía QueueHandler/QueueListener)
+"""
+import atexit
+import json
+import logging
+import os
+import queue
+import sys
+import uuid
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+from flask import g, has_request_context, request
+
+# Campos estándar de LogRecord que no se copian como extras
+_CAMPOS_RECORD = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime'}
+
+class JsonFormatter(logging.Formatter):
+    """Una línea JSON por registro"""
+    
+    def format(self, record):
+        entrada = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+            'module': record.module,
+            'line': record.lineno,
+        }
+        for clave, valor in vars(record).items():
+            if clave not in _CAMPOS_RECORD and not clave.startswith('_'):
+                entrada[clave] = valor
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entrada['exc'] = record.exc_text
+        return json.dumps(entrada, ensure_ascii=False, default=str)
+
+class RequestContextFilter(logging.Filter):
+    """Agregar request_id y endpoint al registro (se ejecuta en el hilo del request)"""
+    
+    def filter(self, record):
+        if has_request_context():
+            record.request_id = g.get('request_id')
+            record.endpoint = request.endpoint
+        return True
+
+class StructuredQueueHandler(QueueHandler):
+    """QueueHandler que conserva el traceback como texto en lugar de mezclarlo en el mensaje"""
+    
+    def prepare(self, record):
+        record = logging.makeLogRecord(vars(record))
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+def init_logging(app):
+    """Configurar request-id y, fuera de debug/testing, el pipeline asíncrono en JSON"""
+    
+    @app.before_request
+    def _asignar_request_id():
+        g.request_id = request.headers.get('X-Request-ID') or uuid.uuid4().hex
+    
+    @app.after_request
+    def _propagar_request_id(response):
+        request_id = g.get('request_id')
+        if request_id:
+            response.headers['X-Request-ID'] = request_id
+        return response
+    
+    nivel = getattr(logging, app.config.get('LOG_LEVEL', 'INFO').upper(), logging.INFO)
+    if app.debug or app.testing:
+        app.logger.setLevel(logging.DEBUG if app.debug else nivel)
+        return
+    
+    formatter = JsonFormatter()
+    destinos = []
+    
+    log_file = app.config.get('LOG_FILE')
+    if log_file:
+        directorio = os.path.dirname(log_file)
+        if directorio and not os.path.exists(directorio):
+            os.makedirs(directorio, exist_ok=True)
+        file_handler = RotatingFileHandler(
+            log_file,
+            maxBytes=app.config.get('LOG_MAX_BYTES', 10 * 1024 * 1024),
+            backupCount=app.config.get('LOG_BACKUP_COUNT', 10),
+            encoding='utf-8',
+        )
+        file_handler.setFormatter(formatter)
+        destinos.append(file_handler)
+    
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(formatter)
+    destinos.append(stream_handler)
+    
+    cola = queue.Queue(-1)
+    queue_handler = StructuredQueueHandler(cola)
+    queue_handler.addFilter(RequestContextFilter())
+    
+    from flask.logging import default_handler
+    app.logger.removeHandler(default_handler)
+    app.logger.addHandler(queue_handler)
+    app.logger.setLevel(nivel)
+    
+    listener = QueueListener(cola, *destinos, respect_handler_level=True)
+    listener.start()
+    
+    def _detener_listener():
+        # Vacía la cola pendiente al terminar el proceso (si no se detuvo antes)
+        if listener._thread is not None:
+            listener.stop()
+    
+    atexit.register(_detener_listener)
+    app.extensions['log_listener'] = listener
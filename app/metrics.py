@@ -0,0 +1,242 @@
+"""
+Instrumentación por request: latencias, consultas SQL y endpoint /metrics (formato Prometheus)
+"""
+import threading
+import time
+from functools import wraps
+
+from flask import Blueprint, Response, g, has_request_context, jsonify, request, current_app
+from flask_login import login_required, current_user
+
+metrics_bp = Blueprint('metrics', __name__)
+
+LATENCIA_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERIES_BUCKETS = (1, 2, 5, 10, 20, 50, 100)
+ENTREGA_BUCKETS = (5, 15, 30, 60, 300, 900, 1800, 3600, 7200, 21600, 86400)
+
+def _formatear_labels(nombres, valores):
+    if not nombres:
+        return ''
+    pares = []
+    for n, v in zip(nombres, valores):
+        v = str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pares.append(f'{n}="{v}"')
+    return '{' + ','.join(pares) + '}'
+
+class Counter:
+    """Contador monotónico con labels"""
+    
+    tipo = 'counter'
+    
+    def __init__(self, nombre, descripcion, labels=()):
+        self.nombre = nombre
+        self.descripcion = descripcion
+        self.labels = tuple(labels)
+        self._valores = {}
+        self._lock = threading.Lock()
+    
+    def inc(self, valor=1, **labels):
+        clave = tuple(labels.get(l, '') for l in self.labels)
+        with self._lock:
+            self._valores[clave] = self._valores.get(clave, 0) + valor
+    
+    def render(self):
+        lineas = [f'# HELP {self.nombre} {self.descripcion}', f'# TYPE {self.nombre} {self.tipo}']
+        with self._lock:
+            for clave, valor in sorted(self._valores.items()):
+                lineas.append(f'{self.nombre}{_formatear_labels(self.labels, clave)} {valor}')
+        return lineas
+
+class Gauge(Counter):
+    """Valor instantáneo con labels"""
+    
+    tipo = 'gauge'
+    
+    def set(self, valor, **labels):
+        clave = tuple(labels.get(l, '') for l in self.labels)
+        with self._lock:
+            self._valores[clave] = valor
+
+class Histogram:
+    """Histograma acumulativo con buckets fijos y labels"""
+    
+    tipo = 'histogram'
+    
+    def __init__(self, nombre, descripcion, labels=(), buckets=LATENCIA_BUCKETS):
+        self.nombre = nombre
+        self.descripcion = descripcion
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+    
+    def observe(self, valor, **labels):
+        clave = tuple(labels.get(l, '') for l in self.labels)
+        with self._lock:
+            serie = self._series.get(clave)
+            if serie is None:
+                serie = self._series[clave] = [[0] * len(self.buckets), 0, 0.0]
+            for i, limite in enumerate(self.buckets):
+                if valor <= limite:
+                    serie[0][i] += 1
+                    break
+            serie[1] += 1
+            serie[2] += valor
+    
+    def render(self):
+        lineas = [f'# HELP {self.nombre} {self.descripcion}', f'# TYPE {self.nombre} {self.tipo}']
+        nombres_bucket = self.labels + ('le',)
+        with self._lock:
+            for clave, (conteos, total, suma) in sorted(self._series.items()):
+                acumulado = 0
+                for limite, conteo in zip(self.buckets, conteos):
+                    acumulado += conteo
+                    lineas.append(f'{self.nombre}_bucket{_formatear_labels(nombres_bucket, clave + (limite,))} {acumulado}')
+                lineas.append(f'{self.nombre}_bucket{_formatear_labels(nombres_bucket, clave + ("+Inf",))} {total}')
+                lineas.append(f'{self.nombre}_sum{_formatear_labels(self.labels, clave)} {suma}')
+                lineas.append(f'{self.nombre}_count{_formatear_labels(self.labels, clave)} {total}')
+        return lineas
+
+class Registry:
+    """Registro de métricas del proceso"""
+    
+    def __init__(self):
+        self._metricas = {}
+    
+    def register(self, metrica):
+        self._metricas[metrica.nombre] = metrica
+        return metrica
+    
+    def render(self):
+        lineas = []
+        for metrica in self._metricas.values():
+            lineas.extend(metrica.render())
+        return '\n'.join(lineas) + '\n'
+
+registry = Registry()
+
+http_requests_total = registry.register(Counter(
+    'turnero_http_requests_total', 'Requests HTTP atendidos', ('endpoint', 'method', 'status')))
+http_request_duration = registry.register(Histogram(
+    'turnero_http_request_duration_seconds', 'Latencia de requests HTTP', ('endpoint', 'method')))
+db_queries_per_request = registry.register(Histogram(
+    'turnero_db_queries_per_request', 'Consultas SQL por request', ('endpoint',), buckets=QUERIES_BUCKETS))
+db_queries_total = registry.register(Counter(
+    'turnero_db_queries_total', 'Consultas SQL ejecutadas', ('endpoint',)))
+db_query_seconds_total = registry.register(Counter(
+    'turnero_db_query_seconds_total', 'Tiempo total en consultas SQL', ('endpoint',)))
+db_slow_queries_total = registry.register(Counter(
+    'turnero_db_slow_queries_total', 'Consultas SQL por encima del umbral de lentitud', ('endpoint',)))
+notification_duration = registry.register(Histogram(
+    'turnero_notification_dispatch_duration_seconds', 'Duración del envío de notificaciones', ('tipo',)))
+push_tickets_total = registry.register(Counter(
+    'turnero_push_tickets_total', 'Tickets devueltos por Expo al enviar', ('status', 'error')))
+push_receipts_total = registry.register(Counter(
+    'turnero_push_receipts_total', 'Recibos de entrega procesados', ('status', 'error')))
+push_delivery_latency = registry.register(Histogram(
+    'turnero_push_delivery_latency_seconds', 'Tiempo desde el envío hasta el recibo de Expo', ('tipo',),
+    buckets=ENTREGA_BUCKETS))
+push_tokens_deactivated_total = registry.register(Counter(
+    'turnero_push_tokens_deactivated_total', 'Dispositivos desactivados por DeviceNotRegistered'))
+push_gateway_requests_total = registry.register(Counter(
+    'turnero_push_gateway_requests_total', 'Llamadas HTTP al gateway de push', ('resultado',)))
+push_circuit_state = registry.register(Gauge(
+    'turnero_push_circuit_state', 'Estado del circuit breaker del gateway (0 cerrado, 1 semiabierto, 2 abierto)'))
+db_read_routing_total = registry.register(Counter(
+    'turnero_db_read_routing_total', 'Requests de solo lectura por destino de sus consultas', ('destino', 'motivo')))
+desk_dispatch_total = registry.register(Counter(
+    'turnero_desk_dispatch_total', 'Intentos de asignar un turno a un puesto libre', ('resultado',)))
+cache_requests_total = registry.register(Counter(
+    'turnero_cache_requests_total', 'Lecturas de la caché por espacio, nivel y resultado', ('espacio', 'nivel', 'resultado')))
+cache_invalidations_total = registry.register(Counter(
+    'turnero_cache_invalidations_total', 'Etiquetas de caché invalidadas', ('etiqueta',)))
+
+def _endpoint_actual():
+    if has_request_context():
+        return request.endpoint or 'desconocido'
+    return 'fuera_de_request'
+
+def medir_notificacion(tipo):
+    """Decorador: registrar la duración de un envío de notificaciones"""
+    def decorator(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            inicio = time.perf_counter()
+            try:
+                return f(*args, **kwargs)
+            finally:
+                notification_duration.observe(time.perf_counter() - inicio, tipo=tipo)
+        return wrapper
+    return decorator
+
+def _instalar_eventos_sql(app, engine):
+    from sqlalchemy import event
+    
+    umbral = app.config.get('SLOW_QUERY_MS', 200) / 1000.0
+    logger = app.logger
+    
+    @event.listens_for(engine, 'before_cursor_execute')
+    def _antes(conn, cursor, statement, parameters, context, executemany):
+        # En el contexto de la ejecución y no en conn.info: si la sentencia falla no queda nada colgado
+        if context is not None:
+            context._metrics_inicio = time.perf_counter()
+    
+    @event.listens_for(engine, 'after_cursor_execute')
+    def _despues(conn, cursor, statement, parameters, context, executemany):
+        inicio = getattr(context, '_metrics_inicio', None)
+        if inicio is None:
+            return
+        duracion = time.perf_counter() - inicio
+        
+        if has_request_context():
+            g.metrics_queries = g.get('metrics_queries', 0) + 1
+            g.metrics_query_seconds = g.get('metrics_query_seconds', 0.0) + duracion
+        
+        if duracion >= umbral:
+            endpoint = _endpoint_actual()
+            db_slow_queries_total.inc(endpoint=endpoint)
+            # Nunca se registran los valores: solo la sentencia con placeholders
+            if executemany:
+                params = f'<{len(parameters)} filas redactadas>'
+            else:
+                params = f'<{len(parameters or ())} parámetros redactados>'
+            logger.warning('Consulta lenta (%.1f ms) en %s: %s %s',
+                           duracion * 1000, endpoint, ' '.join(statement.split()), params)
+
+def init_metrics(app, engine):
+    """Instalar hooks de request y eventos del engine"""
+    if not app.config.get('METRICS_ENABLED', True):
+        return
+    
+    _instalar_eventos_sql(app, engine)
+    
+    @app.before_request
+    def _iniciar_medicion():
+        g.metrics_inicio = time.perf_counter()
+        g.metrics_queries = 0
+        g.metrics_query_seconds = 0.0
+    
+    @app.after_request
+    def _registrar_medicion(response):
+        inicio = g.pop('metrics_inicio', None)
+        if inicio is None:
+            return response
+        endpoint = _endpoint_actual()
+        http_requests_total.inc(endpoint=endpoint, method=request.method, status=response.status_code)
+        http_request_duration.observe(time.perf_counter() - inicio, endpoint=endpoint, method=request.method)
+        queries = g.get('metrics_queries', 0)
+        db_queries_per_request.observe(queries, endpoint=endpoint)
+        if queries:
+            db_queries_total.inc(queries, endpoint=endpoint)
+            db_query_seconds_total.inc(g.get('metrics_query_seconds', 0.0), endpoint=endpoint)
+        return response
+
+@metrics_bp.route('/metrics')
+@login_required
+def metrics():
+    """Métricas del proceso en formato de texto de Prometheus - solo admin"""
+    if current_user.role != 'admin':
+        return jsonify({'success': False, 'message': 'No tienes acceso a esta sección'}), 403
+    if not current_app.config.get('METRICS_ENABLED', True):
+        return jsonify({'success': False, 'message': 'Métricas deshabilitadas'}), 404
+    return Response(registry.render(), mimetype='text/plain; version=0.0.4')
@@ -2,6 +2,7 @@ from . import db
 from flask_login import UserMixin
 from datetime import datetime, timezone, timedelta
 from werkzeug.security import generate_password_hash, check_password_hash
+from .events import publicar_evento
 
 # Timezone de Argentina (UTC-3)
 ARGENTINA_TZ = timezone(timedelta(hours=-3))
@@ -10,6 +11,10 @@ def now_argentina():
     """Obtener fecha/hora actual de Argentina"""
     return datetime.now(ARGENTINA_TZ)
 
+def ahora_local():
+    """Hora local de Argentina sin zona, como quedan guardadas las columnas DateTime"""
+    return now_argentina().replace(tzinfo=None)
+
 class User(UserMixin, db.Model):
     """Modelo de usuario para el sistema de turnos"""
     __tablename__ = 'user'
@@ -50,9 +55,22 @@ class User(UserMixin, db.Model):
             'last_login': self.last_login.isoformat() if self.last_login else None
         }
 
+class RevokedToken(db.Model):
+    """Token firmado revocado antes de vencer; la fila sobra una vez pasado expira_at"""
+    __tablename__ = 'revoked_token'
+    
+    jti = db.Column(db.String(64), primary_key=True)
+    tipo = db.Column(db.String(10), nullable=True)  # access | refresh
+    user_id = db.Column(db.Integer, nullable=True)
+    expira_at = db.Column(db.DateTime, nullable=False, index=True)  # UTC
+    created_at = db.Column(db.DateTime, default=now_argentina)
+
 class VisitorTurn(db.Model):
     """Turno de visitante para edificio municipal"""
     __tablename__ = 'visitor_turn'
+    __table_args__ = (
+        db.Index('ix_visitor_turn_piso_estado', 'piso', 'estado'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     nombre = db.Column(db.String(200), nullable=False, index=True)
@@ -68,7 +86,8 @@ class VisitorTurn(db.Model):
     motivo_texto = db.Column(db.String(300), nullable=True)  # texto libre ingresado
 
     # Estados del flujo
-    estado = db.Column(db.String(30), nullable=False, default='ESPERA')  # ESPERA | AUTORIZADO_SUBIR | ATENDIDO | RECHAZADO
+    estado = db.Column(db.String(30), nullable=False, default='ESPERA')  # ESPERA | AUTORIZADO_SUBIR | ATENDIDO | RECHAZADO | VENCIDO
+    prioridad = db.Column(db.String(20), nullable=False, default='NORMAL')  # ver Config.PRIORIDADES_TURNO
     hora_llegada = db.Column(db.DateTime, default=now_argentina, index=True)
     hora_autorizado = db.Column(db.DateTime, nullable=True)
     hora_atendido = db.Column(db.DateTime, nullable=True)
@@ -80,13 +99,16 @@ class VisitorTurn(db.Model):
 
     # Metadata
     created_at = db.Column(db.DateTime, default=now_argentina)
-    updated_at = db.Column(db.DateTime, default=now_argentina, onupdate=now_argentina)
+    updated_at = db.Column(db.DateTime, default=now_argentina, onupdate=now_argentina, index=True)  # marca de los snapshots incrementales
+    import_hash = db.Column(db.String(40), nullable=True, unique=True)  # huella de la fila importada (ver app.importer)
+    puesto_id = db.Column(db.Integer, db.ForeignKey('desk.id'), nullable=True, index=True)  # puesto que lo atendió (ver app.desks)
 
     def autorizar_subida(self, llamado_por: str | None = None):
         self.estado = 'AUTORIZADO_SUBIR'
         self.hora_autorizado = now_argentina()
         if llamado_por:
             self.llamado_por = llamado_por
+        publicar_evento('turno.autorizado', self)
         db.session.commit()
 
     def marcar_atendido(self, agente_nombre: str | None = None):
@@ -94,12 +116,14 @@ class VisitorTurn(db.Model):
         self.hora_atendido = now_argentina()
         if agente_nombre:
             self.atendido_por = agente_nombre
+        publicar_evento('turno.atendido', self)
         db.session.commit()
 
     def rechazar(self, motivo: str | None = None):
         self.estado = 'RECHAZADO'
         if motivo:
             self.notas = (self.notas + "\n" if self.notas else "") + f"Rechazado: {motivo}"
+        publicar_evento('turno.rechazado', self)
         db.session.commit()
 
     def tiempo_espera_segundos(self):
@@ -118,15 +142,56 @@ class VisitorTurn(db.Model):
             'motivo_key': self.motivo_key,
             'motivo_texto': self.motivo_texto,
             'estado': self.estado,
+            'prioridad': self.prioridad,
             'hora_llegada': self.hora_llegada.isoformat() if self.hora_llegada else None,
             'hora_autorizado': self.hora_autorizado.isoformat() if self.hora_autorizado else None,
             'hora_atendido': self.hora_atendido.isoformat() if self.hora_atendido else None,
             'llamado_por': self.llamado_por,
             'atendido_por': self.atendido_por,
+            'puesto_id': self.puesto_id,
             'notas': self.notas,
             'tiempo_espera_segundos': self.tiempo_espera_segundos(),
         }
 
+class TurnEvent(db.Model):
+    """Historial append-only de transiciones de turnos (se escribe junto con cada cambio, ver app.turn_events)"""
+    __tablename__ = 'turn_event'
+    __table_args__ = (
+        db.Index('ix_turn_event_ts_id', 'ts', 'id'),  # orden de reproducción
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    turno_id = db.Column(db.Integer, db.ForeignKey('visitor_turn.id'), nullable=False, index=True)
+    tipo = db.Column(db.String(20), nullable=False)  # creado | autorizado | atendido | rechazado | vencido
+    actor = db.Column(db.String(150), nullable=True)  # usuario, 'sistema', 'barrido' o 'historial'
+    ts = db.Column(db.DateTime, default=now_argentina, nullable=False)
+
+class Visitor(db.Model):
+    """Perfil de visitante por DNI normalizado, mantenido al registrar cada turno"""
+    __tablename__ = 'visitor'
+    
+    dni = db.Column(db.String(20), primary_key=True)  # solo dígitos (ver utils.normalize_dni)
+    nombre = db.Column(db.String(200), nullable=False)
+    total_visitas = db.Column(db.Integer, nullable=False, default=0)
+    primera_visita = db.Column(db.DateTime, nullable=True)
+    ultima_visita = db.Column(db.DateTime, nullable=True)
+    ultima_area_key = db.Column(db.String(100), nullable=True)
+    ultimo_motivo_key = db.Column(db.String(100), nullable=True)
+    ultimo_motivo_texto = db.Column(db.String(300), nullable=True)
+    updated_at = db.Column(db.DateTime, default=now_argentina, onupdate=now_argentina, index=True)
+    
+    def to_dict(self):
+        return {
+            'dni': self.dni,
+            'nombre': self.nombre,
+            'total_visitas': self.total_visitas,
+            'primera_visita': self.primera_visita.isoformat() if self.primera_visita else None,
+            'ultima_visita': self.ultima_visita.isoformat() if self.ultima_visita else None,
+            'ultima_area_key': self.ultima_area_key,
+            'ultimo_motivo_key': self.ultimo_motivo_key,
+            'ultimo_motivo_texto': self.ultimo_motivo_texto,
+        }
+
 class ChatMessage(db.Model):
     """Mensajes del chat interno entre recepción y pisos"""
     __tablename__ = 'chat_message'
@@ -147,3 +212,238 @@ class ChatMessage(db.Model):
             'timestamp': self.timestamp.isoformat() if self.timestamp else None,
             'leido': self.leido
         }
+
+class Area(db.Model):
+    """Área municipal del catálogo (reemplaza la lista fija de la configuración)"""
+    __tablename__ = 'area'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    key = db.Column(db.String(100), unique=True, nullable=False, index=True)
+    nombre = db.Column(db.String(200), nullable=False)
+    piso = db.Column(db.String(20), nullable=True, index=True)
+    icon = db.Column(db.String(20), nullable=True)
+    orden = db.Column(db.Integer, default=0)
+    is_active = db.Column(db.Boolean, default=True)
+    created_at = db.Column(db.DateTime, default=now_argentina)
+    updated_at = db.Column(db.DateTime, default=now_argentina, onupdate=now_argentina)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'key': self.key,
+            'nombre': self.nombre,
+            'piso': self.piso,
+            'icon': self.icon,
+            'orden': self.orden,
+            'is_active': self.is_active,
+        }
+
+class CatalogVariant(db.Model):
+    """Variante de texto libre que se normaliza a una clave de área o motivo"""
+    __tablename__ = 'catalog_variant'
+    __table_args__ = (db.UniqueConstraint('tipo', 'variante', name='uq_catalog_variant_tipo_variante'),)
+    
+    id = db.Column(db.Integer, primary_key=True)
+    tipo = db.Column(db.String(20), nullable=False)  # 'area' | 'motivo'
+    variante = db.Column(db.String(300), nullable=False)
+    clave = db.Column(db.String(100), nullable=False)
+    created_at = db.Column(db.DateTime, default=now_argentina)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'tipo': self.tipo,
+            'variante': self.variante,
+            'clave': self.clave,
+        }
+
+class CatalogVersion(db.Model):
+    """Versión de cada catálogo cacheado en memoria; se incrementa en cada cambio"""
+    __tablename__ = 'catalog_version'
+    
+    nombre = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=1)
+    updated_at = db.Column(db.DateTime, default=now_argentina, onupdate=now_argentina)
+
+class AppointmentTemplate(db.Model):
+    """Plantilla semanal de turnos programados de un área (día, franja horaria y cupo)"""
+    __tablename__ = 'appointment_template'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    area_key = db.Column(db.String(100), nullable=False, index=True)
+    dia_semana = db.Column(db.Integer, nullable=False)  # 0 = lunes ... 6 = domingo (Config.DIAS_SEMANA)
+    hora_inicio = db.Column(db.Time, nullable=False)
+    hora_fin = db.Column(db.Time, nullable=False)
+    duracion_minutos = db.Column(db.Integer, nullable=False, default=15)
+    capacidad = db.Column(db.Integer, nullable=False, default=1)  # personas por franja
+    is_active = db.Column(db.Boolean, default=True)
+    created_at = db.Column(db.DateTime, default=now_argentina)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'area_key': self.area_key,
+            'dia_semana': self.dia_semana,
+            'hora_inicio': self.hora_inicio.strftime('%H:%M') if self.hora_inicio else None,
+            'hora_fin': self.hora_fin.strftime('%H:%M') if self.hora_fin else None,
+            'duracion_minutos': self.duracion_minutos,
+            'capacidad': self.capacidad,
+            'is_active': self.is_active,
+        }
+
+class AppointmentSlot(db.Model):
+    """Franja concreta reservable; 'completo' mantiene el índice de disponibilidad"""
+    __tablename__ = 'appointment_slot'
+    __table_args__ = (
+        db.UniqueConstraint('area_key', 'inicio', name='uq_appointment_slot_area_inicio'),
+        # Las consultas de disponibilidad recorren solo las franjas libres del área, en orden
+        db.Index('ix_appointment_slot_disponibilidad', 'area_key', 'completo', 'inicio'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    area_key = db.Column(db.String(100), nullable=False)
+    template_id = db.Column(db.Integer, db.ForeignKey('appointment_template.id'), nullable=True)
+    inicio = db.Column(db.DateTime, nullable=False)  # hora local (Argentina), sin zona
+    fin = db.Column(db.DateTime, nullable=False)
+    capacidad = db.Column(db.Integer, nullable=False, default=1)
+    reservados = db.Column(db.Integer, nullable=False, default=0)
+    completo = db.Column(db.Boolean, nullable=False, default=False)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'area_key': self.area_key,
+            'inicio': self.inicio.isoformat() if self.inicio else None,
+            'fin': self.fin.isoformat() if self.fin else None,
+            'capacidad': self.capacidad,
+            'reservados': self.reservados,
+            'disponibles': max(self.capacidad - self.reservados, 0),
+        }
+
+class Appointment(db.Model):
+    """Reserva de un visitante en una franja; al presentarse se convierte en VisitorTurn"""
+    __tablename__ = 'appointment'
+    __table_args__ = (
+        db.Index('ix_appointment_slot_estado', 'slot_id', 'estado'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    slot_id = db.Column(db.Integer, db.ForeignKey('appointment_slot.id'), nullable=False)
+    area_key = db.Column(db.String(100), nullable=False)
+    nombre = db.Column(db.String(200), nullable=False)
+    dni = db.Column(db.String(20), nullable=True, index=True)
+    motivo_texto = db.Column(db.String(300), nullable=True)
+    estado = db.Column(db.String(20), nullable=False, default='RESERVADA')  # RESERVADA | PRESENTADA | CANCELADA
+    turno_id = db.Column(db.Integer, db.ForeignKey('visitor_turn.id'), nullable=True)
+    creado_por = db.Column(db.String(150), nullable=True)
+    created_at = db.Column(db.DateTime, default=now_argentina)
+    updated_at = db.Column(db.DateTime, default=now_argentina, onupdate=now_argentina)
+    
+    slot = db.relationship('AppointmentSlot', lazy='joined')
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'slot_id': self.slot_id,
+            'area_key': self.area_key,
+            'nombre': self.nombre,
+            'dni': self.dni,
+            'motivo_texto': self.motivo_texto,
+            'estado': self.estado,
+            'turno_id': self.turno_id,
+            'inicio': self.slot.inicio.isoformat() if self.slot else None,
+            'fin': self.slot.fin.isoformat() if self.slot else None,
+        }
+
+class TurnStatsHourly(db.Model):
+    """Cubo de estadísticas: turnos de cada hora de llegada por área, piso, motivo y estado final.
+    
+    Piso y motivo sin dato se guardan como '' (son parte de la clave primaria).
+    """
+    __tablename__ = 'turn_stats_hourly'
+    
+    fecha = db.Column(db.Date, primary_key=True)
+    hora = db.Column(db.SmallInteger, primary_key=True)  # 0-23, hora local de llegada
+    area_key = db.Column(db.String(100), primary_key=True)
+    piso = db.Column(db.String(20), primary_key=True)
+    motivo_key = db.Column(db.String(100), primary_key=True)
+    estado = db.Column(db.String(30), primary_key=True)
+    total = db.Column(db.Integer, nullable=False, default=0)
+    con_espera = db.Column(db.Integer, nullable=False, default=0)  # turnos autorizados (con hora_autorizado)
+    espera_segundos = db.Column(db.BigInteger, nullable=False, default=0)  # suma llegada -> autorizado
+
+class TurnStatsDaily(db.Model):
+    """Mismo cubo agregado por día (lo que leen los reportes por rango de fechas)"""
+    __tablename__ = 'turn_stats_daily'
+    
+    fecha = db.Column(db.Date, primary_key=True)
+    area_key = db.Column(db.String(100), primary_key=True)
+    piso = db.Column(db.String(20), primary_key=True)
+    motivo_key = db.Column(db.String(100), primary_key=True)
+    estado = db.Column(db.String(30), primary_key=True)
+    total = db.Column(db.Integer, nullable=False, default=0)
+    con_espera = db.Column(db.Integer, nullable=False, default=0)
+    espera_segundos = db.Column(db.BigInteger, nullable=False, default=0)
+
+class TurnStatsDay(db.Model):
+    """Días ya construidos del cubo: un día sin turnos no deja filas en el cubo pero sí acá"""
+    __tablename__ = 'turn_stats_day'
+    
+    fecha = db.Column(db.Date, primary_key=True)
+    construido_at = db.Column(db.DateTime, default=now_argentina)
+
+class JobCheckpoint(db.Model):
+    """Progreso de los procesos batch reanudables: último id procesado y versión de reglas usada"""
+    __tablename__ = 'job_checkpoint'
+    
+    nombre = db.Column(db.String(50), primary_key=True)
+    ultimo_id = db.Column(db.BigInteger, nullable=False, default=0)
+    version = db.Column(db.Integer, nullable=True)
+    # Días con filas corregidas cuyo cubo de estadísticas falta rehacer (se acumulan entre corridas)
+    pendiente_desde = db.Column(db.Date, nullable=True)
+    pendiente_hasta = db.Column(db.Date, nullable=True)
+    updated_at = db.Column(db.DateTime, default=now_argentina, onupdate=now_argentina)
+
+class Desk(db.Model):
+    """Puesto de atención de un piso (box, escritorio) con el agente que lo ocupa y su estado"""
+    __tablename__ = 'desk'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    nombre = db.Column(db.String(100), unique=True, nullable=False)
+    piso = db.Column(db.String(20), nullable=False, index=True)
+    areas = db.Column(db.Text, nullable=True)  # claves de área separadas por coma; vacío = todas las del piso
+    agente = db.Column(db.String(150), nullable=True)
+    estado = db.Column(db.String(20), nullable=False, default='CERRADO')  # CERRADO | LIBRE | OCUPADO | PAUSA
+    estado_desde = db.Column(db.DateTime, nullable=True)  # hora local (Argentina), sin zona
+    turno_id = db.Column(db.Integer, nullable=True)  # turno en curso (visitor_turn.id) mientras está OCUPADO
+    version = db.Column(db.Integer, nullable=False, default=0)  # se incrementa en cada transición
+    is_active = db.Column(db.Boolean, default=True)
+    created_at = db.Column(db.DateTime, default=now_argentina)
+    
+    def area_keys(self):
+        return [a for a in (self.areas or '').split(',') if a]
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'nombre': self.nombre,
+            'piso': self.piso,
+            'areas': self.area_keys(),
+            'agente': self.agente,
+            'estado': self.estado,
+            'estado_desde': self.estado_desde.isoformat() if self.estado_desde else None,
+            'turno_id': self.turno_id,
+            'is_active': self.is_active,
+        }
+
+class DeskDailyStats(db.Model):
+    """Rendimiento diario de cada puesto: turnos cerrados y segundos en cada estado"""
+    __tablename__ = 'desk_stats_daily'
+    
+    desk_id = db.Column(db.Integer, db.ForeignKey('desk.id'), primary_key=True)
+    fecha = db.Column(db.Date, primary_key=True)
+    atendidos = db.Column(db.Integer, nullable=False, default=0)
+    ausentes = db.Column(db.Integer, nullable=False, default=0)  # llamados que no se presentaron
+    segundos_libre = db.Column(db.Integer, nullable=False, default=0)  # abierto y sin turno (ocioso)
+    segundos_ocupado = db.Column(db.Integer, nullable=False, default=0)
+    segundos_pausa = db.Column(db.Integer, nullable=False, default=0)
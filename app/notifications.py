@@ -1,11 +1,14 @@
 """
 Sistema de notificaciones push para la app mobile
 """
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
 from flask_login import login_required, current_user
+from sqlalchemy import update, or_, func
 from . import db
-from datetime import datetime
-import requests
+from .metrics import medir_notificacion, push_tickets_total, push_tokens_deactivated_total
+from .push_coalescer import encolar_notificacion
+from .push_client import obtener_cliente, CircuitoAbierto
+from datetime import datetime, timedelta
 
 notifications_bp = Blueprint('notifications', __name__, url_prefix='/api/notifications')
 
@@ -20,6 +23,7 @@ class DeviceToken(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     is_active = db.Column(db.Boolean, default=True)
+    last_push_at = db.Column(db.DateTime, nullable=True)  # último push enviado (intervalo mínimo por dispositivo)
     
     def to_dict(self):
         return {
@@ -30,6 +34,62 @@ class DeviceToken(db.Model):
             'created_at': self.created_at.isoformat() if self.created_at else None
         }
 
+class PushTicket(db.Model):
+    """Ticket de Expo pendiente de recibo de entrega (ver push_receipts)"""
+    __tablename__ = 'push_ticket'
+    __table_args__ = (
+        db.Index('ix_push_ticket_estado_enviado', 'estado', 'enviado_at'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    ticket_id = db.Column(db.String(100), nullable=False, unique=True)
+    token = db.Column(db.String(500), nullable=False)
+    tipo = db.Column(db.String(50), nullable=True)  # data.type de la notificación
+    estado = db.Column(db.String(20), nullable=False, default='PENDIENTE')  # PENDIENTE | OK | ERROR | EXPIRADO
+    error = db.Column(db.String(100), nullable=True)
+    enviado_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    procesado_at = db.Column(db.DateTime, nullable=True)
+
+def desactivar_tokens(tokens):
+    """Desactivar en un solo UPDATE los dispositivos que Expo reporta como no registrados"""
+    tokens = list(set(tokens))
+    if not tokens:
+        return 0
+    filas = db.session.execute(
+        update(DeviceToken)
+        .where(DeviceToken.token.in_(tokens), DeviceToken.is_active == True)
+        .values(is_active=False, updated_at=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if filas:
+        push_tokens_deactivated_total.inc(filas)
+        current_app.logger.info('Dispositivos desactivados por DeviceNotRegistered', extra={'cantidad': filas})
+    return filas
+
+def registrar_tickets(messages, tickets):
+    """Guardar los tickets aceptados para pedir su recibo y desactivar los tokens ya muertos"""
+    ahora = datetime.utcnow()
+    pendientes = []
+    muertos = []
+    for message, ticket in zip(messages, tickets):
+        error = (ticket.get('details') or {}).get('error') if ticket.get('status') == 'error' else None
+        push_tickets_total.inc(status=ticket.get('status', 'desconocido'), error=error or '')
+        if ticket.get('status') == 'ok' and ticket.get('id'):
+            pendientes.append({
+                'ticket_id': ticket['id'],
+                'token': message['to'],
+                'tipo': (message.get('data') or {}).get('type'),
+                'estado': 'PENDIENTE',
+                'enviado_at': ahora,
+            })
+        elif error == 'DeviceNotRegistered':
+            muertos.append(message['to'])
+    
+    if pendientes:
+        db.session.execute(PushTicket.__table__.insert(), pendientes)
+    desactivar_tokens(muertos)
+    db.session.commit()
+
 @notifications_bp.route('/register-token', methods=['POST'])
 @login_required
 def register_token():
@@ -88,7 +148,6 @@ def test_notification():
     title = data.get('title', 'Test Notification')
     body = data.get('body', 'Esta es una notificación de prueba')
     
-    from .push_service import send_push_notification
     result = send_push_notification(current_user.id, title, body)
     
     return jsonify({
@@ -97,18 +156,58 @@ def test_notification():
         'result': result
     })
 
+@notifications_bp.route('/gateway', methods=['GET'])
+@login_required
+def gateway_status():
+    """Estado del circuit breaker del gateway de push - solo admin"""
+    if current_user.role != 'admin':
+        return jsonify({'success': False, 'message': 'No tienes acceso a esta sección'}), 403
+    
+    return jsonify({'success': True, 'data': obtener_cliente().breaker.to_dict()})
+
 
-def send_push_notification(user_id, title, body, data=None):
+def reservar_tokens(user_id, intervalo):
+    """
+    Tomar los dispositivos activos del usuario que no recibieron un push en los últimos
+    'intervalo' segundos, marcándolos en un solo UPDATE (vale entre workers).
+    Devuelve (tokens, segundos hasta que se libere alguno | None si no hay dispositivos).
+    """
+    ahora = datetime.utcnow()
+    limite = ahora - timedelta(seconds=intervalo)
+    libres = or_(DeviceToken.last_push_at.is_(None), DeviceToken.last_push_at <= limite)
+    
+    tokens = db.session.execute(
+        update(DeviceToken)
+        .where(DeviceToken.user_id == user_id, DeviceToken.is_active == True, libres)
+        .values(last_push_at=ahora)
+        .returning(DeviceToken.token)
+        .execution_options(synchronize_session=False)
+    ).scalars().all()
+    db.session.commit()
+    if tokens:
+        return tokens, None
+    
+    ultimo = db.session.query(func.min(DeviceToken.last_push_at)).filter(
+        DeviceToken.user_id == user_id, DeviceToken.is_active == True
+    ).scalar()
+    if ultimo is None:
+        return [], None
+    return [], max((ultimo + timedelta(seconds=intervalo) - ahora).total_seconds(), 1)
+
+@medir_notificacion('push')
+def send_push_notification(user_id, title, body, data=None, tokens=None):
     """
     Enviar notificación push a un usuario específico
     Usa Expo Push Notifications (gratuito y fácil)
+    'tokens' permite enviar solo a los dispositivos ya reservados por reservar_tokens
     """
-    tokens = DeviceToken.query.filter_by(user_id=user_id, is_active=True).all()
+    if tokens is None:
+        tokens = [t.token for t in DeviceToken.query.filter_by(user_id=user_id, is_active=True).all()]
     
     if not tokens:
         return {'success': False, 'message': 'No hay tokens registrados para este usuario'}
     
-    expo_tokens = [t.token for t in tokens if t.token.startswith('ExponentPushToken')]
+    expo_tokens = [t for t in tokens if t.startswith('ExponentPushToken')]
     
     if not expo_tokens:
         return {'success': False, 'message': 'No hay tokens de Expo válidos'}
@@ -127,25 +226,29 @@ def send_push_notification(user_id, title, body, data=None):
         })
     
     try:
-        # Enviar a Expo Push API
-        response = requests.post(
-            'https://exp.host/--/api/v2/push/send',
-            json=messages,
-            headers={
-                'Accept': 'application/json',
-                'Content-Type': 'application/json',
-            },
-            timeout=10
+        # Enviar a Expo Push API (cliente compartido con pool y circuit breaker)
+        response = obtener_cliente().post(
+            current_app.config.get('EXPO_PUSH_URL', 'https://exp.host/--/api/v2/push/send'),
+            messages
         )
         
         if response.status_code == 200:
-            return {'success': True, 'data': response.json()}
+            respuesta = response.json()
+            try:
+                registrar_tickets(messages, respuesta.get('data') or [])
+            except Exception:
+                db.session.rollback()
+                current_app.logger.exception('Error registrando tickets de Expo')
+            return {'success': True, 'data': respuesta}
         else:
             return {'success': False, 'error': response.text}
+    except CircuitoAbierto as e:
+        return {'success': False, 'error': str(e), 'circuito_abierto': True}
     except Exception as e:
         return {'success': False, 'error': str(e)}
 
 
+@medir_notificacion('new_turn')
 def notify_new_turn(turn):
     """Notificar a usuarios del piso cuando hay un nuevo turno"""
     from .models import User
@@ -154,10 +257,10 @@ def notify_new_turn(turn):
     piso_role = f'piso{turn.piso}'
     users = User.query.filter_by(role=piso_role, is_active=True).all()
     
-    results = []
     for user in users:
-        result = send_push_notification(
+        encolar_notificacion(
             user.id,
+            'new_turn',
             f'🔔 Nuevo turno - {turn.area_nombre}',
             f'{turn.nombre} está esperando en recepción',
             data={
@@ -166,13 +269,15 @@ def notify_new_turn(turn):
                 'piso': turn.piso,
                 'area': turn.area_nombre,
                 'screen': 'PisoScreen'
-            }
+            },
+            clave=turn.piso,
+            detalle={'nombre': turn.nombre}
         )
-        results.append(result)
     
-    return results
+    return len(users)
 
 
+@medir_notificacion('turn_authorized')
 def notify_turn_authorized(turn):
     """Notificar cuando un turno es autorizado a subir"""
     from .models import User
@@ -180,10 +285,10 @@ def notify_turn_authorized(turn):
     piso_role = f'piso{turn.piso}'
     users = User.query.filter_by(role=piso_role, is_active=True).all()
     
-    results = []
     for user in users:
-        result = send_push_notification(
+        encolar_notificacion(
             user.id,
+            'turn_authorized',
             f'✅ Visitante autorizado',
             f'{turn.nombre} está subiendo al piso {turn.piso}',
             data={
@@ -191,13 +296,14 @@ def notify_turn_authorized(turn):
                 'turn_id': turn.id,
                 'piso': turn.piso,
                 'screen': 'PisoScreen'
-            }
+            },
+            clave=turn.piso
         )
-        results.append(result)
     
-    return results
+    return len(users)
 
 
+@medir_notificacion('chat_message')
 def notify_chat_message(mensaje):
     """Notificar cuando hay un nuevo mensaje en el chat"""
     from .models import User
@@ -205,10 +311,10 @@ def notify_chat_message(mensaje):
     # Notificar a todos los usuarios activos excepto al que envió el mensaje
     users = User.query.filter(User.is_active == True, User.username != mensaje.usuario).all()
     
-    results = []
     for user in users:
-        result = send_push_notification(
+        encolar_notificacion(
             user.id,
+            'chat_message',
             f'💬 Mensaje de {mensaje.usuario}',
             mensaje.mensaje[:100],  # Limitar a 100 caracteres
             data={
@@ -216,8 +322,8 @@ def notify_chat_message(mensaje):
                 'message_id': mensaje.id,
                 'origen': mensaje.origen,
                 'screen': 'ChatScreen'
-            }
+            },
+            detalle={'usuario': mensaje.usuario}
         )
-        results.append(result)
     
-    return results
+    return len(users)
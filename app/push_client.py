@@ -0,0 +1,135 @@
+"""
+Cliente HTTP compartido para el gateway de push (Expo): conexiones keep-alive reutilizadas,
+timeouts cortos, reintentos acotados con jitter y circuit breaker.
+"""
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from flask import current_app
+
+from .metrics import push_gateway_requests_total, push_circuit_state
+
+CERRADO = 'cerrado'
+SEMIABIERTO = 'semiabierto'
+ABIERTO = 'abierto'
+_VALOR_ESTADO = {CERRADO: 0, SEMIABIERTO: 1, ABIERTO: 2}
+
+class CircuitoAbierto(Exception):
+    """El gateway falló repetidamente; no se intenta hasta que termine el enfriamiento"""
+
+class CircuitBreaker:
+    """Abre tras 'umbral' fallos seguidos; pasado 'enfriamiento' deja pasar una prueba"""
+    
+    def __init__(self, umbral=5, enfriamiento=30):
+        self.umbral = umbral
+        self.enfriamiento = enfriamiento
+        self.estado = CERRADO
+        self.fallos = 0
+        self.abierto_desde = None
+        self.rechazadas = 0
+        self._prueba_en_curso = False
+        self._lock = threading.Lock()
+        push_circuit_state.set(0)
+    
+    def _cambiar(self, estado):
+        self.estado = estado
+        push_circuit_state.set(_VALOR_ESTADO[estado])
+    
+    def permitir(self):
+        with self._lock:
+            if self.estado == CERRADO:
+                return True
+            if self.estado == ABIERTO and time.monotonic() - self.abierto_desde >= self.enfriamiento:
+                self._cambiar(SEMIABIERTO)
+            if self.estado == SEMIABIERTO and not self._prueba_en_curso:
+                self._prueba_en_curso = True
+                return True
+            self.rechazadas += 1
+            return False
+    
+    def exito(self):
+        with self._lock:
+            self.fallos = 0
+            self._prueba_en_curso = False
+            if self.estado != CERRADO:
+                self._cambiar(CERRADO)
+    
+    def fallo(self):
+        with self._lock:
+            self.fallos += 1
+            self._prueba_en_curso = False
+            if self.estado == SEMIABIERTO or self.fallos >= self.umbral:
+                self.abierto_desde = time.monotonic()
+                self._cambiar(ABIERTO)
+    
+    def to_dict(self):
+        with self._lock:
+            restante = None
+            if self.estado == ABIERTO:
+                restante = max(self.enfriamiento - (time.monotonic() - self.abierto_desde), 0)
+            return {
+                'estado': self.estado,
+                'fallos_consecutivos': self.fallos,
+                'umbral': self.umbral,
+                'enfriamiento_segundos': self.enfriamiento,
+                'reabre_en_segundos': round(restante, 1) if restante is not None else None,
+                'rechazadas': self.rechazadas,
+            }
+
+class PushClient:
+    """Sesión requests con pool propio; un solo cliente por proceso"""
+    
+    def __init__(self, config):
+        self.timeout = (config.get('PUSH_CONNECT_TIMEOUT', 2), config.get('PUSH_READ_TIMEOUT', 5))
+        self.reintentos = config.get('PUSH_RETRIES', 2)
+        self.backoff = config.get('PUSH_BACKOFF_SECONDS', 0.25)
+        self.breaker = CircuitBreaker(
+            umbral=config.get('PUSH_BREAKER_THRESHOLD', 5),
+            enfriamiento=config.get('PUSH_BREAKER_COOLDOWN_SECONDS', 30),
+        )
+        self.session = requests.Session()
+        self.session.headers.update({'Accept': 'application/json', 'Content-Type': 'application/json'})
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=config.get('PUSH_POOL_SIZE', 10), max_retries=0)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+    
+    def _reintentable(self, response):
+        return response.status_code == 429 or response.status_code >= 500
+    
+    def post(self, url, payload):
+        """POST JSON con reintentos; CircuitoAbierto si el breaker está abierto (sin esperar)"""
+        if not self.breaker.permitir():
+            push_gateway_requests_total.inc(resultado='circuito_abierto')
+            raise CircuitoAbierto('Gateway de push en enfriamiento')
+        
+        try:
+            for intento in range(self.reintentos + 1):
+                try:
+                    response = self.session.post(url, json=payload, timeout=self.timeout)
+                    if not self._reintentable(response):
+                        push_gateway_requests_total.inc(resultado=str(response.status_code))
+                        self.breaker.exito()
+                        return response
+                    error = requests.HTTPError(f'{response.status_code} del gateway de push', response=response)
+                    push_gateway_requests_total.inc(resultado=str(response.status_code))
+                except (requests.ConnectionError, requests.Timeout) as e:
+                    error = e
+                    push_gateway_requests_total.inc(resultado=type(e).__name__)
+                if intento < self.reintentos:
+                    # Backoff exponencial con jitter completo para no sincronizar reintentos entre workers
+                    time.sleep(random.uniform(0, self.backoff * 2 ** intento))
+        except Exception:
+            self.breaker.fallo()
+            raise
+        
+        self.breaker.fallo()
+        raise error
+
+def init_push_client(app):
+    app.extensions['push_client'] = PushClient(app.config)
+
+def obtener_cliente():
+    return current_app.extensions['push_client']
@@ -0,0 +1,155 @@
+"""
+Agrupación de notificaciones push: junta los eventos de cada destinatario dentro de una
+ventana por tipo y envía un resumen ("5 nuevos turnos en Piso 1"), respetando un
+intervalo mínimo entre pushes por dispositivo.
+"""
+import threading
+import time
+
+from flask import current_app
+
+# Eventos guardados por grupo para armar el resumen (el conteo sigue aunque se supere)
+MAX_EVENTOS_POR_GRUPO = 20
+
+class _Grupo:
+    __slots__ = ('user_id', 'tipo', 'clave', 'eventos', 'total', 'vence')
+    
+    def __init__(self, user_id, tipo, clave, vence):
+        self.user_id = user_id
+        self.tipo = tipo
+        self.clave = clave
+        self.eventos = []
+        self.total = 0
+        self.vence = vence
+    
+    def agregar(self, evento):
+        self.total += 1
+        self.eventos.append(evento)
+        if len(self.eventos) > MAX_EVENTOS_POR_GRUPO:
+            self.eventos.pop(0)
+
+def _resumen_new_turn(grupo):
+    piso = grupo.eventos[-1]['data'].get('piso')
+    nombres = [e['detalle'].get('nombre') for e in grupo.eventos[-3:] if e['detalle'].get('nombre')]
+    cuerpo = ', '.join(nombres)
+    if grupo.total > len(nombres):
+        cuerpo += f' y {grupo.total - len(nombres)} más'
+    return f'🔔 {grupo.total} nuevos turnos en Piso {piso}', f'Esperando en recepción: {cuerpo}'
+
+def _resumen_turn_authorized(grupo):
+    piso = grupo.eventos[-1]['data'].get('piso')
+    return f'✅ {grupo.total} visitantes autorizados', f'Están subiendo al piso {piso}'
+
+def _resumen_chat_message(grupo):
+    remitentes = []
+    for e in grupo.eventos:
+        remitente = e['detalle'].get('usuario')
+        if remitente and remitente not in remitentes:
+            remitentes.append(remitente)
+    ultimo = grupo.eventos[-1]
+    return f'💬 {grupo.total} mensajes nuevos de {", ".join(remitentes[:3])}', ultimo['body']
+
+RESUMENES = {
+    'new_turn': _resumen_new_turn,
+    'turn_authorized': _resumen_turn_authorized,
+    'chat_message': _resumen_chat_message,
+}
+
+class NotificationCoalescer:
+    """Buffer por (usuario, tipo, clave) vaciado por un hilo al vencer cada ventana"""
+    
+    def __init__(self, app):
+        self.app = app
+        self._grupos = {}
+        self._cond = threading.Condition()
+        self._hilo = None
+    
+    def _ventana(self, tipo):
+        ventanas = self.app.config.get('NOTIFICACIONES_VENTANAS', {})
+        return float(ventanas.get(tipo, ventanas.get('default', 0)))
+    
+    def agregar(self, user_id, tipo, title, body, data, clave=None, detalle=None):
+        """Encolar un evento para el usuario; sale solo o en un resumen al cerrar la ventana"""
+        evento = {'title': title, 'body': body, 'data': data, 'detalle': detalle or {}}
+        with self._cond:
+            k = (user_id, tipo, clave)
+            grupo = self._grupos.get(k)
+            if grupo is None:
+                grupo = _Grupo(user_id, tipo, clave, time.monotonic() + self._ventana(tipo))
+                self._grupos[k] = grupo
+            grupo.agregar(evento)
+            self._iniciar()
+            self._cond.notify()
+    
+    def pendientes(self):
+        with self._cond:
+            return sum(g.total for g in self._grupos.values())
+    
+    def _iniciar(self):
+        if self._hilo is None:
+            self._hilo = threading.Thread(target=self._ciclo, name='push-coalescer', daemon=True)
+            self._hilo.start()
+    
+    def _tomar_vencidos(self, forzar=False):
+        ahora = time.monotonic()
+        vencidos = [k for k, g in self._grupos.items() if forzar or g.vence <= ahora]
+        return [self._grupos.pop(k) for k in vencidos]
+    
+    def _ciclo(self):
+        while True:
+            with self._cond:
+                while True:
+                    vencidos = self._tomar_vencidos()
+                    if vencidos:
+                        break
+                    proximo = min((g.vence for g in self._grupos.values()), default=None)
+                    self._cond.wait(None if proximo is None else max(proximo - time.monotonic(), 0.05))
+            with self.app.app_context():
+                self._enviar(vencidos)
+    
+    def vaciar(self):
+        """Enviar ya todo lo pendiente (sin esperar las ventanas), p. ej. al apagar o en tests"""
+        with self._cond:
+            vencidos = self._tomar_vencidos(forzar=True)
+        self._enviar(vencidos)
+    
+    def _reencolar(self, grupo, espera):
+        """El dispositivo está en su intervalo mínimo: seguir juntando eventos hasta que se libere"""
+        with self._cond:
+            k = (grupo.user_id, grupo.tipo, grupo.clave)
+            nuevo = self._grupos.get(k)
+            if nuevo is not None:
+                for evento in nuevo.eventos:
+                    grupo.agregar(evento)
+                grupo.total += nuevo.total - len(nuevo.eventos)
+            grupo.vence = time.monotonic() + espera
+            self._grupos[k] = grupo
+            self._cond.notify()
+    
+    def _enviar(self, grupos):
+        from .notifications import reservar_tokens, send_push_notification
+        
+        intervalo = self.app.config.get('NOTIFICACIONES_INTERVALO_MINIMO', 30)
+        for grupo in grupos:
+            try:
+                tokens, espera = reservar_tokens(grupo.user_id, intervalo)
+                if not tokens:
+                    if espera is not None:
+                        self._reencolar(grupo, espera)
+                    continue
+                
+                ultimo = grupo.eventos[-1]
+                if grupo.total == 1:
+                    title, body, data = ultimo['title'], ultimo['body'], ultimo['data']
+                else:
+                    title, body = RESUMENES.get(grupo.tipo, lambda g: (ultimo['title'], ultimo['body']))(grupo)
+                    data = dict(ultimo['data'], count=grupo.total)
+                send_push_notification(grupo.user_id, title, body, data=data, tokens=tokens)
+            except Exception:
+                current_app.logger.exception('Error enviando notificación agrupada')
+
+def init_coalescer(app):
+    app.extensions['push_coalescer'] = NotificationCoalescer(app)
+
+def encolar_notificacion(user_id, tipo, title, body, data, clave=None, detalle=None):
+    current_app.extensions['push_coalescer'].agregar(user_id, tipo, title, body, data, clave, detalle)
@@ -0,0 +1,134 @@
+"""
+Recibos de entrega de Expo: consulta los tickets pendientes por lotes, desactiva los
+dispositivos muertos (DeviceNotRegistered) y registra latencia y errores de entrega.
+"""
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import update, delete
+
+from . import db
+from .metrics import push_receipts_total, push_delivery_latency
+from .notifications import PushTicket, desactivar_tokens
+from .push_client import obtener_cliente
+
+# Expo acepta hasta 1000 ids por consulta de recibos
+LOTE_MAXIMO = 1000
+
+def _consultar(url, ids):
+    response = obtener_cliente().post(url, {'ids': ids})
+    response.raise_for_status()
+    return response.json().get('data') or {}
+
+def _marcar(ticket_ids, estado, ahora, error=None):
+    if ticket_ids:
+        db.session.execute(
+            update(PushTicket)
+            .where(PushTicket.ticket_id.in_(ticket_ids))
+            .values(estado=estado, error=error, procesado_at=ahora)
+            .execution_options(synchronize_session=False)
+        )
+
+def procesar_lote(config, tickets, ahora=None):
+    """Pedir los recibos de un lote de tickets y aplicar los resultados; devuelve un resumen"""
+    ahora = ahora or datetime.utcnow()
+    recibos = _consultar(
+        config.get('EXPO_RECEIPTS_URL', 'https://exp.host/--/api/v2/push/getReceipts'),
+        [t.ticket_id for t in tickets],
+    )
+    vencimiento = ahora - timedelta(hours=config.get('EXPO_RECEIPTS_EXPIRE_HOURS', 24))
+    
+    ok = []
+    errores = {}
+    expirados = []
+    muertos = []
+    for ticket in tickets:
+        recibo = recibos.get(ticket.ticket_id)
+        if recibo is None:
+            # Expo todavía no lo tiene, o ya lo descartó (los recibos duran ~24 h)
+            if ticket.enviado_at < vencimiento:
+                expirados.append(ticket.ticket_id)
+            continue
+        
+        push_delivery_latency.observe((ahora - ticket.enviado_at).total_seconds(), tipo=ticket.tipo or '')
+        if recibo.get('status') == 'ok':
+            ok.append(ticket.ticket_id)
+            push_receipts_total.inc(status='ok', error='')
+        else:
+            error = (recibo.get('details') or {}).get('error') or 'Desconocido'
+            errores.setdefault(error, []).append(ticket.ticket_id)
+            push_receipts_total.inc(status='error', error=error)
+            if error == 'DeviceNotRegistered':
+                muertos.append(ticket.token)
+    
+    _marcar(ok, 'OK', ahora)
+    for error, ids in errores.items():
+        _marcar(ids, 'ERROR', ahora, error=error)
+    _marcar(expirados, 'EXPIRADO', ahora)
+    desactivados = desactivar_tokens(muertos)
+    db.session.commit()
+    
+    return {
+        'ok': len(ok),
+        'errores': sum(len(ids) for ids in errores.values()),
+        'expirados': len(expirados),
+        'desactivados': desactivados,
+    }
+
+def procesar_recibos(config, lote=LOTE_MAXIMO, ahora=None):
+    """Procesar todos los tickets pendientes con la demora mínima cumplida, por lotes"""
+    ahora = ahora or datetime.utcnow()
+    lote = min(lote, LOTE_MAXIMO)
+    listos = ahora - timedelta(seconds=config.get('EXPO_RECEIPTS_DELAY_SECONDS', 900))
+    totales = {'ok': 0, 'errores': 0, 'expirados': 0, 'desactivados': 0, 'lotes': 0}
+    
+    ultimo_id = 0
+    while True:
+        tickets = (
+            PushTicket.query
+            .filter(PushTicket.estado == 'PENDIENTE', PushTicket.enviado_at <= listos, PushTicket.id > ultimo_id)
+            .order_by(PushTicket.id)
+            .limit(lote)
+            .all()
+        )
+        if not tickets:
+            break
+        ultimo_id = tickets[-1].id
+        for clave, valor in procesar_lote(config, tickets, ahora).items():
+            totales[clave] += valor
+        totales['lotes'] += 1
+    
+    # Los tickets ya resueltos solo sirven para diagnóstico reciente
+    retencion = ahora - timedelta(days=config.get('EXPO_RECEIPTS_RETENTION_DAYS', 7))
+    db.session.execute(
+        delete(PushTicket)
+        .where(PushTicket.estado != 'PENDIENTE', PushTicket.procesado_at < retencion)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    return totales
+
+def init_receipts_poller(app):
+    """Con EXPO_RECEIPTS_POLL_SECONDS > 0, consultar recibos periódicamente en un hilo.
+    
+    Con varios workers todos consultan los mismos pendientes; es inocuo pero conviene
+    dejarlo en 0 y usar 'flask push-receipts' desde cron.
+    """
+    intervalo = app.config.get('EXPO_RECEIPTS_POLL_SECONDS', 0)
+    if not intervalo or app.testing:
+        return
+    
+    def ciclo():
+        while True:
+            time.sleep(intervalo)
+            with app.app_context():
+                try:
+                    totales = procesar_recibos(app.config)
+                    if totales['lotes']:
+                        app.logger.info('Recibos de Expo procesados', extra=totales)
+                except Exception:
+                    db.session.rollback()
+                    app.logger.exception('Error procesando recibos de Expo')
+    
+    threading.Thread(target=ciclo, name='expo-receipts', daemon=True).start()
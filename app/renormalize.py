@@ -0,0 +1,187 @@
+"""
+Re-normalización del historial: vuelve a clasificar motivo_key (y las áreas sin clave válida)
+de visitor_turn con las reglas vigentes del catálogo. Recorre la tabla por tramos de id,
+clasifica una sola vez cada texto distinto (opcionalmente en un pool de procesos), escribe
+con un UPDATE por valor nuevo y guarda el último id procesado para poder reanudar.
+"""
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from sqlalchemy import select, update
+
+from . import db
+from .catalog import get_catalog
+from .models import VisitorTurn, JobCheckpoint, now_argentina
+from .utils import normalize_area, normalize_motive
+
+CHECKPOINT = 'renormalize'
+SIN_ESPECIFICAR = 'SIN ESPECIFICAR'
+
+# Catálogo de cada proceso del pool (se recibe una sola vez al iniciar el worker)
+_catalogo_worker = None
+
+def clasificar_motivo(texto, catalog):
+    """motivo_key que tendría hoy un turno con ese texto (igual criterio que nuevo_turno)"""
+    texto = (texto or '').strip()
+    if not texto or texto == SIN_ESPECIFICAR:
+        return 'SIN_ESPECIFICAR'
+    return normalize_motive(texto, catalog)[0]
+
+def clasificar_area(nombre, catalog):
+    """(area_key, area_nombre, piso) o None si sigue sin corresponder a un área del catálogo"""
+    key, nombre_amigable, piso = normalize_area(nombre, catalog)
+    if key == 'DESCONOCIDO':
+        return None
+    return key, nombre_amigable, piso
+
+def _iniciar_worker(catalog):
+    global _catalogo_worker
+    _catalogo_worker = catalog
+
+def _clasificar_lote(motivos, areas):
+    catalog = _catalogo_worker
+    return (
+        {t: clasificar_motivo(t, catalog) for t in motivos},
+        {n: clasificar_area(n, catalog) for n in areas},
+    )
+
+class _Clasificador:
+    """Memo de textos ya clasificados; los nuevos se reparten entre los procesos si hay pool"""
+    
+    def __init__(self, catalog, procesos=0):
+        self.catalog = catalog
+        self.motivos = {}
+        self.areas = {}
+        self.pool = None
+        if procesos > 1:
+            # spawn: los workers no heredan conexiones ni hilos del proceso principal
+            self.pool = ProcessPoolExecutor(
+                max_workers=procesos,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_iniciar_worker,
+                initargs=(catalog,),
+            )
+            self.procesos = procesos
+    
+    def clasificar(self, motivos, areas):
+        motivos = [t for t in motivos if t not in self.motivos]
+        areas = [n for n in areas if n not in self.areas]
+        if not motivos and not areas:
+            return
+        if self.pool is None:
+            self.motivos.update((t, clasificar_motivo(t, self.catalog)) for t in motivos)
+            self.areas.update((n, clasificar_area(n, self.catalog)) for n in areas)
+            return
+        
+        partes = self.procesos
+        futuros = [
+            self.pool.submit(_clasificar_lote, motivos[i::partes], areas[i::partes])
+            for i in range(partes)
+        ]
+        for futuro in futuros:
+            motivos_parte, areas_parte = futuro.result()
+            self.motivos.update(motivos_parte)
+            self.areas.update(areas_parte)
+    
+    def cerrar(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+
+def _checkpoint(version, reiniciar):
+    """Checkpoint del proceso; se descarta si las reglas cambiaron desde la corrida anterior"""
+    checkpoint = db.session.get(JobCheckpoint, CHECKPOINT)
+    if checkpoint is None:
+        checkpoint = JobCheckpoint(nombre=CHECKPOINT, ultimo_id=0, version=version)
+        db.session.add(checkpoint)
+    elif reiniciar or checkpoint.version != version:
+        checkpoint.ultimo_id = 0
+        checkpoint.version = version
+    return checkpoint
+
+def _aplicar(cambios, columnas):
+    """Un UPDATE ... WHERE id IN (...) por cada valor nuevo (los textos repetidos comparten valor)"""
+    for valores, ids in cambios.items():
+        db.session.execute(
+            update(VisitorTurn)
+            .where(VisitorTurn.id.in_(ids))
+            .values(**dict(zip(columnas, valores)), updated_at=now_argentina())
+            .execution_options(synchronize_session=False)
+        )
+
+def renormalizar(lote=5000, procesos=0, reiniciar=False, progreso=None):
+    """Re-clasificar el historial desde el último checkpoint; devuelve un resumen de cambios"""
+    catalog = get_catalog()
+    checkpoint = _checkpoint(catalog.version, reiniciar)
+    db.session.commit()
+    
+    totales = {'turnos': 0, 'motivos': 0, 'areas': 0, 'textos': 0}
+    clasificador = _Clasificador(catalog, procesos)
+    try:
+        while True:
+            filas = db.session.execute(
+                select(VisitorTurn.id, VisitorTurn.motivo_texto, VisitorTurn.motivo_key,
+                       VisitorTurn.area_key, VisitorTurn.area_nombre, VisitorTurn.hora_llegada)
+                .where(VisitorTurn.id > checkpoint.ultimo_id)
+                .order_by(VisitorTurn.id)
+                .limit(lote)
+            ).all()
+            if not filas:
+                break
+            
+            # Solo se re-clasifica el área de los turnos cuya clave ya no está en el catálogo
+            sin_area = [f for f in filas if f.area_key not in catalog.por_key]
+            clasificador.clasificar(
+                {(f.motivo_texto or '').strip() for f in filas},
+                {f.area_nombre for f in sin_area if f.area_nombre},
+            )
+            
+            cambios_motivo = {}
+            for f in filas:
+                nuevo = clasificador.motivos[(f.motivo_texto or '').strip()]
+                if nuevo != f.motivo_key:
+                    cambios_motivo.setdefault((nuevo,), []).append(f.id)
+            cambios_area = {}
+            for f in sin_area:
+                nuevo = clasificador.areas.get(f.area_nombre)
+                if nuevo is not None and nuevo[0] != f.area_key:
+                    cambios_area.setdefault(nuevo, []).append(f.id)
+            
+            corregidos = {i for ids in cambios_motivo.values() for i in ids}
+            corregidos.update(i for ids in cambios_area.values() for i in ids)
+            _aplicar(cambios_motivo, ('motivo_key',))
+            _aplicar(cambios_area, ('area_key', 'area_nombre', 'piso'))
+            
+            # El checkpoint (y los días a reconstruir) se confirma junto con los cambios del tramo
+            checkpoint.ultimo_id = filas[-1].id
+            dias = [f.hora_llegada.date() for f in filas if f.id in corregidos and f.hora_llegada is not None]
+            if dias:
+                desde, hasta = min(dias), max(dias)
+                checkpoint.pendiente_desde = min(desde, checkpoint.pendiente_desde or desde)
+                checkpoint.pendiente_hasta = max(hasta, checkpoint.pendiente_hasta or hasta)
+            db.session.commit()
+            
+            totales['turnos'] += len(filas)
+            totales['motivos'] += sum(len(ids) for ids in cambios_motivo.values())
+            totales['areas'] += sum(len(ids) for ids in cambios_area.values())
+            if progreso:
+                progreso(checkpoint.ultimo_id, totales)
+    finally:
+        clasificador.cerrar()
+    
+    totales['textos'] = len(clasificador.motivos) + len(clasificador.areas)
+    return totales
+
+def dias_pendientes():
+    """(desde, hasta) de los días corregidos cuyo cubo falta rehacer, de esta corrida o de
+    corridas anteriores interrumpidas; (None, None) si no hay"""
+    checkpoint = db.session.get(JobCheckpoint, CHECKPOINT)
+    if checkpoint is None:
+        return None, None
+    return checkpoint.pendiente_desde, checkpoint.pendiente_hasta
+
+def limpiar_pendientes():
+    """Marcar como reconstruidos los días pendientes"""
+    checkpoint = db.session.get(JobCheckpoint, CHECKPOINT)
+    if checkpoint is not None:
+        checkpoint.pendiente_desde = checkpoint.pendiente_hasta = None
+        db.session.commit()
@@ -1,7 +1,8 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify
+from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify, current_app
 from flask_login import login_user, login_required, logout_user, current_user
 from app import db, limiter, csrf
 from app.models import User
+from app.auth_tokens import emitir_tokens, decodificar, revocar, esta_revocado, token_del_header, TokenInvalido
 
 main = Blueprint("main", __name__)
 
@@ -95,7 +96,9 @@ def api_login():
                     "username": user.username,
                     "role": user.role,
                     "piso": user.piso
-                }
+                },
+                # Tokens para la app mobile (Authorization: Bearer <access_token>)
+                **emitir_tokens(user)
             }), 200
         
         return jsonify({"success": False, "error": "Credenciales inválidas"}), 401
@@ -103,6 +106,50 @@ def api_login():
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 
+# Renovar tokens de la app mobile
+@main.route("/api/token/refresh", methods=["POST"])
+@csrf.exempt
+@limiter.limit("30 per minute")
+def api_token_refresh():
+    """Canjear un refresh token por un par nuevo (el anterior queda revocado)"""
+    data = request.get_json() or {}
+    try:
+        claims = decodificar(data.get("refresh_token") or "", current_app.config["JWT_SECRET_KEY"], "refresh")
+    except TokenInvalido as e:
+        return jsonify({"success": False, "error": str(e)}), 401
+    if esta_revocado(claims["jti"]):
+        return jsonify({"success": False, "error": "Token revocado"}), 401
+    
+    # Acá sí se consulta la base: un usuario desactivado no puede renovar
+    user = db.session.get(User, int(claims["sub"]))
+    if not user or not user.is_active:
+        return jsonify({"success": False, "error": "Cuenta desactivada"}), 403
+    
+    # La lista en memoria se recarga cada pocos segundos: quien revoca es el que inserta el jti
+    if not revocar(claims):
+        return jsonify({"success": False, "error": "Token revocado"}), 401
+    return jsonify({"success": True, **emitir_tokens(user)}), 200
+
+# Revocar tokens de la app mobile (logout)
+@main.route("/api/token/revoke", methods=["POST"])
+@csrf.exempt
+def api_token_revoke():
+    """Revocar el access token del header y, si viene, el refresh token"""
+    data = request.get_json(silent=True) or {}
+    secreto = current_app.config["JWT_SECRET_KEY"]
+    revocados = 0
+    
+    for token, tipo in ((token_del_header(), "access"), (data.get("refresh_token"), "refresh")):
+        if not token:
+            continue
+        try:
+            revocar(decodificar(token, secreto, tipo))
+            revocados += 1
+        except TokenInvalido:
+            pass
+    
+    return jsonify({"success": True, "revocados": revocados}), 200
+
 # Logout
 @main.route("/logout")
 @login_required
@@ -0,0 +1,145 @@
+"""
+Scheduler de llamados por piso: prioridades con aging y reparto ponderado entre áreas
+
+Cada turno en ESPERA tiene un puntaje
+    puntaje = minutos_de_espera * aging + ventaja_minutos(prioridad)
+y con 'ahora' común a todos los turnos, ordenar por puntaje equivale a ordenar por
+la clave estática  llegada * aging - ventaja, así que cada área del piso mantiene
+un heap que no hay que reordenar con el paso del tiempo.
+
+Entre áreas que comparten piso se elige la cabeza de heap con mejor puntaje
+ajustado: a cada área se le resta SCHEDULER_PENALIZACION_MINUTOS por cada turno
+llamado hoy (normalizado por su peso) por encima del área menos atendida.
+"""
+import heapq
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import func
+
+from . import db
+from .models import VisitorTurn, now_argentina
+
+def _naive(dt):
+    return dt.replace(tzinfo=None) if dt is not None and dt.tzinfo else dt
+
+def prioridades():
+    return {p['key']: p for p in current_app.config.get('PRIORIDADES_TURNO', [])}
+
+def prioridad_para(area_key, solicitada=None):
+    """Prioridad efectiva de un turno nuevo: la solicitada o la mínima del área"""
+    clases = prioridades()
+    default = current_app.config.get('PRIORIDAD_DEFAULT', 'NORMAL')
+    minima = current_app.config.get('PRIORIDAD_POR_AREA', {}).get(area_key, default)
+    if solicitada not in clases:
+        return minima
+    # Nunca bajar la prioridad mínima del área
+    if clases.get(minima, {}).get('ventaja_minutos', 0) > clases[solicitada].get('ventaja_minutos', 0):
+        return minima
+    return solicitada
+
+class FloorScheduler:
+    """Orden de llamado para los turnos en espera de un piso"""
+    
+    def __init__(self, turnos, atendidos_por_area, clases, pesos=None, aging=1.0, penalizacion=5.0, ahora=None):
+        self.clases = clases
+        self.pesos = pesos or {}
+        self.aging = aging or 1.0
+        self.penalizacion = penalizacion
+        self.ahora = _naive(ahora or now_argentina())
+        self.atendidos = dict(atendidos_por_area)
+        self._heaps = {}
+        for turno in turnos:
+            heap = self._heaps.setdefault(turno.area_key, [])
+            heap.append((self._clave(turno), turno.id, turno))
+        for heap in self._heaps.values():
+            heapq.heapify(heap)
+    
+    def _ventaja(self, turno):
+        return self.clases.get(turno.prioridad or 'NORMAL', {}).get('ventaja_minutos', 0)
+    
+    def _clave(self, turno):
+        # Menor clave = mayor puntaje; estática porque 'ahora' es común a todos
+        llegada = _naive(turno.hora_llegada) or self.ahora
+        return (llegada - datetime(2000, 1, 1)).total_seconds() / 60.0 * self.aging - self._ventaja(turno)
+    
+    def puntaje(self, turno):
+        llegada = _naive(turno.hora_llegada) or self.ahora
+        espera = (self.ahora - llegada).total_seconds() / 60.0
+        return espera * self.aging + self._ventaja(turno)
+    
+    def _servicio(self, area_key):
+        return self.atendidos.get(area_key, 0) / float(self.pesos.get(area_key, 1) or 1)
+    
+    def _elegir_area(self):
+        activas = [a for a, h in self._heaps.items() if h]
+        if not activas:
+            return None, 0.0
+        minimo = min(self._servicio(a) for a in activas)
+        mejor, mejor_ajuste, mejor_valor = None, 0.0, None
+        for area in activas:
+            ajuste = self.penalizacion * (self._servicio(area) - minimo)
+            valor = self._heaps[area][0][0] + ajuste
+            if mejor_valor is None or valor < mejor_valor:
+                mejor, mejor_ajuste, mejor_valor = area, ajuste, valor
+        return mejor, mejor_ajuste
+    
+    def siguiente(self):
+        """Próximo turno a llamar, sin sacarlo de la cola"""
+        area, ajuste = self._elegir_area()
+        if area is None:
+            return None
+        return self._heaps[area][0][2], ajuste
+    
+    def orden(self, limite=None):
+        """Orden completo de llamado, simulando que cada turno se llama en orden"""
+        resultado = []
+        while limite is None or len(resultado) < limite:
+            area, ajuste = self._elegir_area()
+            if area is None:
+                break
+            _, _, turno = heapq.heappop(self._heaps[area])
+            resultado.append((turno, ajuste))
+            self.atendidos[area] = self.atendidos.get(area, 0) + 1
+        return resultado
+
+def scheduler_para_piso(piso, areas=None):
+    """Construir el scheduler con los turnos en espera y los llamados de hoy del piso
+    (solo los de 'areas' si se indican, p.ej. las que atiende un puesto)"""
+    piso = str(piso)
+    query = VisitorTurn.query.filter(
+        VisitorTurn.piso == piso,
+        VisitorTurn.estado == 'ESPERA'
+    )
+    if areas:
+        query = query.filter(VisitorTurn.area_key.in_(areas))
+    turnos = query.all()
+    
+    ahora = now_argentina()
+    inicio_dia = ahora.replace(hour=0, minute=0, second=0, microsecond=0, tzinfo=None)
+    atendidos = dict(db.session.query(
+        VisitorTurn.area_key,
+        func.count(VisitorTurn.id)
+    ).filter(
+        VisitorTurn.piso == piso,
+        VisitorTurn.hora_autorizado >= inicio_dia,
+        VisitorTurn.hora_autorizado < inicio_dia + timedelta(days=1)
+    ).group_by(VisitorTurn.area_key).all())
+    
+    config = current_app.config
+    return FloorScheduler(
+        turnos,
+        atendidos,
+        prioridades(),
+        pesos=config.get('SCHEDULER_PESOS_AREA', {}),
+        aging=config.get('SCHEDULER_AGING', 1.0),
+        penalizacion=config.get('SCHEDULER_PENALIZACION_MINUTOS', 5.0),
+        ahora=ahora,
+    )
+
+def describir(scheduler, turno, ajuste):
+    """Turno serializado con el detalle del puntaje usado para ordenarlo"""
+    data = turno.to_dict()
+    data['puntaje'] = round(scheduler.puntaje(turno) - ajuste, 2)
+    data['ajuste_reparto'] = round(ajuste, 2)
+    return data
@@ -0,0 +1,301 @@
+"""
+Snapshots en línea de las tablas operativas (flask snapshot / flask restore-snapshot).
+
+Cada corrida escribe un directorio con un archivo JSON Lines comprimido (gzip) por tramo de
+filas de cada tabla y un manifest.json con columnas, conteos, sumas de control y las marcas
+de agua. La primera corrida (o --completo) exporta todo; las siguientes solo las filas nuevas
+(id mayor a la marca) o modificadas (updated_at posterior a la marca, con margen para las
+transacciones que estaban abiertas). En Postgres todas las tablas se leen dentro de una misma
+transacción REPEATABLE READ de solo lectura, así el snapshot es consistente sin bloquear a
+nadie; la lectura se frena a un máximo de MB/s para no competir con la cola.
+
+La restauración aplica el último completo y los incrementales que le siguen sobre una base
+nueva (SQLite o Postgres), con upsert por clave primaria: se puede repetir sin duplicar.
+"""
+import gzip
+import hashlib
+import json
+import os
+import time
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import create_engine, select, func, or_, Date, DateTime
+from sqlalchemy.dialects import postgresql, sqlite
+
+from . import db
+from .models import ahora_local
+
+MANIFEST = 'manifest.json'
+
+# (tabla, modo) en orden de dependencias para la restauración:
+#   completa: tabla chica, se exporta entera en cada corrida
+#   cambios:  filas nuevas o con updated_at posterior a la marca
+#   altas:    solo filas nuevas (la tabla no tiene updated_at)
+TABLAS = (
+    ('user', 'completa'),
+    ('desk', 'completa'),  # visitor_turn.puesto_id la referencia
+    ('visitor_turn', 'cambios'),
+    ('chat_message', 'altas'),
+    ('device_token', 'cambios'),
+)
+
+class _Limitador:
+    """Frena la lectura para no pasar de bytes_por_segundo en promedio (0 = sin límite)"""
+    
+    def __init__(self, bytes_por_segundo):
+        self.ritmo = bytes_por_segundo
+        self.total = 0
+        self.inicio = time.monotonic()
+    
+    def consumir(self, n):
+        if not self.ritmo:
+            return
+        self.total += n
+        adelanto = self.total / self.ritmo - (time.monotonic() - self.inicio)
+        if adelanto > 0:
+            time.sleep(adelanto)
+
+def _json(valor):
+    if isinstance(valor, (datetime, date)):
+        return valor.isoformat()
+    raise TypeError(f'{type(valor).__name__} no serializable')
+
+def _manifests(raiz):
+    """Manifests de los snapshots terminados, del más viejo al más nuevo"""
+    if not os.path.isdir(raiz):
+        return []
+    manifests = []
+    for nombre in sorted(os.listdir(raiz)):
+        ruta = os.path.join(raiz, nombre, MANIFEST)
+        if not nombre.endswith('.tmp') and os.path.isfile(ruta):
+            with open(ruta, encoding='utf-8') as f:
+                manifests.append(json.load(f))
+    return manifests
+
+class _Escritor:
+    """Archivos gzip de una tabla, rotando cada `filas` filas"""
+    
+    def __init__(self, directorio, tabla, filas):
+        self.directorio = directorio
+        self.tabla = tabla
+        self.maximo = filas
+        self.archivos = []
+        self.actual = None
+    
+    def _abrir(self):
+        nombre = f'{self.tabla}-{len(self.archivos) + 1:05d}.jsonl.gz'
+        self.actual = {
+            'archivo': gzip.open(os.path.join(self.directorio, nombre), 'wb', compresslevel=6),
+            'hash': hashlib.sha256(),
+            'info': {'nombre': nombre, 'filas': 0},
+        }
+    
+    def _cerrar(self):
+        self.actual['archivo'].close()
+        self.actual['info']['sha256'] = self.actual['hash'].hexdigest()
+        self.archivos.append(self.actual['info'])
+        self.actual = None
+    
+    def escribir(self, lineas):
+        """Escribir líneas ya codificadas; devuelve los bytes sin comprimir"""
+        total = 0
+        for linea in lineas:
+            if self.actual is None:
+                self._abrir()
+            self.actual['archivo'].write(linea)
+            self.actual['hash'].update(linea)
+            self.actual['info']['filas'] += 1
+            total += len(linea)
+            if self.actual['info']['filas'] >= self.maximo:
+                self._cerrar()
+        return total
+    
+    def terminar(self):
+        if self.actual is not None:
+            self._cerrar()
+        return self.archivos
+
+def _filtro(tabla, modo, marca, margen):
+    """Condición de las filas a exportar según la marca de la corrida anterior (None = todas)"""
+    if modo == 'completa' or not marca:
+        return None
+    condiciones = [tabla.c.id > marca['ultimo_id']]
+    if modo == 'cambios' and marca.get('ultimo_cambio'):
+        desde = datetime.fromisoformat(marca['ultimo_cambio']) - margen
+        condiciones.append(tabla.c.updated_at > desde)
+    return or_(*condiciones)
+
+def _exportar_tabla(conn, directorio, nombre, modo, marca, filas, margen, limitador, progreso):
+    tabla = db.metadata.tables[nombre]
+    columnas = [c.name for c in tabla.columns]
+    query = select(tabla).order_by(*tabla.primary_key.columns)
+    condicion = _filtro(tabla, modo, marca, margen)
+    if condicion is not None:
+        query = query.where(condicion)
+    
+    escritor = _Escritor(directorio, nombre, filas)
+    ultimo_id = (marca or {}).get('ultimo_id', 0)
+    ultimo_cambio = (marca or {}).get('ultimo_cambio')
+    ultimo_cambio = datetime.fromisoformat(ultimo_cambio) if ultimo_cambio else None
+    i_cambio = columnas.index('updated_at') if modo == 'cambios' else None
+    exportadas = 0
+    
+    # yield_per: cursor del lado del servidor en Postgres, sin traer la tabla a memoria
+    resultado = conn.execution_options(yield_per=filas).execute(query)
+    for tramo in resultado.partitions():
+        lineas = [json.dumps(list(fila), default=_json, ensure_ascii=False).encode('utf-8') + b'\n' for fila in tramo]
+        limitador.consumir(escritor.escribir(lineas))
+        if modo != 'completa':
+            ultimo_id = max(ultimo_id, tramo[-1].id)
+            if i_cambio is not None:
+                ultimo_cambio = max([fila[i_cambio] for fila in tramo if fila[i_cambio] is not None]
+                                    + ([ultimo_cambio] if ultimo_cambio else []), default=None)
+        exportadas += len(tramo)
+        if progreso:
+            progreso(nombre, exportadas)
+    
+    info = {'modo': 'completa' if condicion is None else modo, 'columnas': columnas, 'filas': exportadas,
+            'archivos': escritor.terminar()}
+    if modo != 'completa':
+        info['marca'] = {'ultimo_id': ultimo_id, 'ultimo_cambio': ultimo_cambio.isoformat() if ultimo_cambio else None}
+    return info
+
+def crear_snapshot(raiz, completo=False, filas=50000, max_bytes_s=0, margen_segundos=300, engine=None, progreso=None):
+    """Exportar un snapshot completo o incremental en raiz; devuelve su manifest"""
+    engine = engine or db.engine
+    anteriores = _manifests(raiz)
+    base = None if completo or not anteriores else anteriores[-1]
+    
+    nombre = f"{ahora_local():%Y%m%d-%H%M%S}-{'incremental' if base else 'completo'}"
+    directorio = os.path.join(raiz, nombre)
+    os.makedirs(directorio + '.tmp')
+    
+    manifest = {
+        'nombre': nombre,
+        'tipo': 'incremental' if base else 'completo',
+        'base': base['nombre'] if base else None,
+        'creado': ahora_local().isoformat(),
+        'dialecto': engine.dialect.name,
+        'tablas': {},
+    }
+    limitador = _Limitador(max_bytes_s)
+    margen = timedelta(seconds=margen_segundos)
+    inicio = time.monotonic()
+    
+    with engine.connect() as conn:
+        if engine.dialect.name == 'postgresql':
+            # Una sola foto de todas las tablas; solo lectura, no toma locks sobre las filas
+            conn = conn.execution_options(isolation_level='REPEATABLE READ', postgresql_readonly=True)
+        with conn.begin():
+            for tabla, modo in TABLAS:
+                marca = base['tablas'].get(tabla, {}).get('marca') if base else None
+                manifest['tablas'][tabla] = _exportar_tabla(
+                    conn, directorio + '.tmp', tabla, modo, marca, filas, margen, limitador, progreso
+                )
+    
+    manifest['segundos'] = round(time.monotonic() - inicio, 1)
+    with open(os.path.join(directorio + '.tmp', MANIFEST), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    # El directorio aparece con su nombre final solo cuando está completo
+    os.rename(directorio + '.tmp', directorio)
+    return manifest
+
+# ============================================
+# RESTAURACIÓN
+# ============================================
+
+def _cadena(raiz, hasta=None):
+    """Último snapshot completo hasta `hasta` y los incrementales que le siguen, en orden"""
+    manifests = [m for m in _manifests(raiz) if hasta is None or m['nombre'] <= hasta]
+    completos = [i for i, m in enumerate(manifests) if m['tipo'] == 'completo']
+    if not completos:
+        raise ValueError(f'No hay un snapshot completo en {raiz}')
+    cadena = manifests[completos[-1]:]
+    for anterior, siguiente in zip(cadena, cadena[1:]):
+        if siguiente['base'] != anterior['nombre']:
+            raise ValueError(f"El snapshot {siguiente['nombre']} no continúa a {anterior['nombre']}")
+    return cadena
+
+def _conversores(tabla, columnas):
+    """Por cada columna del archivo: (índice, nombre, conversión) o None si ya no existe en la tabla"""
+    conversores = []
+    for i, nombre in enumerate(columnas):
+        columna = tabla.columns.get(nombre)
+        if columna is None:
+            continue
+        if isinstance(columna.type, DateTime):
+            conversion = datetime.fromisoformat
+        elif isinstance(columna.type, Date):
+            conversion = date.fromisoformat
+        else:
+            conversion = None
+        conversores.append((i, nombre, conversion))
+    return conversores
+
+def _leer(directorio, archivo, conversores):
+    hash_ = hashlib.sha256()
+    filas = []
+    with gzip.open(os.path.join(directorio, archivo['nombre']), 'rb') as f:
+        for linea in f:
+            hash_.update(linea)
+            valores = json.loads(linea)
+            filas.append({
+                nombre: conversion(valores[i]) if conversion and valores[i] is not None else valores[i]
+                for i, nombre, conversion in conversores
+            })
+    if len(filas) != archivo['filas'] or hash_.hexdigest() != archivo['sha256']:
+        raise ValueError(f"{archivo['nombre']} está dañado (filas o suma de control no coinciden)")
+    return filas
+
+def _upsert(tabla, dialecto):
+    modulo = postgresql if dialecto == 'postgresql' else sqlite
+    stmt = modulo.insert(tabla)
+    claves = [c.name for c in tabla.primary_key.columns]
+    return stmt.on_conflict_do_update(
+        index_elements=claves,
+        set_={c.name: stmt.excluded[c.name] for c in tabla.columns if c.name not in claves},
+    )
+
+def _ajustar_secuencias(conn):
+    """En Postgres, llevar las secuencias de id al máximo restaurado para que las altas no choquen"""
+    for nombre, _ in TABLAS:
+        tabla = db.metadata.tables[nombre]
+        if 'id' in tabla.columns:
+            secuencia = func.pg_get_serial_sequence(conn.dialect.identifier_preparer.format_table(tabla), 'id')
+            conn.execute(select(func.setval(secuencia, func.coalesce(func.max(tabla.c.id), 1))))
+
+def restaurar_snapshot(raiz, destino, hasta=None, progreso=None):
+    """Crear el esquema en la base destino y aplicar la cadena de snapshots; devuelve filas por tabla"""
+    if destino.lower().startswith('postgres://'):
+        destino = destino.replace('postgres://', 'postgresql://', 1)
+    cadena = _cadena(raiz, hasta)
+    engine = create_engine(destino)
+    dialecto = engine.dialect.name
+    if dialecto not in ('postgresql', 'sqlite'):
+        raise ValueError(f'Destino no soportado: {dialecto} (solo SQLite o Postgres)')
+    
+    totales = dict.fromkeys((nombre for nombre, _ in TABLAS), 0)
+    try:
+        db.metadata.create_all(engine)
+        for manifest in cadena:
+            directorio = os.path.join(raiz, manifest['nombre'])
+            # Un commit por snapshot aplicado: si se corta, se puede volver a correr
+            with engine.begin() as conn:
+                for nombre, _ in TABLAS:
+                    info = manifest['tablas'].get(nombre)
+                    if not info:
+                        continue
+                    tabla = db.metadata.tables[nombre]
+                    conversores = _conversores(tabla, info['columnas'])
+                    stmt = _upsert(tabla, dialecto)
+                    for archivo in info['archivos']:
+                        filas = _leer(directorio, archivo, conversores)
+                        conn.execute(stmt, filas)
+                        totales[nombre] += len(filas)
+                if dialecto == 'postgresql':
+                    _ajustar_secuencias(conn)
+            if progreso:
+                progreso(manifest, totales)
+    finally:
+        engine.dispose()
+    return cadena, totales
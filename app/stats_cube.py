@@ -0,0 +1,181 @@
+"""
+Cubo de estadísticas históricas: turnos pre-agregados por hora/día, área, piso, motivo
+normalizado y estado final. Se construye por rangos de días cerrados ('flask build-stats',
+nocturno desde cron) y los reportes por rango leen el cubo en lugar de recorrer los turnos;
+solo los días todavía no construidos (hoy, o los que quedaron fuera de un backfill parcial)
+se agregan en vivo. turn_stats_day registra qué días se construyeron.
+"""
+from datetime import date, datetime, time, timedelta
+
+from sqlalchemy import select, insert, delete, func, extract, cast, literal_column, BigInteger
+
+from . import db
+from .models import VisitorTurn, TurnStatsHourly, TurnStatsDaily, TurnStatsDay, ahora_local, now_argentina
+
+DIMENSIONES = ('dia', 'hora', 'area', 'piso', 'motivo', 'estado')
+_COLUMNA = {'dia': 'fecha', 'hora': 'hora', 'area': 'area_key', 'piso': 'piso', 'motivo': 'motivo_key', 'estado': 'estado'}
+_CLAVE = ('fecha', 'area_key', 'piso', 'motivo_key', 'estado')
+
+def _segundos_entre(desde, hasta):
+    if db.session.get_bind(mapper=VisitorTurn.__mapper__).dialect.name == 'sqlite':
+        return (func.julianday(hasta) - func.julianday(desde)) * 86400
+    return extract('epoch', hasta - desde)
+
+def _select_horario(inicio, fin):
+    """Agregación por hora de los turnos llegados en [inicio, fin), con las columnas del cubo"""
+    fecha = func.date(VisitorTurn.hora_llegada)
+    hora = extract('hour', VisitorTurn.hora_llegada)
+    # Literales sin parámetros para que el GROUP BY coincida con el SELECT en Postgres
+    piso = func.coalesce(VisitorTurn.piso, literal_column("''"))
+    motivo = func.coalesce(VisitorTurn.motivo_key, literal_column("''"))
+    return (
+        select(
+            fecha.label('fecha'),
+            hora.label('hora'),
+            VisitorTurn.area_key.label('area_key'),
+            piso.label('piso'),
+            motivo.label('motivo_key'),
+            VisitorTurn.estado.label('estado'),
+            func.count().label('total'),
+            func.count(VisitorTurn.hora_autorizado).label('con_espera'),
+            cast(func.coalesce(func.sum(_segundos_entre(VisitorTurn.hora_llegada, VisitorTurn.hora_autorizado)), 0), BigInteger).label('espera_segundos'),
+        )
+        .where(VisitorTurn.hora_llegada >= inicio, VisitorTurn.hora_llegada < fin)
+        .group_by(fecha, hora, VisitorTurn.area_key, piso, motivo, VisitorTurn.estado)
+    )
+
+def construir_dias(desde, hasta):
+    """Reconstruir el cubo para los días [desde, hasta] en la transacción actual; devuelve filas diarias"""
+    inicio = datetime.combine(desde, time.min)
+    fin = datetime.combine(hasta + timedelta(days=1), time.min)
+    
+    for modelo in (TurnStatsHourly, TurnStatsDaily, TurnStatsDay):
+        db.session.execute(
+            delete(modelo)
+            .where(modelo.fecha >= desde, modelo.fecha <= hasta)
+            .execution_options(synchronize_session=False)
+        )
+    
+    columnas = ['fecha', 'hora', 'area_key', 'piso', 'motivo_key', 'estado', 'total', 'con_espera', 'espera_segundos']
+    db.session.execute(insert(TurnStatsHourly).from_select(columnas, _select_horario(inicio, fin)))
+    
+    h = TurnStatsHourly
+    diario = (
+        select(h.fecha, h.area_key, h.piso, h.motivo_key, h.estado,
+               func.sum(h.total), func.sum(h.con_espera), func.sum(h.espera_segundos))
+        .where(h.fecha >= desde, h.fecha <= hasta)
+        .group_by(h.fecha, h.area_key, h.piso, h.motivo_key, h.estado)
+    )
+    filas = db.session.execute(
+        insert(TurnStatsDaily).from_select(list(_CLAVE) + ['total', 'con_espera', 'espera_segundos'], diario)
+    ).rowcount
+    
+    ahora = now_argentina()
+    db.session.execute(insert(TurnStatsDay), [
+        {'fecha': desde + timedelta(days=i), 'construido_at': ahora} for i in range((hasta - desde).days + 1)
+    ])
+    return filas
+
+def primer_dia():
+    """Día de llegada del primer turno (None si no hay turnos)"""
+    primero = db.session.query(func.min(VisitorTurn.hora_llegada)).scalar()
+    return primero.date() if primero is not None else None
+
+def ultimo_dia_construido():
+    return db.session.query(func.max(TurnStatsDay.fecha)).scalar()
+
+def _tramos_sin_construir(desde, hasta):
+    """Tramos [inicio, fin] de días del rango que no están en turn_stats_day"""
+    construidos = set(db.session.execute(
+        select(TurnStatsDay.fecha).where(TurnStatsDay.fecha >= desde, TurnStatsDay.fecha <= hasta)
+    ).scalars())
+    tramos = []
+    dia = desde
+    while dia <= hasta:
+        if dia not in construidos:
+            if tramos and tramos[-1][1] == dia - timedelta(days=1):
+                tramos[-1][1] = dia
+            else:
+                tramos.append([dia, dia])
+        dia += timedelta(days=1)
+    return tramos, bool(construidos)
+
+def construir_cubo(desde=None, hasta=None, chunk_dias=7, progreso=None):
+    """Construir el cubo por tramos de chunk_dias, con un commit por tramo.
+    
+    Sin 'desde' sigue desde el último día construido (o el primer turno); sin 'hasta'
+    llega hasta ayer, último día con estados finales. Devuelve (días, filas diarias).
+    """
+    hasta = hasta or ahora_local().date() - timedelta(days=1)
+    if desde is None:
+        ultimo = ultimo_dia_construido()
+        if ultimo is not None:
+            desde = ultimo + timedelta(days=1)
+        else:
+            desde = primer_dia()
+            if desde is None:
+                return 0, 0
+    
+    dias = filas = 0
+    tramo = desde
+    while tramo <= hasta:
+        fin_tramo = min(tramo + timedelta(days=chunk_dias - 1), hasta)
+        filas += construir_dias(tramo, fin_tramo)
+        db.session.commit()
+        dias += (fin_tramo - tramo).days + 1
+        if progreso:
+            progreso(tramo, fin_tramo, filas)
+        tramo = fin_tramo + timedelta(days=1)
+    return dias, filas
+
+def _agrupar(fuente, dimensiones, filtros=()):
+    columnas = [fuente.c[_COLUMNA[d]].label(d) for d in dimensiones]
+    return db.session.execute(
+        select(
+            *columnas,
+            func.sum(fuente.c.total).label('total'),
+            func.sum(fuente.c.con_espera).label('con_espera'),
+            func.sum(fuente.c.espera_segundos).label('espera_segundos'),
+        )
+        .where(*filtros)
+        .group_by(*columnas)
+    ).all()
+
+def reporte(desde, hasta, dimensiones):
+    """Totales y espera promedio del rango [desde, hasta] agrupados por las dimensiones pedidas.
+    
+    Los días ya construidos salen del cubo (diario, u horario si se agrupa por hora);
+    el resto se agrega en vivo desde los turnos, por tramos de días consecutivos.
+    """
+    sin_construir, hay_construidos = _tramos_sin_construir(desde, hasta)
+    acumulado = {}
+    
+    def sumar(filas):
+        for fila in filas:
+            clave = tuple(v.isoformat() if isinstance(v, date) else v for v in fila[:len(dimensiones)])
+            total, con_espera, espera = acumulado.get(clave, (0, 0, 0))
+            acumulado[clave] = (total + (fila.total or 0), con_espera + (fila.con_espera or 0), espera + (fila.espera_segundos or 0))
+    
+    if hay_construidos:
+        tabla = (TurnStatsHourly if 'hora' in dimensiones else TurnStatsDaily).__table__
+        construidos = select(TurnStatsDay.fecha).where(TurnStatsDay.fecha >= desde, TurnStatsDay.fecha <= hasta)
+        sumar(_agrupar(tabla, dimensiones, (tabla.c.fecha >= desde, tabla.c.fecha <= hasta, tabla.c.fecha.in_(construidos))))
+    
+    for inicio, fin in sin_construir:
+        vivo = _select_horario(datetime.combine(inicio, time.min), datetime.combine(fin + timedelta(days=1), time.min))
+        sumar(_agrupar(vivo.subquery(), dimensiones))
+    
+    resultado = []
+    for clave, (total, con_espera, espera) in acumulado.items():
+        # '' es "sin dato" dentro del cubo
+        fila = {d: (v if v != '' else None) for d, v in zip(dimensiones, clave)}
+        if 'hora' in fila:
+            fila['hora'] = int(fila['hora'])
+        fila.update({
+            'total': int(total),
+            'autorizados': int(con_espera),
+            'espera_promedio_segundos': round(espera / con_espera) if con_espera else None,
+        })
+        resultado.append(fila)
+    resultado.sort(key=lambda f: -f['total'])
+    return resultado
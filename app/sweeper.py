@@ -0,0 +1,86 @@
+"""
+Barrido de fin de jornada: cierra como VENCIDO los turnos que quedaron abiertos
+"""
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import update, func
+
+from . import db
+from .models import VisitorTurn, ARGENTINA_TZ, ahora_local
+from .events import publicar_evento
+from .turn_events import registrar_vencidos
+
+ESTADOS_ABIERTOS = ('ESPERA', 'AUTORIZADO_SUBIR')
+
+def _hora_corte(config):
+    return datetime.strptime(config.get('BARRIDO_HORA_CORTE', '20:00'), '%H:%M').time()
+
+def ultimo_corte(config, ahora=None):
+    """Último horario de corte ya cumplido (hoy o ayer)"""
+    ahora = ahora or ahora_local()
+    corte = datetime.combine(ahora.date(), _hora_corte(config))
+    if corte > ahora:
+        corte -= timedelta(days=1)
+    return corte
+
+def proximo_corte(config, ahora=None):
+    return ultimo_corte(config, ahora) + timedelta(days=1)
+
+def _filtro_vencidos(corte):
+    # hora_llegada es TIMESTAMP WITH TIME ZONE en Postgres: un corte sin zona se leería en la
+    # zona de la sesión (UTC en Render) y el de las 20:00 cerraría a las 17:00
+    return (
+        VisitorTurn.estado.in_(ESTADOS_ABIERTOS),
+        VisitorTurn.hora_llegada < corte.replace(tzinfo=ARGENTINA_TZ),
+    )
+
+def contar_vencidos(corte):
+    return VisitorTurn.query.filter(*_filtro_vencidos(corte)).count()
+
+def barrer_turnos(corte):
+    """Pasar a VENCIDO los turnos abiertos llegados antes del corte (un solo UPDATE)"""
+    motivo = f'Vencido: sin atender al cierre del {corte:%d/%m/%Y %H:%M}'
+    # El historial sale de los ids que cerró el mismo UPDATE: un turno autorizado o atendido
+    # en paralelo no queda como vencido en el historial
+    ids = db.session.execute(
+        update(VisitorTurn)
+        .where(*_filtro_vencidos(corte))
+        .values(
+            estado='VENCIDO',
+            notas=func.coalesce(VisitorTurn.notas + '\n', '') + motivo,
+            updated_at=ahora_local(),
+        )
+        .returning(VisitorTurn.id)
+        .execution_options(synchronize_session=False)
+    ).scalars().all()
+    registrar_vencidos(ids)
+    cerrados = len(ids)
+    if cerrados:
+        publicar_evento('turno.vencidos', cerrados=cerrados, corte=corte.isoformat())
+    db.session.commit()
+    return cerrados
+
+def init_barrido(app):
+    """Con BARRIDO_AUTOMATICO, correr el barrido en un hilo al pasar cada horario de corte.
+    
+    Es idempotente: si hay varios workers, el primero cierra los turnos y el resto no encuentra nada.
+    """
+    if not app.config.get('BARRIDO_AUTOMATICO') or app.testing:
+        return
+    
+    def ciclo():
+        while True:
+            espera = (proximo_corte(app.config) - ahora_local()).total_seconds()
+            time.sleep(max(espera, 1))
+            with app.app_context():
+                try:
+                    corte = ultimo_corte(app.config)
+                    cerrados = barrer_turnos(corte)
+                    app.logger.info('Barrido de turnos vencidos', extra={'cerrados': cerrados, 'corte': corte.isoformat()})
+                except Exception:
+                    db.session.rollback()
+                    app.logger.exception('Error en el barrido de turnos vencidos')
+    
+    threading.Thread(target=ciclo, name='barrido-turnos', daemon=True).start()
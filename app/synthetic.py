@@ -0,0 +1,344 @@
+"""
+Datos sintéticos de alto volumen para pruebas de rendimiento ('flask generate-data').
+
+Genera turnos históricos con curvas de llegada por hora y día de la semana, visitantes
+que vuelven según una distribución Zipf de visitas (con su DNI y nombre acentuado, tipeado
+distinto en cada visita), motivos con el ruido de la carga manual y tiempos de espera y
+atención coherentes con el estado final, más el chat de ese día. Todo sale de un único
+generador con semilla: la misma semilla, cantidad y rango de fechas producen las mismas filas.
+Se escribe por lotes (COPY en Postgres, executemany en el resto) con un commit por lote.
+"""
+import random
+import unicodedata
+from bisect import bisect_left
+from datetime import datetime, time, timedelta
+from itertools import accumulate
+
+from flask import current_app
+from sqlalchemy import insert
+
+from . import db
+from .catalog import get_catalog
+from .models import VisitorTurn, ChatMessage, ahora_local
+from .renormalize import clasificar_motivo
+from .scheduler import prioridad_para
+
+NOMBRES = [
+    'Juan', 'María', 'José', 'Ana', 'Luis', 'Sofía', 'Carlos', 'Lucía', 'Jorge', 'Martín',
+    'Valentina', 'Nicolás', 'Camila', 'Matías', 'Florencia', 'Agustín', 'Rocío', 'Ramón',
+    'Inés', 'Julián', 'Mónica', 'Raúl', 'Verónica', 'Sebastián', 'Celeste', 'Joaquín',
+    'Belén', 'Germán', 'Noelia', 'Rubén', 'Mariela', 'Iván', 'Soledad', 'Hernán', 'Débora',
+]
+APELLIDOS = [
+    'González', 'Rodríguez', 'Gómez', 'Fernández', 'López', 'Díaz', 'Martínez', 'Pérez',
+    'Núñez', 'Sánchez', 'Romero', 'Sosa', 'Álvarez', 'Benítez', 'Acuña', 'Ibáñez', 'Ruiz',
+    'Giménez', 'Ramírez', 'Suárez', 'Gutiérrez', 'Domínguez', 'Peña', 'Ledesma', 'Maldonado',
+    'Ojeda', 'Cabrera', 'Ríos', 'Godoy', 'Medina', 'Muñoz', 'Quiroga', 'Villalba', 'Ávila',
+]
+
+# Motivos como los escribe recepción, de más a menos frecuente (los últimos no están en el catálogo)
+MOTIVOS_BASE = [
+    'Consulta', 'Consulta por tarjeta', 'Entrega de documentación', 'Solicitud de materiales',
+    'Plan Más Vida', 'Reclamo', 'Comedor', 'Habitacional', 'Reunión', 'Tarjeta', 'Materiales',
+    'Documentación', 'Incendio', 'Trámite de subsidio', 'Certificado de vulnerabilidad',
+    'Viene por la beca', 'Turno con trabajadora social', 'Pedido de chapas y tirantes',
+]
+PREFIJOS_MOTIVO = ('por ', 'viene por ', 'consulta ', 'x ')
+VARIANTES_MOTIVO = 3000
+
+# Llegadas: peso por día de la semana (lunes = 0; domingo cerrado) y por hora de atención
+PESO_DIA_SEMANA = (1.25, 1.1, 1.0, 1.0, 0.85, 0.08, 0.0)
+PESO_HORA = {7: 0.3, 8: 1.4, 9: 1.8, 10: 1.6, 11: 1.2, 12: 0.9, 13: 0.6, 14: 0.4, 15: 0.2}
+PESO_PISO = {'1': 6, '2': 2, '3': 3}
+
+# Visitas por visitante: P(k) ∝ k^-ZIPF_EXPONENTE (la mayoría viene una o dos veces)
+ZIPF_EXPONENTE = 2.0
+VISITAS_MAXIMAS = 150
+AREA_HABITUAL = 0.7
+
+PRIORIDADES = (('NORMAL', 0.85), ('PREFERENCIAL', 0.09), ('TURNO_PROGRAMADO', 0.05), ('URGENTE', 0.01))
+FACTOR_ESPERA = {'URGENTE': 0.3, 'TURNO_PROGRAMADO': 0.5, 'PREFERENCIAL': 0.6, 'NORMAL': 1.0}
+MOTIVOS_RECHAZO = ('Falta documentación', 'No corresponde al área', 'Se retiró antes de ser llamado', 'Duplicado')
+
+COLUMNAS_TURNO = (
+    'nombre', 'dni', 'area_key', 'area_nombre', 'piso', 'motivo_key', 'motivo_texto', 'estado', 'prioridad',
+    'hora_llegada', 'hora_autorizado', 'hora_atendido', 'llamado_por', 'atendido_por', 'notas',
+    'created_at', 'updated_at',
+)
+COLUMNAS_CHAT = ('usuario', 'origen', 'mensaje', 'timestamp', 'leido')
+
+MENSAJES_RECEPCION = (
+    'Sube {nombre} al piso {piso}',
+    '¿Pueden atender a {nombre}? Viene por {motivo}',
+    'Hay mucha gente esperando para el piso {piso}',
+    '{nombre} pregunta cuánto falta',
+)
+MENSAJES_PISO = (
+    '{nombre} no se presentó, lo vuelvo a llamar',
+    'Ya atendimos a {nombre}',
+    'Manden al próximo por favor',
+    'Estamos sin agentes hasta las {hora}',
+    'Recibido 👍',
+)
+
+def sin_acentos(texto):
+    return unicodedata.normalize('NFKD', texto).encode('ascii', 'ignore').decode('ascii')
+
+def _ensuciar(texto, rng):
+    """Ruido de carga manual: mayúsculas, acentos perdidos, errores de tipeo, prefijos y espacios"""
+    if rng.random() < 0.35:
+        texto = sin_acentos(texto)
+    caso = rng.random()
+    if caso < 0.3:
+        texto = texto.upper()
+    elif caso < 0.7:
+        texto = texto.lower()
+    if rng.random() < 0.1 and len(texto) > 3:
+        i = rng.randrange(1, len(texto) - 1)
+        error = rng.random()
+        if error < 0.4:
+            texto = texto[:i] + texto[i + 1] + texto[i] + texto[i + 2:]
+        elif error < 0.7:
+            texto = texto[:i] + texto[i + 1:]
+        else:
+            texto = texto[:i] + texto[i] + texto[i:]
+    if rng.random() < 0.1:
+        texto = rng.choice(PREFIJOS_MOTIVO) + texto
+    if rng.random() < 0.05:
+        texto = texto.replace(' ', '  ', 1) + ' '
+    return texto
+
+def _motivos(rng, catalog):
+    """Variantes de motivo con su motivo_key (clasificadas una sola vez); elegir una al azar respeta las frecuencias"""
+    pesos_base = list(accumulate(1 / (i + 1) for i in range(len(MOTIVOS_BASE))))
+    clasificados = {}
+    variantes = []
+    for base in rng.choices(MOTIVOS_BASE, cum_weights=pesos_base, k=VARIANTES_MOTIVO):
+        texto = _ensuciar(base, rng).strip() or 'SIN ESPECIFICAR'
+        if texto not in clasificados:
+            clasificados[texto] = clasificar_motivo(texto, catalog)
+        variantes.append((texto[:300], clasificados[texto]))
+    variantes.append(('SIN ESPECIFICAR', 'SIN_ESPECIFICAR'))
+    return variantes
+
+def _visitas(rng, turnos):
+    """Lista barajada de índices de visitante, uno por turno, con visitas por visitante Zipf"""
+    conteos = list(range(1, VISITAS_MAXIMAS + 1))
+    pesos = list(accumulate(k ** -ZIPF_EXPONENTE for k in conteos))
+    visitas = []
+    visitante = 0
+    while len(visitas) < turnos:
+        for k in rng.choices(conteos, cum_weights=pesos, k=min(100000, turnos)):
+            visitas.extend([visitante] * k)
+            visitante += 1
+            if len(visitas) >= turnos:
+                break
+    del visitas[turnos:]
+    rng.shuffle(visitas)
+    return visitas, visitante
+
+def _mezclar(indice):
+    """Entero pseudoaleatorio y estable por visitante (mismo nombre, DNI y área habitual siempre)"""
+    return (indice * 2654435761 + 0x5BD1E995) & 0xFFFFFFFF
+
+def _visitante(indice):
+    h = _mezclar(indice)
+    partes = [NOMBRES[h % len(NOMBRES)]]
+    if (h >> 8) % 3 == 0:
+        partes.append(NOMBRES[(h >> 12) % len(NOMBRES)])
+    partes.append(APELLIDOS[(h >> 16) % len(APELLIDOS)])
+    if (h >> 24) % 4 == 0:
+        partes.append(APELLIDOS[(h >> 20) % len(APELLIDOS)])
+    # 7919 es coprimo con 30M: DNI único por visitante
+    dni = str(20000000 + (indice * 7919) % 30000000)
+    return ' '.join(partes), dni, h
+
+def _nombre_tipeado(nombre, rng):
+    r = rng.random()
+    if r < 0.25:
+        return nombre.upper()
+    if r < 0.35:
+        return sin_acentos(nombre)
+    if r < 0.4:
+        return nombre.lower()
+    return nombre
+
+def _dni_tipeado(dni, rng):
+    r = rng.random()
+    if r < 0.08:
+        return None
+    if r < 0.13:
+        return f'{dni[:2]}.{dni[2:5]}.{dni[5:]}'
+    return dni
+
+def _turnos_por_dia(rng, turnos, desde, dias):
+    """Reparto de los turnos entre los días según el día de la semana, con ±20% de variación"""
+    pesos = [PESO_DIA_SEMANA[(desde + timedelta(days=d)).weekday()] * rng.uniform(0.8, 1.2) for d in range(dias)]
+    total = sum(pesos)
+    if not total:
+        raise ValueError('El rango de fechas no tiene días hábiles')
+    exactos = [turnos * p / total for p in pesos]
+    cantidades = [int(x) for x in exactos]
+    # El resto va a los días con mayor parte fraccionaria (reparto estable y exacto)
+    faltan = turnos - sum(cantidades)
+    for d in sorted(range(dias), key=lambda d: cantidades[d] - exactos[d])[:faltan]:
+        cantidades[d] += 1
+    return cantidades
+
+class _Generador:
+    def __init__(self, rng, catalog, config):
+        self.rng = rng
+        self.motivos = _motivos(rng, catalog)
+        
+        areas = sorted(catalog.areas, key=lambda a: a['key'])
+        por_piso = {}
+        for a in areas:
+            por_piso.setdefault(a.get('piso'), []).append(a)
+        self.areas = areas
+        self.pesos_area = list(accumulate(
+            PESO_PISO.get(a.get('piso'), 1) / len(por_piso[a.get('piso')]) for a in areas
+        ))
+        self.prioridad_area = {a['key']: {p: prioridad_para(a['key'], p) for p, _ in PRIORIDADES} for a in areas}
+        self.prioridades = [p for p, _ in PRIORIDADES]
+        self.pesos_prioridad = list(accumulate(w for _, w in PRIORIDADES))
+        self.agentes = {
+            piso: [f'{NOMBRES[(i * 7 + len(str(piso))) % len(NOMBRES)]} {APELLIDOS[(i * 11) % len(APELLIDOS)][0]}.'
+                   for i in range(4)]
+            for piso in por_piso
+        }
+        self.llamador = {piso: f'piso{piso}' if piso else 'recepcion' for piso in por_piso}
+        
+        self.horas = sorted(PESO_HORA)
+        self.pesos_hora = list(accumulate(PESO_HORA[h] for h in self.horas))
+        self.carga_hora = {h: PESO_HORA[h] / (sum(PESO_HORA.values()) / len(PESO_HORA)) for h in self.horas}
+        self.corte = datetime.strptime(config.get('BARRIDO_HORA_CORTE', '20:00'), '%H:%M').time()
+    
+    def _area(self, h):
+        if self.rng.random() < AREA_HABITUAL:
+            return self.areas[bisect_left(self.pesos_area, (h >> 4) % 1000 / 1000 * self.pesos_area[-1])]
+        return self.rng.choices(self.areas, cum_weights=self.pesos_area)[0]
+    
+    def turnos(self, dia, cantidad, visitantes):
+        """Filas (tuplas en el orden de COLUMNAS_TURNO) de un día, por orden de llegada"""
+        rng = self.rng
+        inicio = datetime.combine(dia, time.min)
+        horas = rng.choices(self.horas, cum_weights=self.pesos_hora, k=cantidad)
+        llegadas = sorted(inicio + timedelta(hours=h, seconds=rng.randrange(3600)) for h in horas)
+        corte = datetime.combine(dia, self.corte)
+        carga_dia = rng.uniform(0.7, 1.4)
+        
+        filas = []
+        for llegada, indice in zip(llegadas, visitantes):
+            nombre, dni, h = _visitante(indice)
+            area = self._area(h)
+            piso = area.get('piso')
+            prioridad = self.prioridad_area[area['key']][
+                rng.choices(self.prioridades, cum_weights=self.pesos_prioridad)[0]
+            ]
+            motivo_texto, motivo_key = rng.choice(self.motivos)
+            
+            autorizado = atendido = llamado_por = atendido_por = notas = None
+            r = rng.random()
+            tarde = llegada.hour >= 14
+            if r < 0.04:
+                estado = 'RECHAZADO'
+                notas = f'Rechazado: {rng.choice(MOTIVOS_RECHAZO)}'
+                actualizado = llegada + timedelta(seconds=rng.randrange(60, 1800))
+            elif r < (0.30 if tarde else 0.12):
+                # Sin cerrar al fin de la jornada: la mitad había sido llamada y nunca se marcó
+                estado = 'VENCIDO'
+                if rng.random() < 0.5:
+                    autorizado = min(llegada + timedelta(minutes=rng.lognormvariate(2.5, 0.6)), corte)
+                    llamado_por = self.llamador[piso]
+                notas = f'Vencido: sin atender al cierre del {corte:%d/%m/%Y %H:%M}'
+                actualizado = corte
+            else:
+                estado = 'ATENDIDO'
+                espera = rng.lognormvariate(2.5, 0.6) * carga_dia * self.carga_hora[llegada.hour] * FACTOR_ESPERA[prioridad]
+                autorizado = llegada + timedelta(minutes=espera)
+                atendido = autorizado + timedelta(minutes=rng.lognormvariate(2.7, 0.5))
+                llamado_por = self.llamador[piso]
+                atendido_por = rng.choice(self.agentes[piso])
+                actualizado = atendido
+            
+            filas.append((
+                _nombre_tipeado(nombre, rng), _dni_tipeado(dni, rng), area['key'], area['nombre'], piso,
+                motivo_key, motivo_texto, estado, prioridad, llegada, autorizado, atendido,
+                llamado_por, atendido_por, notas, llegada, actualizado,
+            ))
+        return filas
+    
+    def mensajes(self, filas, cantidad):
+        """Mensajes de chat del día, cada uno a partir de un turno de ese día"""
+        rng = self.rng
+        mensajes = []
+        for _ in range(cantidad):
+            turno = rng.choice(filas)
+            piso = turno[4] or '1'
+            momento = turno[9] + timedelta(seconds=rng.randrange(1, 1800))
+            datos = {
+                'nombre': turno[0].title(), 'piso': piso, 'motivo': turno[6].lower(),
+                'hora': f'{min(momento.hour + 1, 16)}:00',
+            }
+            if rng.random() < 0.45:
+                usuario, origen, plantilla = 'recepcion', 'recepcion', rng.choice(MENSAJES_RECEPCION)
+            else:
+                usuario, origen, plantilla = f'piso{piso}', f'piso_{piso}', rng.choice(MENSAJES_PISO)
+            mensajes.append((usuario, origen, plantilla.format(**datos), momento, True))
+        mensajes.sort(key=lambda m: m[3])
+        return mensajes
+
+def _insertar(tabla, columnas, filas, dialecto):
+    conexion = db.session.connection()
+    if dialecto == 'postgresql':
+        driver = conexion.connection.driver_connection
+        with driver.cursor() as cursor:
+            with cursor.copy(f'COPY {tabla.name} ({", ".join(columnas)}) FROM STDIN') as copy:
+                for fila in filas:
+                    copy.write_row(fila)
+    else:
+        conexion.execute(insert(tabla), [dict(zip(columnas, fila)) for fila in filas])
+    db.session.commit()
+
+def generar_datos(turnos, dias=365, hasta=None, seed=42, mensajes=0.3, lote=20000, progreso=None):
+    """Insertar 'turnos' turnos sintéticos repartidos en los 'dias' días que terminan en 'hasta'
+    (por defecto ayer) y unos mensajes*turnos mensajes de chat; devuelve los totales.
+    """
+    hasta = hasta or ahora_local().date() - timedelta(days=1)
+    desde = hasta - timedelta(days=dias - 1)
+    rng = random.Random(seed)
+    generador = _Generador(rng, get_catalog(), current_app.config)
+    if not generador.areas:
+        raise ValueError('El catálogo no tiene áreas activas')
+    
+    por_dia = _turnos_por_dia(rng, turnos, desde, dias)
+    visitas, visitantes = _visitas(rng, turnos)
+    dialecto = db.session.get_bind(mapper=VisitorTurn.__mapper__).dialect.name
+    
+    totales = {'turnos': 0, 'mensajes': 0, 'visitantes': visitantes, 'desde': desde, 'hasta': hasta}
+    pendientes_turnos, pendientes_chat = [], []
+    
+    def volcar(dia):
+        _insertar(VisitorTurn.__table__, COLUMNAS_TURNO, pendientes_turnos, dialecto)
+        if pendientes_chat:
+            _insertar(ChatMessage.__table__, COLUMNAS_CHAT, pendientes_chat, dialecto)
+        totales['mensajes'] += len(pendientes_chat)
+        pendientes_turnos.clear()
+        pendientes_chat.clear()
+        if progreso:
+            progreso(dia, totales)
+    
+    for d, cantidad in enumerate(por_dia):
+        if not cantidad:
+            continue
+        dia = desde + timedelta(days=d)
+        inicio = totales['turnos']
+        filas = generador.turnos(dia, cantidad, visitas[inicio:inicio + cantidad])
+        pendientes_turnos.extend(filas)
+        pendientes_chat.extend(generador.mensajes(filas, round(cantidad * mensajes * rng.uniform(0.5, 1.5))))
+        totales['turnos'] += cantidad
+        if len(pendientes_turnos) >= lote:
+            volcar(dia)
+    if pendientes_turnos:
+        volcar(hasta)
+    return totales
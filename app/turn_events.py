@@ -0,0 +1,273 @@
+"""
+Historial append-only de transiciones de turnos (turn_event) y su reproducción.
+
+Cada transición publicada en el bus (turno.creado, .autorizado, .atendido, .rechazado) y
+cada cierre del barrido agrega una fila (turno, tipo, actor, hora) en la misma transacción
+que el cambio. visitor_turn guarda solo el último estado; el historial conserva cada paso,
+incluidas las re-autorizaciones.
+
+La reproducción recorre los eventos una sola vez en orden de (ts, id) (por tramos, memoria
+acotada a los turnos todavía abiertos) y reconstruye el estado de cada turno o alimenta un agregador,
+así las estadísticas derivadas se recalculan sin leer las filas anchas de visitor_turn.
+"""
+from flask import has_request_context
+from flask_login import current_user
+from sqlalchemy import select, insert, exists, or_, and_
+
+from . import db
+from .models import VisitorTurn, TurnEvent, now_argentina
+
+# Eventos del bus que se registran y su tipo en el historial
+TIPOS_BUS = {
+    'turno.creado': 'creado',
+    'turno.autorizado': 'autorizado',
+    'turno.atendido': 'atendido',
+    'turno.rechazado': 'rechazado',
+}
+# Estado del turno después de cada tipo de evento
+ESTADO_TRAS = {
+    'creado': 'ESPERA',
+    'autorizado': 'AUTORIZADO_SUBIR',
+    'atendido': 'ATENDIDO',
+    'rechazado': 'RECHAZADO',
+    'vencido': 'VENCIDO',
+}
+TERMINALES = ('atendido', 'rechazado', 'vencido')
+
+def _actor():
+    if has_request_context() and current_user and current_user.is_authenticated:
+        return current_user.username
+    return 'sistema'
+
+def registrar_transiciones(session, pendientes):
+    """Escribir en turn_event las transiciones de turnos de los eventos pendientes de la transacción"""
+    filas = []
+    actor = None
+    for tipo, objeto, _ in pendientes:
+        if tipo in TIPOS_BUS and isinstance(objeto, VisitorTurn) and objeto.id is not None:
+            actor = actor or _actor()
+            filas.append({'turno_id': objeto.id, 'tipo': TIPOS_BUS[tipo], 'actor': actor, 'ts': now_argentina()})
+    if filas:
+        session.execute(insert(TurnEvent.__table__), filas)
+
+def registrar_vencidos(turno_ids):
+    """Un evento 'vencido' por cada turno que cerró el barrido (los ids que devolvió su UPDATE)"""
+    if not turno_ids:
+        return
+    ts = now_argentina()
+    db.session.execute(
+        insert(TurnEvent.__table__),
+        [{'turno_id': turno_id, 'tipo': 'vencido', 'actor': 'barrido', 'ts': ts} for turno_id in turno_ids],
+    )
+
+# ============================================
+# REPRODUCCIÓN
+# ============================================
+
+def iterar_eventos(hasta_id=None, lote=10000):
+    """Eventos en orden de (ts, id), leídos por tramos (keyset) para no cargar la tabla entera.
+    
+    Se ordena por hora y no solo por id porque completar_historial agrega el 'creado' de los
+    turnos que ya estaban abiertos al empezar el historial con un id posterior a sus eventos
+    reales; con su hora de llegada queda antes que ellos.
+    """
+    ultimo = None
+    while True:
+        query = select(TurnEvent.id, TurnEvent.turno_id, TurnEvent.tipo, TurnEvent.actor, TurnEvent.ts)
+        if ultimo is not None:
+            query = query.where(or_(TurnEvent.ts > ultimo.ts, and_(TurnEvent.ts == ultimo.ts, TurnEvent.id > ultimo.id)))
+        if hasta_id is not None:
+            query = query.where(TurnEvent.id <= hasta_id)
+        filas = db.session.execute(query.order_by(TurnEvent.ts, TurnEvent.id).limit(lote)).all()
+        if not filas:
+            return
+        yield from filas
+        ultimo = filas[-1]
+
+class EstadoTurno:
+    """Estado de un turno reconstruido a partir de sus eventos"""
+    
+    __slots__ = ('estado', 'llegada', 'autorizado', 'atendido', 'autorizaciones')
+
+    def __init__(self):
+        self.estado = None
+        self.llegada = self.autorizado = self.atendido = None
+        self.autorizaciones = 0
+
+    def aplicar(self, tipo, ts):
+        if tipo == 'creado':
+            # Un 'creado' inferido después de eventos reales (turno abierto al empezar el
+            # historial) solo aporta la hora de llegada
+            self.llegada = ts
+            if self.estado is None:
+                self.estado = 'ESPERA'
+            return
+        self.estado = ESTADO_TRAS.get(tipo, self.estado)
+        if tipo == 'autorizado':
+            self.autorizaciones += 1
+            if self.autorizado is None:
+                self.autorizado = ts
+        elif tipo == 'atendido':
+            self.atendido = ts
+
+def _naive(dt):
+    return dt.replace(tzinfo=None) if dt is not None and dt.tzinfo else dt
+
+class PorPeriodo:
+    """Agregado por día u hora de llegada: llegadas, cierres por tipo, re-autorizaciones y tiempos"""
+    
+    CAMPOS = ('llegadas', 'autorizados', 'reautorizados', 'atendidos', 'rechazados', 'vencidos',
+              'espera_segundos', 'atencion_segundos')
+    
+    def __init__(self, grano='dia'):
+        self.grano = grano
+        self.filas = {}
+    
+    def _clave(self, estado):
+        llegada = _naive(estado.llegada)
+        if llegada is None:
+            return ('sin_llegada',)
+        if self.grano == 'hora':
+            return (llegada.date().isoformat(), llegada.hour)
+        return (llegada.date().isoformat(),)
+    
+    def evento(self, evento, estado):
+        fila = self.filas.setdefault(self._clave(estado), dict.fromkeys(self.CAMPOS, 0))
+        if evento.tipo == 'creado':
+            fila['llegadas'] += 1
+        elif evento.tipo == 'autorizado':
+            if estado.autorizaciones == 1:
+                fila['autorizados'] += 1
+                if estado.llegada is not None:
+                    fila['espera_segundos'] += int((_naive(estado.autorizado) - _naive(estado.llegada)).total_seconds())
+            elif estado.autorizaciones == 2:
+                fila['reautorizados'] += 1
+        elif evento.tipo == 'atendido':
+            fila['atendidos'] += 1
+            if estado.autorizado is not None:
+                fila['atencion_segundos'] += int((_naive(estado.atendido) - _naive(estado.autorizado)).total_seconds())
+        elif evento.tipo == 'rechazado':
+            fila['rechazados'] += 1
+        elif evento.tipo == 'vencido':
+            fila['vencidos'] += 1
+    
+    def resultado(self):
+        columnas = ('fecha', 'hora') if self.grano == 'hora' else ('fecha',)
+        return [dict(zip(columnas, clave), **valores) for clave, valores in sorted(self.filas.items(), key=lambda kv: str(kv[0]))]
+
+class PorActor:
+    """Transiciones por actor y tipo de evento"""
+    
+    def __init__(self):
+        self.filas = {}
+    
+    def evento(self, evento, estado):
+        clave = (evento.actor or '', evento.tipo)
+        self.filas[clave] = self.filas.get(clave, 0) + 1
+    
+    def resultado(self):
+        return [{'actor': actor, 'tipo': tipo, 'eventos': n} for (actor, tipo), n in sorted(self.filas.items())]
+
+def reproducir(agregador=None, hasta_id=None, conservar=False, lote=10000):
+    """Recorrer el historial una vez, aplicando cada evento al estado de su turno y al agregador.
+    
+    Con conservar=False los turnos cerrados se descartan al cerrarse (la memoria queda acotada
+    a los abiertos); con conservar=True devuelve el estado de todos, si no el del agregador.
+    """
+    estados = {}
+    eventos = 0
+    for evento in iterar_eventos(hasta_id, lote):
+        estado = estados.get(evento.turno_id)
+        if estado is None:
+            estado = estados[evento.turno_id] = EstadoTurno()
+        estado.aplicar(evento.tipo, evento.ts)
+        if agregador is not None:
+            agregador.evento(evento, estado)
+        if not conservar and evento.tipo in TERMINALES:
+            del estados[evento.turno_id]
+        eventos += 1
+    if conservar:
+        return estados, eventos
+    return (agregador.resultado() if agregador is not None else []), eventos
+
+def verificar(lote=10000):
+    """Comparar el estado reconstruido desde el historial con visitor_turn; devuelve un resumen"""
+    estados, eventos = reproducir(conservar=True, lote=lote)
+    resumen = {'eventos': eventos, 'turnos': 0, 'coinciden': 0, 'sin_eventos': 0, 'distintos': 0, 'ejemplos': []}
+    ultimo = 0
+    while True:
+        filas = db.session.execute(
+            select(VisitorTurn.id, VisitorTurn.estado)
+            .where(VisitorTurn.id > ultimo)
+            .order_by(VisitorTurn.id)
+            .limit(lote)
+        ).all()
+        if not filas:
+            break
+        for fila in filas:
+            resumen['turnos'] += 1
+            estado = estados.get(fila.id)
+            if estado is None:
+                resumen['sin_eventos'] += 1
+            elif estado.estado == fila.estado:
+                resumen['coinciden'] += 1
+            else:
+                resumen['distintos'] += 1
+                if len(resumen['ejemplos']) < 10:
+                    resumen['ejemplos'].append((fila.id, fila.estado, estado.estado))
+        ultimo = filas[-1].id
+    return resumen
+
+# ============================================
+# HISTORIAL INFERIDO
+# ============================================
+
+def _eventos_inferidos(turno):
+    """Eventos que explican el estado actual de un turno a partir de sus horas"""
+    eventos = [('creado', turno.hora_llegada or turno.created_at)]
+    if turno.hora_autorizado is not None:
+        eventos.append(('autorizado', turno.hora_autorizado))
+    if turno.estado == 'ATENDIDO':
+        eventos.append(('atendido', turno.hora_atendido or turno.updated_at))
+    elif turno.estado in ('RECHAZADO', 'VENCIDO'):
+        eventos.append((turno.estado.lower(), turno.updated_at))
+    return eventos
+
+def completar_historial(lote=5000, progreso=None):
+    """Inferir el historial de los turnos sin evento 'creado' (anteriores al historial, importados
+    o sintéticos). A los que no tienen ningún evento se les infieren todos; a los que quedaron
+    abiertos al empezar el historial, solo el 'creado'. Un commit por tramo: se puede cortar y
+    volver a correr.
+    """
+    creado = exists().where(TurnEvent.turno_id == VisitorTurn.id, TurnEvent.tipo == 'creado')
+    ultimo = 0
+    totales = {'turnos': 0, 'eventos': 0}
+    while True:
+        turnos = db.session.execute(
+            select(VisitorTurn.id, VisitorTurn.estado, VisitorTurn.hora_llegada, VisitorTurn.hora_autorizado,
+                   VisitorTurn.hora_atendido, VisitorTurn.created_at, VisitorTurn.updated_at)
+            .where(VisitorTurn.id > ultimo, ~creado)
+            .order_by(VisitorTurn.id)
+            .limit(lote)
+        ).all()
+        if not turnos:
+            break
+        
+        con_eventos = set(db.session.execute(
+            select(TurnEvent.turno_id).where(TurnEvent.turno_id.in_([t.id for t in turnos])).distinct()
+        ).scalars())
+        filas = []
+        for t in turnos:
+            eventos = _eventos_inferidos(t)
+            if t.id in con_eventos:
+                eventos = eventos[:1]
+            filas.extend({'turno_id': t.id, 'tipo': tipo, 'actor': 'historial', 'ts': ts or now_argentina()} for tipo, ts in eventos)
+        db.session.execute(insert(TurnEvent.__table__), filas)
+        db.session.commit()
+        
+        ultimo = turnos[-1].id
+        totales['turnos'] += len(turnos)
+        totales['eventos'] += len(filas)
+        if progreso:
+            progreso(ultimo, totales)
+    return totales
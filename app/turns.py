@@ -1,11 +1,21 @@
 """
 Blueprint para gestión de turnos de visitantes
 """
-from flask import Blueprint, render_template, request, jsonify, flash, redirect, url_for
+import logging
+from flask import Blueprint, render_template, request, jsonify, flash, redirect, url_for, current_app
 from flask_login import login_required, current_user
 from . import db
-from .models import VisitorTurn
-from .utils import normalize_area, normalize_motive
+from .models import VisitorTurn, Visitor, now_argentina
+from .utils import normalize_area, normalize_motive, normalize_dni
+from .catalog import get_catalog
+from .visitors import registrar_visita
+from .typeahead import obtener_indice, registrar_turno
+from .scheduler import prioridad_para, scheduler_para_piso, describir
+from .events import publicar_evento
+from .db_routing import solo_lectura
+from .cache import cached
+from .stats_cube import reporte, primer_dia, DIMENSIONES
+from .desks import reclamar_turno, despachar_libres
 from datetime import datetime
 from sqlalchemy import func, and_, or_
 
@@ -28,7 +38,8 @@ def recepcion():
             return redirect(url_for('turns.piso_llamado', numero=int(piso_num)))
         return redirect(url_for('main.index'))
     
-    return render_template('turns/recepcion.html')
+    return render_template('turns/recepcion.html',
+                           prioridades=current_app.config.get('PRIORIDADES_TURNO', []))
 
 @turns_bp.route('/area/<area_key>')
 @login_required
@@ -44,9 +55,7 @@ def area_dashboard(area_key):
             return redirect(url_for('turns.piso_llamado', numero=int(piso_num)))
         return redirect(url_for('main.index'))
     
-    from config import Config
-    areas = Config.AREAS_MUNICIPALES_NORMALIZADAS
-    area = next((a for a in areas if a['key'] == area_key), None)
+    area = get_catalog().area(area_key)
     
     if not area:
         flash('Área no encontrada', 'error')
@@ -71,9 +80,7 @@ def piso_llamado(numero):
             flash(f'Solo puedes acceder al piso {piso_num}', 'error')
             return redirect(url_for('turns.piso_llamado', numero=piso_num))
     
-    from config import Config
-    areas = Config.AREAS_MUNICIPALES_NORMALIZADAS
-    areas_piso = [a for a in areas if a.get('piso') == str(numero)]
+    areas_piso = get_catalog().areas_por_piso(numero)
     
     if not areas_piso:
         flash(f'Piso {numero} no encontrado', 'error')
@@ -95,28 +102,32 @@ def estadisticas():
 # API ENDPOINTS
 # ============================================
 
-@turns_bp.route('/api/turnos', methods=['GET'])
-@login_required
-def api_list_turns():
-    """Listar turnos con filtros opcionales"""
-    # Filtros
-    estado = request.args.get('estado')
-    area_key = request.args.get('area_key')
-    piso = request.args.get('piso')
-    dni = request.args.get('dni')
-    limit = int(request.args.get('limit', 50))
-    
-    query = VisitorTurn.query
+def _filtrar_turnos(query, args):
+    """Aplicar los filtros comunes de listado (estado, área, piso, DNI)"""
+    estado = args.get('estado')
+    area_key = args.get('area_key')
+    piso = args.get('piso')
+    dni = args.get('dni')
     
     if estado:
-        query = query.filter_by(estado=estado)
+        query = query.filter(VisitorTurn.estado == estado)
     if area_key:
-        query = query.filter_by(area_key=area_key)
+        query = query.filter(VisitorTurn.area_key == area_key)
     if piso:
-        query = query.filter_by(piso=piso)
+        query = query.filter(VisitorTurn.piso == piso)
     if dni:
         query = query.filter(VisitorTurn.dni.like(f'%{dni}%'))
     
+    return query
+
+@turns_bp.route('/api/turnos', methods=['GET'])
+@login_required
+def api_list_turns():
+    """Listar turnos con filtros opcionales"""
+    limit = int(request.args.get('limit', 50))
+    
+    query = _filtrar_turnos(VisitorTurn.query, request.args)
+    
     # Ordenar por más recientes primero
     turnos = query.order_by(VisitorTurn.hora_llegada.desc()).limit(limit).all()
     
@@ -150,65 +161,90 @@ def api_turnos_en_espera():
         'count': len(turnos)
     })
 
+def nuevo_turno(area, nombre, dni=None, motivo_texto=None, prioridad=None):
+    """Agregar un turno en ESPERA a la sesión (sin commit), con el perfil del visitante"""
+    # Normalizar motivo
+    motivo_texto = (motivo_texto or '').strip()
+    motivo_key, _ = normalize_motive(motivo_texto) if motivo_texto else ('SIN_ESPECIFICAR', 'SIN ESPECIFICAR')
+    
+    turno = VisitorTurn(
+        nombre=nombre.strip(),
+        dni=dni.strip() if dni else None,
+        area_key=area['key'],
+        area_nombre=area['nombre'],
+        piso=area['piso'],
+        motivo_key=motivo_key,
+        motivo_texto=motivo_texto or 'SIN ESPECIFICAR',
+        estado='ESPERA',
+        # Prioridad solicitada por recepción (nunca menor que la mínima del área)
+        prioridad=prioridad_para(area['key'], prioridad),
+        hora_llegada=now_argentina()
+    )
+    
+    db.session.add(turno)
+    # Perfil del visitante en la misma transacción que el turno
+    registrar_visita(turno)
+    publicar_evento('turno.creado', turno)
+    return turno
+
+def despues_de_crear_turno(turno):
+    """Efectos posteriores al commit de un turno nuevo (autocompletado, notificaciones)"""
+    current_app.logger.info('Turno creado', extra={'turno_id': turno.id, 'area_key': turno.area_key})
+    
+    try:
+        registrar_turno(turno)
+    except Exception as e:
+        current_app.logger.warning('Error actualizando autocompletado: %s', e)
+    
+    # 🔔 Enviar notificación push a usuarios del piso
+    try:
+        from app.notifications import notify_new_turn
+        notify_new_turn(turno)
+    except Exception as e:
+        current_app.logger.warning('Error enviando notificación: %s', e)
+    
+    # Asignarlo a un puesto libre de su área, si hay alguno esperando
+    if current_app.config.get('PUESTOS_DESPACHO_AUTOMATICO', True):
+        try:
+            despachar_libres(turno.piso)
+        except Exception as e:
+            db.session.rollback()
+            current_app.logger.warning('Error despachando a puestos libres: %s', e)
+
 @turns_bp.route('/api/turnos', methods=['POST'])
 @login_required
 def api_create_turn():
     """Crear nuevo turno desde recepción"""
     try:
         data = request.get_json()
-        print(f"DEBUG - Datos recibidos: {data}")  # DEBUG
+        
+        # El payload solo se registra con nivel DEBUG (contiene datos personales)
+        if current_app.logger.isEnabledFor(logging.DEBUG):
+            current_app.logger.debug('Alta de turno: payload=%s', data)
         
         # Validar campos requeridos
         if not data or not data.get('nombre'):
-            print("DEBUG - Error: Nombre faltante")  # DEBUG
             return jsonify({'success': False, 'message': 'Nombre es requerido'}), 400
         if not data.get('area_key'):
-            print("DEBUG - Error: Area_key faltante")  # DEBUG
             return jsonify({'success': False, 'message': 'Área es requerida'}), 400
         
-        # Obtener información del área desde la configuración
-        from flask import current_app
-        areas = current_app.config.get('AREAS_MUNICIPALES_NORMALIZADAS', [])
-        print(f"DEBUG - Total áreas disponibles: {len(areas)}")  # DEBUG
-        area = next((a for a in areas if a['key'] == data['area_key']), None)
+        # Obtener información del área desde el catálogo
+        area = get_catalog().area(data['area_key'])
         
         if not area:
-            print(f"DEBUG - Error: Área no encontrada para key={data['area_key']}")  # DEBUG
+            current_app.logger.info('Alta de turno rechazada: área no válida %s', data['area_key'])
             return jsonify({'success': False, 'message': f'Área no válida: {data["area_key"]}'}), 400
         
-        area_key = area['key']
-        area_nombre = area['nombre']
-        piso = area['piso']
-        
-        print(f"DEBUG - Área encontrada: {area_nombre} (Piso {piso})")  # DEBUG
-        
-        # Normalizar motivo
-        motivo_texto = (data.get('motivo_texto') or '').strip()
-        motivo_key, _ = normalize_motive(motivo_texto) if motivo_texto else ('SIN_ESPECIFICAR', 'SIN ESPECIFICAR')
-        
-        # Crear turno
-        turno = VisitorTurn(
-            nombre=data['nombre'].strip(),
-            dni=data.get('dni', '').strip() if data.get('dni') else None,
-            area_key=area_key,
-            area_nombre=area_nombre,
-            piso=piso,
-            motivo_key=motivo_key,
-            motivo_texto=motivo_texto or 'SIN ESPECIFICAR',
-            estado='ESPERA'
+        turno = nuevo_turno(
+            area,
+            data['nombre'],
+            dni=data.get('dni'),
+            motivo_texto=data.get('motivo_texto'),
+            prioridad=data.get('prioridad')
         )
-        
-        db.session.add(turno)
         db.session.commit()
         
-        print(f"DEBUG - Turno creado exitosamente ID={turno.id}")  # DEBUG
-        
-        # 🔔 Enviar notificación push a usuarios del piso
-        try:
-            from app.notifications import notify_new_turn
-            notify_new_turn(turno)
-        except Exception as e:
-            print(f"Error enviando notificación: {e}")
+        despues_de_crear_turno(turno)
         
         return jsonify({
             'success': True,
@@ -218,11 +254,47 @@ def api_create_turn():
         
     except Exception as e:
         db.session.rollback()
-        import traceback
-        error_trace = traceback.format_exc()
-        print(f"DEBUG - ERROR: {error_trace}")  # DEBUG
+        current_app.logger.exception('Error creando turno')
         return jsonify({'success': False, 'message': f'Error: {str(e)}'}), 500
 
+def _puede_ver_piso(numero):
+    if current_user.role in ['admin', 'recepcion']:
+        return True
+    return current_user.role == f'piso{numero}'
+
+@turns_bp.route('/api/piso/<int:numero>/cola', methods=['GET'])
+@login_required
+def api_cola_piso(numero):
+    """Turnos en espera del piso en el orden en que conviene llamarlos (prioridad + reparto entre áreas)"""
+    if not _puede_ver_piso(numero):
+        return jsonify({'success': False, 'message': 'No tienes acceso a este piso'}), 403
+    
+    limite = request.args.get('limit', type=int)
+    scheduler = scheduler_para_piso(numero)
+    orden = scheduler.orden(limite)
+    
+    return jsonify({
+        'success': True,
+        'data': [describir(scheduler, turno, ajuste) for turno, ajuste in orden],
+        'count': len(orden)
+    })
+
+@turns_bp.route('/api/piso/<int:numero>/siguiente', methods=['GET'])
+@login_required
+def api_siguiente_piso(numero):
+    """Próximo visitante a llamar en el piso"""
+    if not _puede_ver_piso(numero):
+        return jsonify({'success': False, 'message': 'No tienes acceso a este piso'}), 403
+    
+    scheduler = scheduler_para_piso(numero)
+    siguiente = scheduler.siguiente()
+    
+    if siguiente is None:
+        return jsonify({'success': True, 'data': None})
+    
+    turno, ajuste = siguiente
+    return jsonify({'success': True, 'data': describir(scheduler, turno, ajuste)})
+
 @turns_bp.route('/api/turnos/<int:turno_id>/autorizar', methods=['POST'])
 @login_required
 def api_autorizar_turno(turno_id):
@@ -236,19 +308,18 @@ def api_autorizar_turno(turno_id):
     llamado_por = data.get('llamado_por', current_user.username)
     atendido_por = data.get('atendido_por')
     
-    turno.autorizar_subida(llamado_por)
-    
-    # Guardar quién va a atender
-    if atendido_por:
-        turno.atendido_por = atendido_por
-        db.session.commit()
+    # Condicional: si otro agente o un puesto lo llamó entre la lectura y ahora, no se pisa
+    if not reclamar_turno(turno, llamado_por, atendido_por):
+        db.session.rollback()
+        return jsonify({'success': False, 'message': 'El turno ya fue llamado'}), 409
+    db.session.commit()
     
     # 🔔 Enviar notificación push
     try:
         from app.notifications import notify_turn_authorized
         notify_turn_authorized(turno)
     except Exception as e:
-        print(f"Error enviando notificación: {e}")
+        current_app.logger.warning('Error enviando notificación: %s', e)
     
     return jsonify({
         'success': True,
@@ -290,26 +361,58 @@ def api_rechazar_turno(turno_id):
 
 @turns_bp.route('/api/dni/<dni>/historial', methods=['GET'])
 @login_required
+@cached(ttl=300, etiquetas=('visitantes',))
 def api_historial_dni(dni):
-    """Buscar historial de visitante por DNI (para autocompletar)"""
-    turnos = VisitorTurn.query.filter_by(dni=dni).order_by(VisitorTurn.hora_llegada.desc()).limit(5).all()
+    """Buscar perfil de visitante por DNI (para autocompletar) - lectura por clave primaria"""
+    dni_normalizado = normalize_dni(dni)
+    visitante = db.session.get(Visitor, dni_normalizado) if dni_normalizado else None
     
-    if not turnos:
+    if not visitante:
         return jsonify({'success': True, 'data': None})
     
-    # Retornar último visitante con ese DNI
-    ultimo = turnos[0]
     return jsonify({
         'success': True,
         'data': {
-            'nombre': ultimo.nombre,
-            'dni': ultimo.dni,
-            'visitas_previas': len(turnos)
+            'nombre': visitante.nombre,
+            'dni': dni,
+            'visitas_previas': visitante.total_visitas,
+            'primera_visita': visitante.primera_visita.isoformat() if visitante.primera_visita else None,
+            'ultima_visita': visitante.ultima_visita.isoformat() if visitante.ultima_visita else None,
+            'ultima_area_key': visitante.ultima_area_key,
+            'ultimo_motivo_key': visitante.ultimo_motivo_key,
         }
     })
 
+@turns_bp.route('/api/typeahead', methods=['GET'])
+@login_required
+def api_typeahead():
+    """Autocompletar visitantes por prefijo de nombre o DNI (índice en memoria)"""
+    import time
+    
+    q = request.args.get('q', '').strip()
+    k = request.args.get('k', 10, type=int)
+    
+    if len(q) < 2:
+        return jsonify({'success': True, 'data': [], 'count': 0})
+    
+    indice = obtener_indice()
+    if indice is None:
+        return jsonify({'success': True, 'data': [], 'count': 0, 'indexando': True})
+    
+    inicio = time.perf_counter()
+    resultados = indice.buscar(q, k)
+    
+    return jsonify({
+        'success': True,
+        'data': resultados,
+        'count': len(resultados),
+        'tiempo_ms': round((time.perf_counter() - inicio) * 1000, 3)
+    })
+
 @turns_bp.route('/api/estadisticas/resumen', methods=['GET'])
 @login_required
+@cached(ttl=30)
+@solo_lectura
 def api_estadisticas_resumen():
     """Resumen de estadísticas de turnos"""
     from datetime import date, timedelta
@@ -352,6 +455,8 @@ def api_estadisticas_resumen():
 
 @turns_bp.route('/api/estadisticas/por-piso', methods=['GET'])
 @login_required
+@cached(ttl=30)
+@solo_lectura
 def api_estadisticas_por_piso():
     """Estadísticas de turnos por piso"""
     from datetime import date
@@ -374,6 +479,8 @@ def api_estadisticas_por_piso():
 
 @turns_bp.route('/api/estadisticas/por-area', methods=['GET'])
 @login_required
+@cached(ttl=30)
+@solo_lectura
 def api_estadisticas_por_area():
     """Estadísticas de turnos por área"""
     from datetime import date
@@ -408,55 +515,91 @@ def api_estadisticas_por_area():
 
 @turns_bp.route('/api/estadisticas/por-motivo', methods=['GET'])
 @login_required
+@cached(etiquetas=('turnos', 'catalogo'))
+@solo_lectura
 def api_estadisticas_por_motivo():
-    """Estadísticas de turnos por motivo de consulta"""
-    from datetime import date, datetime, timedelta
-    
-    # Parámetros opcionales de fecha
-    fecha_desde = request.args.get('fecha_desde')
-    fecha_hasta = request.args.get('fecha_hasta')
-    
-    query = db.session.query(
-        VisitorTurn.motivo_texto,
-        func.count(VisitorTurn.id).label('total')
-    ).filter(
-        VisitorTurn.motivo_texto.isnot(None),
-        VisitorTurn.motivo_texto != ''
-    )
-    
-    # Filtrar por fechas si se proporcionan
-    if fecha_desde:
-        try:
-            fecha_desde_dt = datetime.strptime(fecha_desde, '%Y-%m-%d').date()
-            query = query.filter(func.date(VisitorTurn.hora_llegada) >= fecha_desde_dt)
-        except ValueError:
-            pass
-    
-    if fecha_hasta:
-        try:
-            fecha_hasta_dt = datetime.strptime(fecha_hasta, '%Y-%m-%d').date()
-            query = query.filter(func.date(VisitorTurn.hora_llegada) <= fecha_hasta_dt)
-        except ValueError:
-            pass
-    else:
-        # Por defecto, solo hoy
-        hoy = date.today()
-        query = query.filter(func.date(VisitorTurn.hora_llegada) == hoy)
+    """Estadísticas de turnos por motivo normalizado (lee el cubo de estadísticas)"""
+    desde, hasta = _rango_estadisticas(request.args)
+    if desde is None:
+        return jsonify({'success': False, 'message': 'Fechas inválidas (formato YYYY-MM-DD)'}), 400
     
-    por_motivo = query.group_by(VisitorTurn.motivo_texto).order_by(func.count(VisitorTurn.id).desc()).limit(20).all()
+    por_motivo = reporte(desde, hasta, ['motivo'])[:20]
     
     resultado = [{
-        'motivo': motivo.motivo_texto,
-        'total': motivo.total
-    } for motivo in por_motivo]
+        'motivo_key': m['motivo'],
+        'motivo': _etiqueta_motivo(m['motivo']),
+        'total': m['total']
+    } for m in por_motivo]
     
     return jsonify({
         'success': True,
         'data': resultado
     })
 
+@turns_bp.route('/api/estadisticas/historico', methods=['GET'])
+@login_required
+@cached(etiquetas=('turnos', 'catalogo'))
+@solo_lectura
+def api_estadisticas_historico():
+    """Reporte por rango de fechas desde el cubo: ?desde=&hasta=&agrupar=dia,area,piso,motivo,estado,hora"""
+    desde, hasta = _rango_estadisticas(request.args)
+    if desde is None:
+        return jsonify({'success': False, 'message': 'Fechas inválidas (formato YYYY-MM-DD)'}), 400
+    
+    dimensiones = [d.strip() for d in request.args.get('agrupar', 'dia').split(',') if d.strip()]
+    invalidas = [d for d in dimensiones if d not in DIMENSIONES]
+    if invalidas or len(set(dimensiones)) != len(dimensiones):
+        return jsonify({
+            'success': False,
+            'message': f"Dimensiones inválidas: {', '.join(invalidas) or 'repetidas'} (válidas: {', '.join(DIMENSIONES)})"
+        }), 400
+    
+    filas = reporte(desde, hasta, dimensiones)
+    if 'motivo' in dimensiones:
+        for fila in filas:
+            fila['motivo_nombre'] = _etiqueta_motivo(fila['motivo'])
+    if 'area' in dimensiones:
+        catalogo = get_catalog()
+        for fila in filas:
+            area = catalogo.area(fila['area'])
+            fila['area_nombre'] = area['nombre'] if area else fila['area']
+    
+    return jsonify({
+        'success': True,
+        'data': filas,
+        'desde': desde.isoformat(),
+        'hasta': hasta.isoformat(),
+        'count': len(filas)
+    })
+
+def _rango_estadisticas(args):
+    """(desde, hasta) de fecha_desde/fecha_hasta (o desde/hasta); por defecto solo hoy. (None, None) si son inválidas.
+    
+    Con solo fecha_hasta no hay cota inferior: el rango empieza en el primer turno.
+    """
+    from datetime import date
+    
+    hoy = date.today()
+    try:
+        desde = args.get('fecha_desde') or args.get('desde')
+        hasta = args.get('fecha_hasta') or args.get('hasta')
+        desde = datetime.strptime(desde, '%Y-%m-%d').date() if desde else None
+        hasta = datetime.strptime(hasta, '%Y-%m-%d').date() if hasta else None
+    except ValueError:
+        return None, None
+    if desde is None and hasta is not None:
+        desde = min(primer_dia() or hasta, hasta)
+    return desde or hoy, hasta or hoy
+
+def _etiqueta_motivo(motivo_key):
+    if not motivo_key:
+        return 'Otros / sin motivo'
+    return motivo_key.replace('_', ' ').capitalize()
+
 @turns_bp.route('/api/buscar-por-dni', methods=['GET'])
 @login_required
+@cached(ttl=120)
+@solo_lectura
 def api_buscar_por_dni():
     """Buscar todas las visitas de una persona por DNI"""
     dni = request.args.get('dni', '').strip()
@@ -502,6 +645,7 @@ def api_buscar_por_dni():
 
 @turns_bp.route('/api/buscar-por-nombre', methods=['GET'])
 @login_required
+@solo_lectura
 def api_buscar_por_nombre():
     """Buscar visitas por nombre"""
     nombre = request.args.get('nombre', '').strip()
@@ -523,6 +667,145 @@ def api_buscar_por_nombre():
         'count': len(turnos)
     })
 
+# ============================================
+# EXPORTACIÓN
+# ============================================
+
+EXPORT_COLUMNAS = [
+    'id', 'nombre', 'dni', 'area_key', 'area_nombre', 'piso',
+    'motivo_key', 'motivo_texto', 'estado', 'hora_llegada',
+    'hora_autorizado', 'hora_atendido', 'llamado_por', 'atendido_por', 'notas',
+]
+
+def _parse_fecha(valor):
+    """Parsear fecha YYYY-MM-DD, devuelve None si es inválida"""
+    if not valor:
+        return None
+    try:
+        return datetime.strptime(valor, '%Y-%m-%d')
+    except ValueError:
+        return None
+
+def _query_exportacion(args):
+    """Construir la consulta de exportación (sin cargar ORM) a partir de los filtros"""
+    from datetime import timedelta
+    
+    columnas = [getattr(VisitorTurn, c) for c in EXPORT_COLUMNAS]
+    query = _filtrar_turnos(db.session.query(*columnas), args)
+    
+    motivo_key = args.get('motivo_key')
+    if motivo_key:
+        query = query.filter(VisitorTurn.motivo_key == motivo_key)
+    
+    # Rango de fechas sobre la columna indexada (sin func.date para usar el índice)
+    fecha_desde = _parse_fecha(args.get('fecha_desde'))
+    fecha_hasta = _parse_fecha(args.get('fecha_hasta'))
+    if fecha_desde:
+        query = query.filter(VisitorTurn.hora_llegada >= fecha_desde)
+    if fecha_hasta:
+        query = query.filter(VisitorTurn.hora_llegada < fecha_hasta + timedelta(days=1))
+    
+    return query.order_by(VisitorTurn.hora_llegada, VisitorTurn.id)
+
+def _iter_filas_exportacion(query, chunk_size):
+    """Recorrer la consulta con cursor del lado del servidor, en lotes de chunk_size"""
+    resultado = db.session.execute(
+        query.statement.execution_options(stream_results=True, yield_per=chunk_size)
+    )
+    try:
+        for fila in resultado:
+            yield fila
+    finally:
+        resultado.close()
+
+def _generar_csv(query, chunk_size):
+    """Generar el CSV por bloques, sin acumular el archivo en memoria"""
+    import csv
+    import io
+    
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    
+    # BOM para que Excel abra correctamente los acentos
+    buffer.write('\ufeff')
+    writer.writerow(EXPORT_COLUMNAS)
+    yield buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+    
+    pendientes = 0
+    for fila in _iter_filas_exportacion(query, chunk_size):
+        writer.writerow([v.isoformat() if isinstance(v, datetime) else v for v in fila])
+        pendientes += 1
+        if pendientes >= chunk_size:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            pendientes = 0
+    
+    if pendientes:
+        yield buffer.getvalue()
+
+def _generar_xlsx(query, chunk_size):
+    """Generar el XLSX en modo write-only (memoria constante) y enviarlo por bloques"""
+    import tempfile
+    from openpyxl import Workbook
+    
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet('Turnos')
+    ws.append(EXPORT_COLUMNAS)
+    for fila in _iter_filas_exportacion(query, chunk_size):
+        ws.append([
+            v.replace(tzinfo=None) if isinstance(v, datetime) else v
+            for v in fila
+        ])
+    
+    with tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024) as tmp:
+        wb.save(tmp)
+        tmp.seek(0)
+        while True:
+            bloque = tmp.read(64 * 1024)
+            if not bloque:
+                break
+            yield bloque
+
+@turns_bp.route('/api/export', methods=['GET'])
+@login_required
+def api_export():
+    """Exportar historial de turnos en CSV (o XLSX) en streaming - solo admin"""
+    from flask import Response, stream_with_context
+    
+    if current_user.role != 'admin':
+        return jsonify({'success': False, 'message': 'No tienes acceso a esta sección'}), 403
+    
+    formato = request.args.get('formato', 'csv').lower()
+    if formato not in ('csv', 'xlsx'):
+        return jsonify({'success': False, 'message': f'Formato no soportado: {formato}'}), 400
+    
+    chunk_size = current_app.config.get('EXPORT_CHUNK_SIZE', 1000)
+    query = _query_exportacion(request.args)
+    nombre_archivo = f"turnos_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{formato}"
+    
+    if formato == 'xlsx':
+        try:
+            import openpyxl  # noqa: F401
+        except ImportError:
+            return jsonify({'success': False, 'message': 'Exportación XLSX no disponible (falta openpyxl)'}), 501
+        generador = _generar_xlsx(query, chunk_size)
+        mimetype = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+    else:
+        generador = _generar_csv(query, chunk_size)
+        mimetype = 'text/csv'
+    
+    return Response(
+        stream_with_context(generador),
+        mimetype=mimetype,
+        headers={
+            'Content-Disposition': f'attachment; filename={nombre_archivo}',
+            'X-Accel-Buffering': 'no',
+        }
+    )
+
 # ============================================
 # API CHAT
 # ============================================
@@ -565,8 +848,16 @@ def api_chat_enviar():
     )
     
     db.session.add(mensaje)
+    publicar_evento('chat.mensaje', mensaje)
     db.session.commit()
     
+    # 🔔 Notificar al resto (agrupado por destinatario)
+    try:
+        from app.notifications import notify_chat_message
+        notify_chat_message(mensaje)
+    except Exception as e:
+        current_app.logger.warning('Error enviando notificación: %s', e)
+    
     return jsonify({
         'success': True,
         'message': 'Mensaje enviado',
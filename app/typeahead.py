@@ -0,0 +1,362 @@
+"""
+Índice en memoria para autocompletar nombres y DNIs de visitantes
+
+Las claves (nombres plegados sin acentos y DNIs) se guardan ordenadas en un
+único str ASCII con un array de offsets, en lugar de un trie de dicts: una
+búsqueda por prefijo es una búsqueda binaria y el índice ocupa unos pocos
+bytes por clave. Las altas recientes van a un delta ordenado pequeño que se
+compacta con el bloque principal al superar TYPEAHEAD_DELTA_MAX.
+"""
+import heapq
+import sys
+import threading
+import time
+import unicodedata
+from array import array
+from bisect import bisect_left
+
+from flask import current_app
+
+SEPARADOR = '\n'
+FIN = '\x7f'  # mayor que cualquier carácter de una clave plegada
+MAX_SUFIJOS = 4  # "juan carlos perez" -> también "carlos perez" y "perez"
+
+def plegar(texto):
+    """Minúsculas, sin acentos (ñ -> n), solo ASCII y espacios simples"""
+    if not texto:
+        return ''
+    sin_acentos = unicodedata.normalize('NFKD', texto).encode('ascii', 'ignore').decode('ascii')
+    return ' '.join(sin_acentos.lower().split())
+
+def claves_nombre(nombre):
+    """Claves de búsqueda de un nombre: el nombre completo y cada sufijo por palabra"""
+    palabras = plegar(nombre).split(' ')
+    claves = []
+    for i in range(min(len(palabras), MAX_SUFIJOS)):
+        clave = ' '.join(palabras[i:])
+        if clave and clave not in claves:
+            claves.append(clave)
+    return claves
+
+class PrefixIndex:
+    """Claves ordenadas (bloque compacto + delta) que apuntan a un ordinal de visitante"""
+    
+    def __init__(self, pares=()):
+        self._bloque, self._offsets, self._ids = self._empaquetar(sorted(pares))
+        self._delta_claves = []
+        self._delta_ids = []
+    
+    @staticmethod
+    def _empaquetar(pares):
+        offsets = array('I', [0])
+        ids = array('I')
+        partes = []
+        posicion = 0
+        for clave, ordinal in pares:
+            partes.append(clave)
+            posicion += len(clave) + 1
+            offsets.append(posicion)
+            ids.append(ordinal)
+        bloque = SEPARADOR.join(partes) + (SEPARADOR if partes else '')
+        return bloque, offsets, ids
+    
+    def __len__(self):
+        return len(self._ids) + len(self._delta_ids)
+    
+    @property
+    def pendientes(self):
+        return len(self._delta_ids)
+    
+    def _clave(self, i):
+        return self._bloque[self._offsets[i]:self._offsets[i + 1] - 1]
+    
+    def _cota_inferior(self, objetivo):
+        lo, hi = 0, len(self._ids)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._clave(mid) < objetivo:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+    
+    def _rangos(self, prefijo):
+        fin = prefijo + FIN
+        return (
+            (self._cota_inferior(prefijo), self._cota_inferior(fin)),
+            (bisect_left(self._delta_claves, prefijo), bisect_left(self._delta_claves, fin)),
+        )
+    
+    def contar(self, prefijo):
+        (lo, hi), (dlo, dhi) = self._rangos(prefijo)
+        return (hi - lo) + (dhi - dlo)
+    
+    def ordinales(self, prefijo):
+        (lo, hi), (dlo, dhi) = self._rangos(prefijo)
+        yield from self._ids[lo:hi]
+        yield from self._delta_ids[dlo:dhi]
+    
+    def exacto(self, clave):
+        i = self._cota_inferior(clave)
+        if i < len(self._ids) and self._clave(i) == clave:
+            return self._ids[i]
+        j = bisect_left(self._delta_claves, clave)
+        if j < len(self._delta_claves) and self._delta_claves[j] == clave:
+            return self._delta_ids[j]
+        return None
+    
+    def agregar(self, clave, ordinal):
+        j = bisect_left(self._delta_claves, clave)
+        self._delta_claves.insert(j, clave)
+        self._delta_ids.insert(j, ordinal)
+    
+    def compactar(self):
+        """Fusionar el delta con el bloque principal (O(n), poco frecuente)"""
+        if not self._delta_ids:
+            return
+        principal = ((self._clave(i), self._ids[i]) for i in range(len(self._ids)))
+        delta = zip(self._delta_claves, self._delta_ids)
+        self._bloque, self._offsets, self._ids = self._empaquetar(heapq.merge(principal, delta))
+        self._delta_claves = []
+        self._delta_ids = []
+    
+    def bytes(self):
+        return (
+            sys.getsizeof(self._bloque)
+            + self._offsets.buffer_info()[1] * self._offsets.itemsize
+            + self._ids.buffer_info()[1] * self._ids.itemsize
+            + sys.getsizeof(self._delta_claves) + sum(sys.getsizeof(c) for c in self._delta_claves)
+            + sys.getsizeof(self._delta_ids) + sum(sys.getsizeof(i) for i in self._delta_ids)
+        )
+
+class VisitorTypeahead:
+    """Autocompletado de visitantes por prefijo de nombre o DNI, ordenado por cantidad de visitas"""
+    
+    def __init__(self, top_k_max=20, scan_limit=512, delta_max=4096):
+        self.top_k_max = top_k_max
+        self.scan_limit = scan_limit
+        self.delta_max = delta_max
+        self._lock = threading.RLock()
+        self._dnis = array('Q')
+        self._nombres = []
+        self._frecuencia = array('I')
+        self._por_nombre = PrefixIndex()
+        self._por_dni = PrefixIndex()
+        # Top-k precalculado para prefijos con muchos candidatos: (tipo, prefijo) -> [ordinales]
+        self._top = {}
+        self.listo = False
+        self.construyendo = False
+        self.watermark = None
+        self.ultimo_refresco = 0.0
+    
+    def __len__(self):
+        return len(self._nombres)
+    
+    def construir(self, filas):
+        """Construir desde (dni, nombre, total_visitas); reemplaza el contenido actual"""
+        dnis = array('Q')
+        nombres = []
+        frecuencia = array('I')
+        pares_nombre = []
+        pares_dni = []
+        for dni, nombre, total in filas:
+            if not dni or not dni.isdigit() or len(dni) > 18:
+                continue
+            ordinal = len(nombres)
+            dnis.append(int(dni))
+            nombres.append(nombre)
+            frecuencia.append(total or 0)
+            pares_dni.append((dni, ordinal))
+            pares_nombre.extend((clave, ordinal) for clave in claves_nombre(nombre))
+        
+        por_nombre = PrefixIndex(pares_nombre)
+        por_dni = PrefixIndex(pares_dni)
+        with self._lock:
+            self._dnis, self._nombres, self._frecuencia = dnis, nombres, frecuencia
+            self._por_nombre, self._por_dni = por_nombre, por_dni
+            self._top = {}
+            self.listo = True
+    
+    def registrar(self, dni, nombre, incremento=1, total=None):
+        """Alta o actualización de un visitante (total fija la frecuencia absoluta)"""
+        if not dni or not dni.isdigit() or len(dni) > 18:
+            return
+        with self._lock:
+            ordinal = self._por_dni.exacto(dni)
+            claves = []
+            if ordinal is None:
+                ordinal = len(self._nombres)
+                self._dnis.append(int(dni))
+                self._nombres.append(nombre)
+                self._frecuencia.append(total if total is not None else incremento)
+                claves = [('dni', dni)] + [('nombre', c) for c in claves_nombre(nombre)]
+                self._por_dni.agregar(dni, ordinal)
+                for _, clave in claves[1:]:
+                    self._por_nombre.agregar(clave, ordinal)
+            else:
+                self._frecuencia[ordinal] = total if total is not None else self._frecuencia[ordinal] + incremento
+                anteriores = set(claves_nombre(self._nombres[ordinal]))
+                if nombre and nombre != self._nombres[ordinal]:
+                    self._nombres[ordinal] = nombre
+                    for clave in claves_nombre(nombre):
+                        if clave not in anteriores:
+                            self._por_nombre.agregar(clave, ordinal)
+                            anteriores.add(clave)
+                claves = [('dni', dni)] + [('nombre', c) for c in anteriores]
+            
+            self._actualizar_top(ordinal, claves)
+            
+            if self._por_nombre.pendientes > self.delta_max:
+                self._por_nombre.compactar()
+            if self._por_dni.pendientes > self.delta_max:
+                self._por_dni.compactar()
+    
+    def _actualizar_top(self, ordinal, claves):
+        if not self._top:
+            return
+        frecuencia = self._frecuencia
+        for tipo, clave in claves:
+            for n in range(1, len(clave) + 1):
+                top = self._top.get((tipo, clave[:n]))
+                if top is None:
+                    continue
+                if ordinal not in top:
+                    top.append(ordinal)
+                top.sort(key=frecuencia.__getitem__, reverse=True)
+                del top[self.top_k_max:]
+    
+    def buscar(self, texto, k=10):
+        """Top-k visitantes cuyo nombre (o DNI, si el texto es numérico) empieza con el texto"""
+        k = max(1, min(k, self.top_k_max))
+        texto = (texto or '').strip()
+        if texto.replace('.', '').isdigit():
+            tipo, prefijo, indice = 'dni', texto.replace('.', ''), self._por_dni
+        else:
+            tipo, prefijo, indice = 'nombre', plegar(texto), self._por_nombre
+        if not prefijo:
+            return []
+        
+        with self._lock:
+            frecuencia = self._frecuencia
+            if indice.contar(prefijo) <= self.scan_limit:
+                ordinales = heapq.nlargest(k, set(indice.ordinales(prefijo)), key=frecuencia.__getitem__)
+            else:
+                top = self._top.get((tipo, prefijo))
+                if top is None:
+                    top = heapq.nlargest(self.top_k_max, set(indice.ordinales(prefijo)), key=frecuencia.__getitem__)
+                    self._top[(tipo, prefijo)] = top
+                ordinales = top[:k]
+            
+            return [{
+                'dni': str(self._dnis[o]),
+                'nombre': self._nombres[o],
+                'visitas': frecuencia[o],
+            } for o in ordinales]
+    
+    def reporte_memoria(self):
+        """Bytes aproximados por estructura (no incluye el overhead del intérprete)"""
+        with self._lock:
+            nombres = sys.getsizeof(self._nombres) + sum(sys.getsizeof(n) for n in self._nombres)
+            top = sys.getsizeof(self._top) + sum(
+                sys.getsizeof(clave) + sys.getsizeof(clave[1]) + sys.getsizeof(valor) for clave, valor in self._top.items()
+            )
+            partes = {
+                'indice_nombres': self._por_nombre.bytes(),
+                'indice_dni': self._por_dni.bytes(),
+                'nombres': nombres,
+                'dnis': self._dnis.buffer_info()[1] * self._dnis.itemsize,
+                'frecuencias': self._frecuencia.buffer_info()[1] * self._frecuencia.itemsize,
+                'top_k_cache': top,
+            }
+            total = sum(partes.values())
+            return {
+                'visitantes': len(self._nombres),
+                'claves_nombre': len(self._por_nombre),
+                'claves_dni': len(self._por_dni),
+                'bytes': partes,
+                'total_bytes': total,
+                'bytes_por_visitante': round(total / len(self._nombres), 1) if self._nombres else None,
+            }
+
+# ============================================
+# INTEGRACIÓN CON LA APP
+# ============================================
+
+def _cargar_desde_db(indice):
+    from . import db
+    from .models import Visitor
+    
+    query = db.session.query(Visitor.dni, Visitor.nombre, Visitor.total_visitas, Visitor.updated_at)
+    watermark = None
+    
+    def filas():
+        nonlocal watermark
+        for dni, nombre, total, actualizado in query.execution_options(stream_results=True, yield_per=10000):
+            if actualizado is not None and (watermark is None or actualizado > watermark):
+                watermark = actualizado
+            yield dni, nombre, total
+    
+    indice.construir(filas())
+    indice.watermark = watermark
+    indice.ultimo_refresco = time.monotonic()
+
+def _refrescar_desde_db(indice):
+    """Incorporar perfiles modificados por otros workers desde el último refresco"""
+    from . import db
+    from .models import Visitor
+    
+    query = db.session.query(Visitor.dni, Visitor.nombre, Visitor.total_visitas, Visitor.updated_at)
+    if indice.watermark is not None:
+        query = query.filter(Visitor.updated_at >= indice.watermark)
+    for dni, nombre, total, actualizado in query.order_by(Visitor.updated_at).limit(10000):
+        indice.registrar(dni, nombre, total=total)
+        if actualizado is not None and (indice.watermark is None or actualizado > indice.watermark):
+            indice.watermark = actualizado
+    indice.ultimo_refresco = time.monotonic()
+
+def init_typeahead(app):
+    """Crear el índice del proceso y, salvo en testing, construirlo en segundo plano"""
+    indice = VisitorTypeahead(
+        top_k_max=app.config.get('TYPEAHEAD_TOP_K_MAX', 20),
+        scan_limit=app.config.get('TYPEAHEAD_SCAN_LIMIT', 512),
+        delta_max=app.config.get('TYPEAHEAD_DELTA_MAX', 4096),
+    )
+    app.extensions['typeahead'] = indice
+    
+    if app.config.get('TYPEAHEAD_PRELOAD', True) and not app.testing:
+        def construir():
+            with app.app_context():
+                try:
+                    _cargar_desde_db(indice)
+                    app.logger.info('Índice de autocompletado listo', extra={'visitantes': len(indice)})
+                except Exception:
+                    app.logger.exception('Error construyendo el índice de autocompletado')
+                finally:
+                    indice.construyendo = False
+        
+        indice.construyendo = True
+        threading.Thread(target=construir, name='typeahead-build', daemon=True).start()
+
+def obtener_indice():
+    """Índice listo para consultar, o None mientras se construye en segundo plano"""
+    indice = current_app.extensions['typeahead']
+    if not indice.listo:
+        if indice.construyendo:
+            return None
+        indice.construyendo = True
+        try:
+            _cargar_desde_db(indice)
+        finally:
+            indice.construyendo = False
+    elif time.monotonic() - indice.ultimo_refresco > current_app.config.get('TYPEAHEAD_REFRESH_SECONDS', 10):
+        _refrescar_desde_db(indice)
+    return indice
+
+def registrar_turno(turno):
+    """Actualizar el índice de este worker con el turno recién creado"""
+    from .utils import normalize_dni
+    
+    indice = current_app.extensions.get('typeahead')
+    dni = normalize_dni(turno.dni)
+    if indice is not None and indice.listo and dni:
+        indice.registrar(dni, turno.nombre)
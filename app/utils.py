@@ -1,37 +1,40 @@
+import re
 from typing import Optional
-from flask import current_app
 
-def normalize_area(nombre: str) -> tuple[str, str, Optional[str]]:
+_NO_DIGITOS = re.compile(r'\D')
+
+def normalize_dni(dni: str | None) -> Optional[str]:
+    """Normaliza un DNI a solo dígitos ('20.123.456' -> '20123456'); None si queda vacío"""
+    if not dni:
+        return None
+    normalizado = _NO_DIGITOS.sub('', dni)
+    return normalizado or None
+
+def normalize_area(nombre: str, catalog=None) -> tuple[str, str, Optional[str]]:
     """Normaliza un nombre de área a (key, nombre_amigable, piso)
-    Usa Config.AREA_VARIANTS_MAP y Config.AREAS_MUNICIPALES_NORMALIZADAS.
+    Usa las variantes y áreas del catálogo (ver app.catalog); sin catalog, el vigente.
     """
     if not nombre:
         return ('DESCONOCIDO', 'Área desconocida', None)
 
+    if catalog is None:
+        from .catalog import get_catalog
+        catalog = get_catalog()
+
     n = nombre.strip()
-    # Intentar mapear variantes
-    variants = getattr(current_app.config, 'AREA_VARIANTS_MAP', {})
-    key = variants.get(n)
-    if not key:
-        # Intentar case-insensitive
-        for k, v in variants.items():
-            if k.lower() == n.lower():
-                key = v
-                break
+    lowered = n.lower()
+    # Intentar mapear variantes (exacta y luego case-insensitive, ambas O(1))
+    key = catalog.area_variants.get(n) or catalog.area_variants_lower.get(lowered)
 
     # Si no se encontró, intentar por coincidencia parcial
     if not key:
-        lowered = n.lower()
-        for k, v in variants.items():
-            if lowered in k.lower() or k.lower() in lowered:
+        for k, v in catalog.area_variants_parcial:
+            if lowered in k or k in lowered:
                 key = v
                 break
 
     # Buscar detalles en catálogo
-    catalog = getattr(current_app.config, 'AREAS_MUNICIPALES_NORMALIZADAS', [])
-    area = None
-    if key:
-        area = next((a for a in catalog if a['key'] == key), None)
+    area = catalog.area(key) if key else None
 
     # Fallback si no se encuentra
     if not area:
@@ -52,24 +55,22 @@ def normalize_area(nombre: str) -> tuple[str, str, Optional[str]]:
             key = 'INCLUSION_SOCIAL'
         elif 'trabajo social' in lowered:
             key = 'TRABAJO_SOCIAL'
-        area = next((a for a in catalog if a['key'] == key), None)
+        area = catalog.area(key) if key else None
 
     if area:
         return (area['key'], area['nombre'], area.get('piso'))
     return ('DESCONOCIDO', n, None)
 
-def normalize_motive(texto: str | None) -> tuple[Optional[str], str]:
-    """Normaliza motivo libre a (motivo_key, motivo_texto) usando Config.MOTIVO_VARIANTS_MAP"""
+def normalize_motive(texto: str | None, catalog=None) -> tuple[Optional[str], str]:
+    """Normaliza motivo libre a (motivo_key, motivo_texto) usando las variantes del catálogo"""
     if not texto:
         return (None, '')
+    if catalog is None:
+        from .catalog import get_catalog
+        catalog = get_catalog()
+
     t = texto.strip()
-    variants = getattr(current_app.config, 'MOTIVO_VARIANTS_MAP', {})
-    key = variants.get(t)
-    if not key:
-        for k, v in variants.items():
-            if k.lower() == t.lower():
-                key = v
-                break
+    key = catalog.motivo_variants.get(t) or catalog.motivo_variants_lower.get(t.lower())
     if not key:
         l = t.lower()
         if 'materia' in l:
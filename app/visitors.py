@@ -0,0 +1,156 @@
+"""
+Perfiles de visitantes: upsert incremental por turno y reconstrucción desde el historial
+"""
+from sqlalchemy import case
+
+from . import db
+from .models import Visitor, VisitorTurn, now_argentina
+from .utils import normalize_dni
+
+def _insert_upsert():
+    """INSERT ... ON CONFLICT para el dialecto actual (Postgres o SQLite)"""
+    dialecto = db.session.get_bind(mapper=Visitor.__mapper__).dialect.name
+    if dialecto == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialecto == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        return None
+    return insert(Visitor)
+
+def upsert_visitantes(filas):
+    """Fusionar perfiles parciales en la tabla visitor, en la transacción actual.
+    
+    Cada fila trae dni, nombre, total_visitas, primera_visita, ultima_visita,
+    ultima_area_key, ultimo_motivo_key y ultimo_motivo_texto. Los totales se
+    suman y los datos "últimos" se toman de la visita más reciente, por lo que
+    aplicar las filas en cualquier orden da el mismo resultado.
+    """
+    if not filas:
+        return
+    
+    ahora = now_argentina()
+    filas = [dict(fila, updated_at=ahora) for fila in filas]
+    stmt = _insert_upsert()
+    if stmt is None:
+        for fila in filas:
+            _fusionar_orm(fila)
+        return
+    
+    excluded = stmt.excluded
+    mas_reciente = excluded.ultima_visita >= Visitor.ultima_visita
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[Visitor.dni],
+        set_={
+            'total_visitas': Visitor.total_visitas + excluded.total_visitas,
+            'primera_visita': case(
+                (excluded.primera_visita < Visitor.primera_visita, excluded.primera_visita),
+                else_=Visitor.primera_visita,
+            ),
+            'ultima_visita': case((mas_reciente, excluded.ultima_visita), else_=Visitor.ultima_visita),
+            'nombre': case((mas_reciente, excluded.nombre), else_=Visitor.nombre),
+            'ultima_area_key': case((mas_reciente, excluded.ultima_area_key), else_=Visitor.ultima_area_key),
+            'ultimo_motivo_key': case((mas_reciente, excluded.ultimo_motivo_key), else_=Visitor.ultimo_motivo_key),
+            'ultimo_motivo_texto': case((mas_reciente, excluded.ultimo_motivo_texto), else_=Visitor.ultimo_motivo_texto),
+            'updated_at': excluded.updated_at,
+        },
+    )
+    db.session.execute(stmt, filas)
+
+def _fusionar_orm(fila):
+    visitor = db.session.get(Visitor, fila['dni'])
+    if visitor is None:
+        db.session.add(Visitor(**fila))
+        return
+    visitor.total_visitas += fila['total_visitas']
+    if fila['primera_visita'] < visitor.primera_visita:
+        visitor.primera_visita = fila['primera_visita']
+    if fila['ultima_visita'] >= visitor.ultima_visita:
+        for campo in ('ultima_visita', 'nombre', 'ultima_area_key', 'ultimo_motivo_key', 'ultimo_motivo_texto'):
+            setattr(visitor, campo, fila[campo])
+
+def fila_de_turno(turno, dni=None):
+    """Perfil parcial (una visita) a partir de un turno"""
+    return {
+        'dni': dni or normalize_dni(turno.dni),
+        'nombre': turno.nombre,
+        'total_visitas': 1,
+        'primera_visita': turno.hora_llegada,
+        'ultima_visita': turno.hora_llegada,
+        'ultima_area_key': turno.area_key,
+        'ultimo_motivo_key': turno.motivo_key,
+        'ultimo_motivo_texto': turno.motivo_texto,
+    }
+
+def registrar_visita(turno):
+    """Actualizar el perfil del visitante del turno (sin commit, misma transacción)"""
+    dni = normalize_dni(turno.dni)
+    if dni:
+        upsert_visitantes([fila_de_turno(turno, dni)])
+
+def reconstruir_visitantes(lote=5000, progreso=None):
+    """Reconstruir la tabla visitor desde visitor_turn en una sola pasada en streaming.
+    
+    Borra los perfiles existentes y los recalcula dentro de una transacción.
+    Conviene ejecutarlo fuera del horario de atención.
+    """
+    db.session.query(Visitor).delete(synchronize_session=False)
+    
+    columnas = (
+        VisitorTurn.dni, VisitorTurn.nombre, VisitorTurn.hora_llegada,
+        VisitorTurn.area_key, VisitorTurn.motivo_key, VisitorTurn.motivo_texto,
+    )
+    query = (
+        db.session.query(*columnas)
+        .filter(VisitorTurn.dni.isnot(None), VisitorTurn.dni != '')
+        .order_by(VisitorTurn.dni, VisitorTurn.hora_llegada)
+        .execution_options(stream_results=True, yield_per=lote)
+    )
+    
+    pendientes = {}
+    turnos = 0
+    visitantes = 0
+    for fila in query:
+        dni = normalize_dni(fila.dni)
+        if not dni:
+            continue
+        turnos += 1
+        perfil = pendientes.get(dni)
+        if perfil is None:
+            pendientes[dni] = {
+                'dni': dni,
+                'nombre': fila.nombre,
+                'total_visitas': 1,
+                'primera_visita': fila.hora_llegada,
+                'ultima_visita': fila.hora_llegada,
+                'ultima_area_key': fila.area_key,
+                'ultimo_motivo_key': fila.motivo_key,
+                'ultimo_motivo_texto': fila.motivo_texto,
+            }
+        else:
+            perfil['total_visitas'] += 1
+            if fila.hora_llegada < perfil['primera_visita']:
+                perfil['primera_visita'] = fila.hora_llegada
+            if fila.hora_llegada >= perfil['ultima_visita']:
+                perfil.update(
+                    nombre=fila.nombre,
+                    ultima_visita=fila.hora_llegada,
+                    ultima_area_key=fila.area_key,
+                    ultimo_motivo_key=fila.motivo_key,
+                    ultimo_motivo_texto=fila.motivo_texto,
+                )
+        if len(pendientes) >= lote:
+            visitantes += len(pendientes)
+            upsert_visitantes(list(pendientes.values()))
+            pendientes = {}
+            if progreso:
+                progreso(turnos, visitantes)
+    
+    if pendientes:
+        visitantes += len(pendientes)
+        upsert_visitantes(list(pendientes.values()))
+    db.session.commit()
+    if progreso:
+        progreso(turnos, visitantes)
+    # Un mismo DNI puede escribirse en más de un lote (p.ej. '20.123.456' y '20123456')
+    return turnos, db.session.query(Visitor).count()
@@ -0,0 +1,7 @@
+"""
+Benchmarks de carga del turnero
+
+Reproduce el tráfico real de recepción, pisos y administración contra la
+aplicación (en proceso o por HTTP) y guarda los resultados en JSON para
+poder comparar entre commits.
+"""
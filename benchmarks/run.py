@@ -0,0 +1,259 @@
+"""
+Benchmark de carga del turnero
+
+Uso:
+    # En proceso, contra una base SQLite o Postgres local (cuenta consultas SQL)
+    python -m benchmarks.run run --database sqlite:////tmp/bench.db --duracion 60
+
+    # Contra un servidor en ejecución (p.ej. gunicorn con RATELIMIT_ENABLED=False)
+    python -m benchmarks.run run --url http://localhost:8000 --duracion 60
+
+    # Comparar dos resultados (p.ej. de dos commits)
+    python -m benchmarks.run compare base.json nuevo.json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+
+from .workload import (
+    AREAS_POR_PISO, MOTIVOS, NOMBRES, APELLIDOS,
+    Recorder, InProcessTransport, HttpTransport,
+    PantallaRecepcion, PantallaPiso, PantallaAdmin,
+)
+
+RESULTADOS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+USUARIOS = [
+    ('admin', 'admin', None, 'admin123'),
+    ('recepcion', 'recepcion', None, 'recepcion123'),
+    ('piso1', 'piso1', '1', 'piso1123'),
+    ('piso2', 'piso2', '2', 'piso2123'),
+    ('piso3', 'piso3', '3', 'piso3123'),
+]
+
+def _commit_actual():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return None
+
+def _crear_app(database_url):
+    """Crear la app en proceso apuntando a la base indicada, sin rate limiting"""
+    os.environ['DATABASE_URL'] = database_url
+    os.environ['RATELIMIT_ENABLED'] = 'False'
+    from app import create_app
+    return create_app('development')
+
+def _preparar_base(app, turnos_historicos, seed):
+    """Crear los usuarios de cada pantalla y, opcionalmente, historial de turnos"""
+    import random
+    from app import db
+    from app.models import User, VisitorTurn, now_argentina
+    
+    with app.app_context():
+        for username, role, piso, password in USUARIOS:
+            if User.query.filter_by(username=username).first() is None:
+                user = User(username=username, email=f'{username}@municipio.gob.ar', role=role, piso=piso)
+                user.set_password(password)
+                db.session.add(user)
+        db.session.commit()
+        
+        existentes = VisitorTurn.query.count()
+        faltan = max(0, turnos_historicos - existentes)
+        if not faltan:
+            return
+        
+        from config import Config
+        areas = {a['key']: a for a in Config.AREAS_MUNICIPALES_NORMALIZADAS}
+        rng = random.Random(seed)
+        ahora = now_argentina().replace(tzinfo=None)
+        lote = []
+        for i in range(faltan):
+            piso = rng.choices(['1', '2', '3'], weights=[6, 2, 3])[0]
+            area = areas[rng.choice(AREAS_POR_PISO[piso])]
+            llegada = ahora - timedelta(days=rng.randint(1, 365), minutes=rng.randint(0, 600))
+            lote.append({
+                'nombre': f'{rng.choice(NOMBRES)} {rng.choice(APELLIDOS)}',
+                'dni': str(rng.randint(20000000, 20000000 + 5000)),
+                'area_key': area['key'],
+                'area_nombre': area['nombre'],
+                'piso': area['piso'],
+                'motivo_key': None,
+                'motivo_texto': rng.choice(MOTIVOS),
+                'estado': 'ATENDIDO',
+                'hora_llegada': llegada,
+                'hora_autorizado': llegada + timedelta(minutes=rng.randint(1, 40)),
+                'hora_atendido': llegada + timedelta(minutes=rng.randint(41, 90)),
+            })
+            if len(lote) >= 5000:
+                db.session.bulk_insert_mappings(VisitorTurn, lote)
+                db.session.commit()
+                lote = []
+        if lote:
+            db.session.bulk_insert_mappings(VisitorTurn, lote)
+            db.session.commit()
+
+def cmd_run(args):
+    if args.url:
+        modo = 'http'
+        transport_factory = lambda: HttpTransport(args.url)
+        dialecto = None
+    else:
+        modo = 'in-process'
+        app = _crear_app(args.database)
+        _preparar_base(app, args.turnos_historicos, args.seed)
+        from app import db
+        with app.app_context():
+            engine = db.engine
+            dialecto = engine.dialect.name
+        transport_factory = lambda: InProcessTransport(app, engine)
+    
+    recorder = Recorder()
+    stop = threading.Event()
+    pantallas = []
+    seed = args.seed
+    
+    for i in range(args.recepciones):
+        pantallas.append(PantallaRecepcion(f'recepcion-{i}', transport_factory(), recorder, stop,
+                                           escala=args.escala, seed=seed + len(pantallas),
+                                           llegadas_por_minuto=args.llegadas_por_minuto))
+    for piso in AREAS_POR_PISO:
+        for i in range(args.pantallas_por_piso):
+            pantallas.append(PantallaPiso(f'piso{piso}-{i}', transport_factory(), recorder, stop,
+                                          escala=args.escala, seed=seed + len(pantallas), piso=piso))
+    for i in range(args.admins):
+        pantallas.append(PantallaAdmin(f'admin-{i}', transport_factory(), recorder, stop,
+                                       escala=args.escala, seed=seed + len(pantallas)))
+    
+    print(f'▶ {len(pantallas)} pantallas, modo {modo}, {args.duracion}s, escala {args.escala}')
+    inicio = time.perf_counter()
+    for p in pantallas:
+        p.start()
+    time.sleep(args.duracion)
+    stop.set()
+    for p in pantallas:
+        p.join(timeout=60)
+    duracion = time.perf_counter() - inicio
+    
+    errores = [f'{p.name}: {p.error}' for p in pantallas if p.error]
+    for e in errores:
+        print(f'✗ {e}', file=sys.stderr)
+    
+    resultado = {
+        'meta': {
+            'commit': _commit_actual(),
+            'fecha': datetime.now().isoformat(timespec='seconds'),
+            'modo': modo,
+            'url': args.url,
+            'dialecto': dialecto,
+            'duracion_segundos': round(duracion, 3),
+            'escala': args.escala,
+            'pantallas': len(pantallas),
+            'pantallas_por_piso': args.pantallas_por_piso,
+            'recepciones': args.recepciones,
+            'admins': args.admins,
+            'llegadas_por_minuto': args.llegadas_por_minuto,
+            'turnos_historicos': args.turnos_historicos,
+            'seed': args.seed,
+            'errores_pantallas': errores,
+        },
+        **recorder.summary(duracion),
+    }
+    
+    salida = args.output
+    if not salida:
+        os.makedirs(RESULTADOS_DIR, exist_ok=True)
+        nombre = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{resultado['meta']['commit'] or 'sin-commit'}.json"
+        salida = os.path.join(RESULTADOS_DIR, nombre)
+    with open(salida, 'w', encoding='utf-8') as f:
+        json.dump(resultado, f, indent=2, ensure_ascii=False)
+    
+    _imprimir(resultado)
+    print(f'\n✓ Resultados guardados en {salida}')
+    return 0
+
+def _imprimir(resultado):
+    print(f"\n{'Endpoint':<50} {'req':>7} {'rps':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'sql':>6} {'err':>5}")
+    for label, e in resultado['endpoints'].items():
+        lat = e['latencia_ms']
+        sql = '-' if e['sql_por_request'] is None else f"{e['sql_por_request']:.1f}"
+        print(f"{label:<50} {e['requests']:>7} {e['throughput_rps']:>8.2f} {lat['p50']:>8.2f} "
+              f"{lat['p95']:>8.2f} {lat['p99']:>8.2f} {sql:>6} {e['errores']:>5}")
+    print(f"\nTotal: {resultado['total_requests']} requests, {resultado['throughput_rps']:.2f} req/s")
+
+def cmd_compare(args):
+    with open(args.base, encoding='utf-8') as f:
+        base = json.load(f)
+    with open(args.nuevo, encoding='utf-8') as f:
+        nuevo = json.load(f)
+    
+    print(f"Base:  {base['meta'].get('commit')} ({base['meta'].get('fecha')})")
+    print(f"Nuevo: {nuevo['meta'].get('commit')} ({nuevo['meta'].get('fecha')})\n")
+    print(f"{'Endpoint':<50} {'p50 Δ%':>8} {'p95 Δ%':>8} {'p99 Δ%':>8} {'sql Δ':>7}")
+    
+    regresiones = []
+    for label in sorted(set(base['endpoints']) | set(nuevo['endpoints'])):
+        b = base['endpoints'].get(label)
+        n = nuevo['endpoints'].get(label)
+        if not b or not n:
+            print(f"{label:<50} {'(solo en ' + ('nuevo' if n else 'base') + ')':>34}")
+            continue
+        deltas = []
+        for p in ('p50', 'p95', 'p99'):
+            vb, vn = b['latencia_ms'][p], n['latencia_ms'][p]
+            delta = (vn - vb) / vb * 100 if vb else 0.0
+            deltas.append(delta)
+            if p == args.percentil and delta > args.umbral:
+                regresiones.append((label, p, delta))
+        sql_b, sql_n = b.get('sql_por_request'), n.get('sql_por_request')
+        sql = '-' if sql_b is None or sql_n is None else f'{sql_n - sql_b:+.1f}'
+        if sql_b is not None and sql_n is not None and sql_n > sql_b:
+            regresiones.append((label, 'sql', sql_n - sql_b))
+        print(f"{label:<50} {deltas[0]:>+8.1f} {deltas[1]:>+8.1f} {deltas[2]:>+8.1f} {sql:>7}")
+    
+    if regresiones:
+        print('\n✗ Regresiones:')
+        for label, metrica, delta in regresiones:
+            print(f'  {label} {metrica}: {delta:+.1f}')
+        return 1
+    print('\n✓ Sin regresiones')
+    return 0
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark de carga del turnero')
+    sub = parser.add_subparsers(dest='comando', required=True)
+    
+    run = sub.add_parser('run', help='Ejecutar el escenario de carga')
+    run.add_argument('--url', help='URL de un servidor en ejecución (modo HTTP)')
+    run.add_argument('--database', default='sqlite:////tmp/turnero_bench.db',
+                     help='Base de datos para el modo en proceso (SQLite o Postgres local)')
+    run.add_argument('--duracion', type=float, default=60, help='Segundos de ejecución')
+    run.add_argument('--escala', type=float, default=0.0,
+                     help='Factor de tiempo real (1 = intervalos reales, 0 = sin pausas)')
+    run.add_argument('--pantallas-por-piso', type=int, default=1)
+    run.add_argument('--recepciones', type=int, default=1)
+    run.add_argument('--admins', type=int, default=1)
+    run.add_argument('--llegadas-por-minuto', type=float, default=4.0)
+    run.add_argument('--turnos-historicos', type=int, default=0,
+                     help='Turnos de historial a precargar (solo modo en proceso)')
+    run.add_argument('--seed', type=int, default=42)
+    run.add_argument('--output', help='Archivo JSON de salida')
+    run.set_defaults(func=cmd_run)
+    
+    compare = sub.add_parser('compare', help='Comparar dos resultados JSON')
+    compare.add_argument('base')
+    compare.add_argument('nuevo')
+    compare.add_argument('--percentil', default='p95', choices=['p50', 'p95', 'p99'])
+    compare.add_argument('--umbral', type=float, default=10.0, help='Porcentaje de empeoramiento tolerado')
+    compare.set_defaults(func=cmd_compare)
+    
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,283 @@
+"""
+Escenario de carga del turnero: pantallas de recepción, pisos y administración
+
+Cada pantalla es un hilo que ejecuta sus tareas periódicas (los mismos
+polling que hacen los templates) sobre un reloj virtual. Con escala 0 las
+tareas se ejecutan sin pausa pero respetando la proporción entre ellas.
+"""
+import math
+import random
+import threading
+import time
+from collections import defaultdict
+
+# Áreas por piso para generar turnos realistas
+AREAS_POR_PISO = {
+    '1': ['TRABAJO_SOCIAL', 'POLITICAS_ALIMENTARIAS', 'SITUACION_DE_CALLE', 'EMERGENCIA_ASISTENCIA_CRITICA'],
+    '2': ['NINEZ_Y_ADOLESCENCIA'],
+    '3': ['SECRETARIA', 'INTEGRACION_SOCIAL', 'ARTICULACION_OPERATIVA', 'INCLUSION_SOCIAL'],
+}
+
+MOTIVOS = [
+    'consulta', 'Consulta por tarjeta', 'entrega de documentacion', 'materiales',
+    'reclamo', 'comedor', 'plan mas vida', 'habitacional', 'reunion', 'incendio',
+]
+
+NOMBRES = ['Juan', 'María', 'José', 'Ana', 'Luis', 'Sofía', 'Carlos', 'Lucía', 'Jorge', 'Martín']
+APELLIDOS = ['González', 'Rodríguez', 'Gómez', 'Fernández', 'López', 'Díaz', 'Martínez', 'Pérez', 'Núñez']
+
+def percentil(valores_ordenados, p):
+    """Percentil por rango más cercano sobre una lista ya ordenada"""
+    if not valores_ordenados:
+        return None
+    k = max(0, min(len(valores_ordenados) - 1, math.ceil(p / 100.0 * len(valores_ordenados)) - 1))
+    return valores_ordenados[k]
+
+class Recorder:
+    """Acumula latencias, códigos de estado y consultas SQL por endpoint"""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._latencias = defaultdict(list)
+        self._errores = defaultdict(int)
+        self._queries = defaultdict(list)
+    
+    def record(self, label, latencia_ms, status, queries=None):
+        with self._lock:
+            self._latencias[label].append(latencia_ms)
+            if status >= 400:
+                self._errores[label] += 1
+            if queries is not None:
+                self._queries[label].append(queries)
+    
+    def summary(self, duracion_segundos):
+        """Resumen por endpoint: throughput, p50/p95/p99 y consultas SQL por request"""
+        endpoints = {}
+        total = 0
+        with self._lock:
+            for label, latencias in sorted(self._latencias.items()):
+                ordenadas = sorted(latencias)
+                queries = self._queries.get(label) or []
+                total += len(ordenadas)
+                endpoints[label] = {
+                    'requests': len(ordenadas),
+                    'errores': self._errores.get(label, 0),
+                    'throughput_rps': round(len(ordenadas) / duracion_segundos, 3) if duracion_segundos else None,
+                    'latencia_ms': {
+                        'media': round(sum(ordenadas) / len(ordenadas), 3),
+                        'p50': round(percentil(ordenadas, 50), 3),
+                        'p95': round(percentil(ordenadas, 95), 3),
+                        'p99': round(percentil(ordenadas, 99), 3),
+                        'max': round(ordenadas[-1], 3),
+                    },
+                    'sql_por_request': round(sum(queries) / len(queries), 2) if queries else None,
+                }
+        return {
+            'total_requests': total,
+            'throughput_rps': round(total / duracion_segundos, 3) if duracion_segundos else None,
+            'endpoints': endpoints,
+        }
+
+class InProcessTransport:
+    """Cliente de prueba de Flask; cuenta las consultas SQL de cada request"""
+    
+    _local = threading.local()
+    _listener_instalado = False
+    _listener_lock = threading.Lock()
+    
+    def __init__(self, app, engine):
+        self.client = app.test_client()
+        self._instalar_listener(engine)
+    
+    @classmethod
+    def _instalar_listener(cls, engine):
+        from sqlalchemy import event
+        
+        with cls._listener_lock:
+            if cls._listener_instalado:
+                return
+            
+            @event.listens_for(engine, 'before_cursor_execute')
+            def _contar(conn, cursor, statement, parameters, context, executemany):
+                cls._local.queries = getattr(cls._local, 'queries', 0) + 1
+            
+            cls._listener_instalado = True
+    
+    def request(self, method, path, json=None):
+        InProcessTransport._local.queries = 0
+        resp = self.client.open(path, method=method, json=json)
+        body = resp.get_json(silent=True)
+        return resp.status_code, body, InProcessTransport._local.queries
+
+class HttpTransport:
+    """Cliente HTTP real (keep-alive) contra un servidor en ejecución"""
+    
+    def __init__(self, base_url, timeout=30):
+        import requests
+        
+        self.base_url = base_url.rstrip('/')
+        self.session = requests.Session()
+        self.timeout = timeout
+    
+    def request(self, method, path, json=None):
+        resp = self.session.request(method, self.base_url + path, json=json, timeout=self.timeout)
+        try:
+            body = resp.json()
+        except ValueError:
+            body = None
+        return resp.status_code, body, None
+
+class Pantalla(threading.Thread):
+    """Pantalla simulada: ejecuta tareas periódicas sobre un reloj virtual"""
+    
+    usuario = None
+    password = None
+    
+    def __init__(self, nombre, transport, recorder, stop_event, escala=1.0, seed=None):
+        super().__init__(name=nombre, daemon=True)
+        self.transport = transport
+        self.recorder = recorder
+        self.stop_event = stop_event
+        self.escala = escala
+        self.rng = random.Random(seed)
+        self.error = None
+    
+    def tareas(self):
+        """Lista de (intervalo_segundos, callable)"""
+        raise NotImplementedError
+    
+    def call(self, label, method, path, json=None):
+        inicio = time.perf_counter()
+        try:
+            status, body, queries = self.transport.request(method, path, json=json)
+        except Exception:
+            status, body, queries = 599, None, None
+        self.recorder.record(label, (time.perf_counter() - inicio) * 1000, status, queries)
+        return body or {}
+    
+    def login(self):
+        body = self.call('POST /api/login', 'POST', '/api/login',
+                         json={'username': self.usuario, 'password': self.password})
+        if not body.get('success'):
+            raise RuntimeError(f'No se pudo iniciar sesión como {self.usuario}: {body}')
+    
+    def run(self):
+        try:
+            self.login()
+            # Desfasar el arranque de cada tarea para no sincronizar todas las pantallas
+            agenda = [[self.rng.uniform(0, intervalo), intervalo, accion] for intervalo, accion in self.tareas()]
+            reloj = 0.0
+            while not self.stop_event.is_set():
+                agenda.sort(key=lambda t: t[0])
+                proxima = agenda[0]
+                espera = proxima[0] - reloj
+                if espera > 0 and self.escala > 0:
+                    if self.stop_event.wait(espera * self.escala):
+                        break
+                reloj = proxima[0]
+                proxima[2]()
+                proxima[0] += proxima[1]
+        except Exception as e:
+            self.error = e
+
+class PantallaRecepcion(Pantalla):
+    """recepcion.html: registra visitantes, cola y estadísticas cada 10s, chat cada 5s"""
+    
+    usuario = 'recepcion'
+    password = 'recepcion123'
+    
+    def __init__(self, *args, llegadas_por_minuto=4.0, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.llegadas_por_minuto = llegadas_por_minuto
+    
+    def tareas(self):
+        return [
+            (60.0 / self.llegadas_por_minuto, self.registrar_visitante),
+            (10, self.cargar_cola),
+            (5, self.cargar_chat),
+            (120, self.enviar_chat),
+        ]
+    
+    def registrar_visitante(self):
+        dni = str(self.rng.randint(20000000, 20000000 + 5000))
+        self.call('GET /turns/api/dni/<dni>/historial', 'GET', f'/turns/api/dni/{dni}/historial')
+        piso = self.rng.choices(['1', '2', '3'], weights=[6, 2, 3])[0]
+        self.call('POST /turns/api/turnos', 'POST', '/turns/api/turnos', json={
+            'nombre': f'{self.rng.choice(NOMBRES)} {self.rng.choice(APELLIDOS)}',
+            'dni': dni,
+            'area_key': self.rng.choice(AREAS_POR_PISO[piso]),
+            'motivo_texto': self.rng.choice(MOTIVOS),
+        })
+    
+    def cargar_cola(self):
+        self.call('GET /turns/api/turnos/en-espera', 'GET', '/turns/api/turnos/en-espera')
+        self.call('GET /turns/api/estadisticas/resumen', 'GET', '/turns/api/estadisticas/resumen')
+    
+    def cargar_chat(self):
+        self.call('GET /turns/api/chat/mensajes', 'GET', '/turns/api/chat/mensajes?limite=50')
+    
+    def enviar_chat(self):
+        self.call('POST /turns/api/chat/enviar', 'POST', '/turns/api/chat/enviar',
+                  json={'mensaje': 'Sube el siguiente', 'origen': 'recepcion'})
+
+class PantallaPiso(Pantalla):
+    """piso_llamado.html: espera y llamados cada 10s, chat cada 5s, llama y atiende"""
+    
+    def __init__(self, *args, piso='1', **kwargs):
+        super().__init__(*args, **kwargs)
+        self.piso = str(piso)
+        self.usuario = f'piso{self.piso}'
+        self.password = f'piso{self.piso}123'
+        self.en_espera = []
+        self.autorizados = []
+    
+    def tareas(self):
+        return [
+            (10, self.cargar_turnos),
+            (5, self.cargar_chat),
+            (20, self.llamar_siguiente),
+            (25, self.atender),
+        ]
+    
+    def cargar_turnos(self):
+        body = self.call('GET /turns/api/turnos?estado=ESPERA&piso=N', 'GET',
+                         f'/turns/api/turnos?estado=ESPERA&piso={self.piso}')
+        self.en_espera = [t['id'] for t in body.get('data', [])]
+        self.call('GET /turns/api/turnos?piso=N', 'GET', f'/turns/api/turnos?piso={self.piso}')
+    
+    def cargar_chat(self):
+        self.call('GET /turns/api/chat/mensajes', 'GET', '/turns/api/chat/mensajes?limite=50')
+    
+    def llamar_siguiente(self):
+        if not self.en_espera:
+            return
+        # La lista viene ordenada por llegada descendente: el más antiguo es el último
+        turno_id = self.en_espera.pop()
+        body = self.call('POST /turns/api/turnos/<id>/autorizar', 'POST', f'/turns/api/turnos/{turno_id}/autorizar',
+                         json={'llamado_por': self.usuario, 'atendido_por': f'Agente {self.piso}'})
+        if body.get('success'):
+            self.autorizados.append(turno_id)
+    
+    def atender(self):
+        if not self.autorizados:
+            return
+        turno_id = self.autorizados.pop(0)
+        self.call('POST /turns/api/turnos/<id>/atender', 'POST', f'/turns/api/turnos/{turno_id}/atender',
+                  json={'atendido_por': f'Agente {self.piso}'})
+
+class PantallaAdmin(Pantalla):
+    """estadisticas.html: refresca todas las estadísticas cada 30s"""
+    
+    usuario = 'admin'
+    password = 'admin123'
+    
+    def tareas(self):
+        return [(30, self.refrescar_estadisticas)]
+    
+    def refrescar_estadisticas(self):
+        self.call('GET /turns/estadisticas', 'GET', '/turns/estadisticas')
+        self.call('GET /turns/api/estadisticas/resumen', 'GET', '/turns/api/estadisticas/resumen')
+        self.call('GET /turns/api/estadisticas/por-piso', 'GET', '/turns/api/estadisticas/por-piso')
+        self.call('GET /turns/api/estadisticas/por-area', 'GET', '/turns/api/estadisticas/por-area')
+        self.call('GET /turns/api/estadisticas/por-motivo', 'GET', '/turns/api/estadisticas/por-motivo')
+        self.call('GET /turns/api/turnos?limit=20', 'GET', '/turns/api/turnos?limit=20')
@@ -13,10 +13,21 @@ class Config:
     JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY') or 'dev-jwt-secret-key-change-in-production'
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(hours=1)
     JWT_REFRESH_TOKEN_EXPIRES = timedelta(days=30)
+    # Cada cuánto recarga cada worker la lista (chica) de tokens revocados
+    TOKEN_REVOCATION_REFRESH_SECONDS = int(os.environ.get('TOKEN_REVOCATION_REFRESH_SECONDS', 5))
     
     # Database
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'sqlite:///turnero.db'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # Réplica de solo lectura para estadísticas y búsquedas (opcional)
+    SQLALCHEMY_BINDS = {'replica': os.environ['DATABASE_REPLICA_URL']} if os.environ.get('DATABASE_REPLICA_URL') else {}
+    # Tras escribir, el usuario lee de la primaria durante esta ventana (read-your-writes)
+    READ_YOUR_WRITES_SECONDS = int(os.environ.get('READ_YOUR_WRITES_SECONDS', 10))
+    # Con más atraso que esto se lee de la primaria; el atraso se mide cada REPLICA_LAG_CHECK_SECONDS
+    REPLICA_MAX_LAG_SECONDS = float(os.environ.get('REPLICA_MAX_LAG_SECONDS', 5))
+    REPLICA_LAG_CHECK_SECONDS = int(os.environ.get('REPLICA_LAG_CHECK_SECONDS', 5))
+    # Si la réplica falla, no se reintenta hasta pasado este tiempo
+    REPLICA_RETRY_SECONDS = int(os.environ.get('REPLICA_RETRY_SECONDS', 30))
     
     # Flask
     FLASK_ENV = os.environ.get('FLASK_ENV', 'production')
@@ -29,12 +40,34 @@ class Config:
     # App
     APP_NAME = os.environ.get('APP_NAME', 'Turnero Municipal')
     ITEMS_PER_PAGE = int(os.environ.get('ITEMS_PER_PAGE', 20))
+    EXPORT_CHUNK_SIZE = int(os.environ.get('EXPORT_CHUNK_SIZE', 1000))
+    
+    # Logging
+    LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
+    LOG_FILE = os.environ.get('LOG_FILE', 'logs/turnero.log')
+    LOG_MAX_BYTES = int(os.environ.get('LOG_MAX_BYTES', 10 * 1024 * 1024))
+    LOG_BACKUP_COUNT = int(os.environ.get('LOG_BACKUP_COUNT', 10))
+    
+    # Autocompletado de visitantes (índice en memoria por worker)
+    TYPEAHEAD_PRELOAD = os.environ.get('TYPEAHEAD_PRELOAD', 'True').lower() == 'true'
+    TYPEAHEAD_REFRESH_SECONDS = float(os.environ.get('TYPEAHEAD_REFRESH_SECONDS', 10))
+    TYPEAHEAD_TOP_K_MAX = 20
+    TYPEAHEAD_SCAN_LIMIT = 512
+    TYPEAHEAD_DELTA_MAX = 4096
+    
+    # Métricas e instrumentación
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'True').lower() == 'true'
+    SLOW_QUERY_MS = int(os.environ.get('SLOW_QUERY_MS', 200))
     
     # CSRF Protection
     WTF_CSRF_ENABLED = True
     WTF_CSRF_TIME_LIMIT = None
     
+    # Catálogo de áreas: cada cuántos segundos se verifica su versión en la base
+    CATALOG_VERSION_CHECK_SECONDS = float(os.environ.get('CATALOG_VERSION_CHECK_SECONDS', 5))
+    
     # Áreas/Pisos del edificio (normalizadas)
+    # Carga inicial de las tablas del catálogo; luego se administran desde /api/catalogo
     AREAS_MUNICIPALES_NORMALIZADAS = [
         {'key': 'TRABAJO_SOCIAL', 'nombre': 'Área de Trabajo Social', 'piso': '1', 'icon': '🧩'},
         {'key': 'POLITICAS_ALIMENTARIAS', 'nombre': 'Dirección de Políticas Alimentarias', 'piso': '1', 'icon': '🍎'},
@@ -94,6 +127,104 @@ class Config:
         'REUNION': 'REUNION',
     }
     
+    # Clases de prioridad de los turnos. 'ventaja_minutos' se suma al tiempo de espera al
+    # ordenar la cola del piso: un turno NORMAL que espera más que esa ventaja pasa
+    # delante de uno prioritario recién llegado (aging, sin inanición).
+    PRIORIDADES_TURNO = [
+        {'key': 'URGENTE', 'label': 'Urgente', 'ventaja_minutos': 60},
+        {'key': 'TURNO_PROGRAMADO', 'label': 'Con turno programado', 'ventaja_minutos': 30},
+        {'key': 'PREFERENCIAL', 'label': 'Adulto mayor / discapacidad', 'ventaja_minutos': 20},
+        {'key': 'NORMAL', 'label': 'Normal', 'ventaja_minutos': 0},
+    ]
+    PRIORIDAD_DEFAULT = 'NORMAL'
+    
+    # Prioridad mínima según el área de destino
+    PRIORIDAD_POR_AREA = {
+        'EMERGENCIA_ASISTENCIA_CRITICA': 'URGENTE',
+    }
+    
+    # Scheduler por piso: minutos de espera que "vale" cada minuto real (aging),
+    # peso relativo de cada área que comparte piso y penalización (en minutos) por
+    # cada turno llamado de más respecto del área menos atendida
+    SCHEDULER_AGING = float(os.environ.get('SCHEDULER_AGING', 1.0))
+    SCHEDULER_PESOS_AREA = {}
+    SCHEDULER_PENALIZACION_MINUTOS = float(os.environ.get('SCHEDULER_PENALIZACION_MINUTOS', 5))
+    
+    # Puestos de atención: al registrarse un turno se asigna solo al puesto LIBRE de su área
+    # que lleva más tiempo ocioso; al despachar se prueban hasta PUESTOS_CANDIDATOS turnos
+    # de la cola (los que otro puesto ganó de mano se saltean)
+    PUESTOS_DESPACHO_AUTOMATICO = os.environ.get('PUESTOS_DESPACHO_AUTOMATICO', 'True').lower() == 'true'
+    PUESTOS_CANDIDATOS = 5
+    
+    # Caché de lecturas frecuentes: LRU en memoria de cada worker y, si se indica un archivo,
+    # un nivel SQLite compartido por los workers de la máquina. Las invalidaciones por
+    # etiqueta llegan a los demás workers por ese archivo (cada CACHE_VERSIONES_SEGUNDOS) o
+    # por el bus de eventos en Postgres; sin ninguno de los dos, solo vence por TTL.
+    CACHE_ENABLED = os.environ.get('CACHE_ENABLED', 'True').lower() == 'true'
+    CACHE_TTL_SEGUNDOS = int(os.environ.get('CACHE_TTL_SEGUNDOS', 60))
+    CACHE_MEMORIA_MAX_ENTRADAS = int(os.environ.get('CACHE_MEMORIA_MAX_ENTRADAS', 2048))
+    CACHE_COMPARTIDA_PATH = os.environ.get('CACHE_COMPARTIDA_PATH', '')
+    CACHE_COMPARTIDA_MAX_ENTRADAS = int(os.environ.get('CACHE_COMPARTIDA_MAX_ENTRADAS', 20000))
+    CACHE_VERSIONES_SEGUNDOS = float(os.environ.get('CACHE_VERSIONES_SEGUNDOS', 1))
+    
+    # Snapshots (flask snapshot): directorio, tope de lectura en MB/s (0 = sin tope), filas
+    # por archivo y margen con el que los incrementales vuelven a leer cambios recientes
+    SNAPSHOT_DIR = os.environ.get('SNAPSHOT_DIR', 'snapshots')
+    SNAPSHOT_MAX_MB_S = float(os.environ.get('SNAPSHOT_MAX_MB_S', 2))
+    SNAPSHOT_FILAS_POR_ARCHIVO = int(os.environ.get('SNAPSHOT_FILAS_POR_ARCHIVO', 50000))
+    SNAPSHOT_MARGEN_SEGUNDOS = int(os.environ.get('SNAPSHOT_MARGEN_SEGUNDOS', 300))
+    
+    # Bus de eventos de turnos y chat: 'auto' usa LISTEN/NOTIFY si la base es Postgres
+    # (un mensaje llega a todos los workers/instancias) y si no un bus en proceso
+    EVENT_BUS_BACKEND = os.environ.get('EVENT_BUS_BACKEND', 'auto')
+    EVENT_BUS_CHANNEL = os.environ.get('EVENT_BUS_CHANNEL', 'turnero_eventos')
+    
+    # Notificaciones push: segundos que se juntan eventos del mismo tipo por destinatario
+    # antes de enviar un resumen, e intervalo mínimo entre pushes a un mismo dispositivo
+    NOTIFICACIONES_VENTANAS = {
+        'new_turn': 20,
+        'turn_authorized': 5,
+        'chat_message': 15,
+        'default': 10,
+    }
+    NOTIFICACIONES_INTERVALO_MINIMO = int(os.environ.get('NOTIFICACIONES_INTERVALO_MINIMO', 30))
+    
+    # Expo Push: endpoints (configurables para apuntar a un doble local) y recibos de entrega.
+    # Los recibos se piden pasada la demora recomendada por Expo y se descartan a las 24 h.
+    EXPO_PUSH_URL = os.environ.get('EXPO_PUSH_URL', 'https://exp.host/--/api/v2/push/send')
+    EXPO_RECEIPTS_URL = os.environ.get('EXPO_RECEIPTS_URL', 'https://exp.host/--/api/v2/push/getReceipts')
+    EXPO_RECEIPTS_DELAY_SECONDS = int(os.environ.get('EXPO_RECEIPTS_DELAY_SECONDS', 900))
+    EXPO_RECEIPTS_POLL_SECONDS = int(os.environ.get('EXPO_RECEIPTS_POLL_SECONDS', 0))
+    EXPO_RECEIPTS_EXPIRE_HOURS = 24
+    EXPO_RECEIPTS_RETENTION_DAYS = 7
+    
+    # Cliente HTTP del gateway de push: timeouts (conexión, lectura), reintentos con
+    # jitter y circuit breaker (fallos seguidos para abrir, segundos de enfriamiento)
+    PUSH_CONNECT_TIMEOUT = float(os.environ.get('PUSH_CONNECT_TIMEOUT', 2))
+    PUSH_READ_TIMEOUT = float(os.environ.get('PUSH_READ_TIMEOUT', 5))
+    PUSH_RETRIES = int(os.environ.get('PUSH_RETRIES', 2))
+    PUSH_BACKOFF_SECONDS = 0.25
+    PUSH_POOL_SIZE = int(os.environ.get('PUSH_POOL_SIZE', 10))
+    PUSH_BREAKER_THRESHOLD = int(os.environ.get('PUSH_BREAKER_THRESHOLD', 5))
+    PUSH_BREAKER_COOLDOWN_SECONDS = int(os.environ.get('PUSH_BREAKER_COOLDOWN_SECONDS', 30))
+    
+    # Turnos programados: semanas hacia adelante con franjas reservables y minutos de
+    # tolerancia alrededor de la franja para entrar a la cola como TURNO_PROGRAMADO
+    CITAS_HORIZONTE_SEMANAS = int(os.environ.get('CITAS_HORIZONTE_SEMANAS', 4))
+    CITAS_TOLERANCIA_MINUTOS = int(os.environ.get('CITAS_TOLERANCIA_MINUTOS', 15))
+    
+    # Pantalla pública del hall (/pantalla): llamados de los últimos LOBBY_VENTANA_MINUTOS
+    LOBBY_VENTANA_MINUTOS = int(os.environ.get('LOBBY_VENTANA_MINUTOS', 10))
+    LOBBY_MAX_LLAMADOS = int(os.environ.get('LOBBY_MAX_LLAMADOS', 8))
+    # max-age del snapshot y período de refresco de las pantallas
+    LOBBY_CACHE_SEGUNDOS = int(os.environ.get('LOBBY_CACHE_SEGUNDOS', 5))
+    
+    # Barrido de fin de jornada: a esta hora (local) los turnos que siguen en ESPERA o
+    # AUTORIZADO_SUBIR pasan a VENCIDO. BARRIDO_AUTOMATICO lo corre dentro de la app;
+    # si no, usar 'flask sweep-turns' desde cron.
+    BARRIDO_HORA_CORTE = os.environ.get('BARRIDO_HORA_CORTE', '20:00')
+    BARRIDO_AUTOMATICO = os.environ.get('BARRIDO_AUTOMATICO', 'False').lower() == 'true'
+    
     # Tipos de frecuencia de entrega
     FRECUENCIAS_ENTREGA = [
         {'value': 'semanal', 'label': 'Semanal'},
@@ -47,6 +47,14 @@ CREATE INDEX IF NOT EXISTS idx_visitor_turn_area_key ON visitor_turn(area_key);
 CREATE INDEX IF NOT EXISTS idx_visitor_turn_motivo_key ON visitor_turn(motivo_key);
 CREATE INDEX IF NOT EXISTS idx_visitor_turn_hora_llegada ON visitor_turn(hora_llegada);
 
+-- Prioridad del turno (ver PRIORIDADES_TURNO en config.py)
+ALTER TABLE visitor_turn ADD COLUMN IF NOT EXISTS prioridad VARCHAR(20) NOT NULL DEFAULT 'NORMAL';
+CREATE INDEX IF NOT EXISTS ix_visitor_turn_piso_estado ON visitor_turn(piso, estado);
+
+-- Huella de las filas importadas de planillas históricas (flask import-visits)
+ALTER TABLE visitor_turn ADD COLUMN IF NOT EXISTS import_hash VARCHAR(40);
+CREATE UNIQUE INDEX IF NOT EXISTS ix_visitor_turn_import_hash ON visitor_turn(import_hash);
+
 -- Tabla de mensajes de chat
 CREATE TABLE IF NOT EXISTS chat_message (
     id SERIAL PRIMARY KEY,
@@ -60,6 +68,234 @@ CREATE TABLE IF NOT EXISTS chat_message (
 -- Índices para chat_message
 CREATE INDEX IF NOT EXISTS idx_chat_message_timestamp ON chat_message(timestamp);
 
+-- Perfil de visitantes por DNI normalizado (autocompletar en recepción)
+CREATE TABLE IF NOT EXISTS visitor (
+    dni VARCHAR(20) PRIMARY KEY,
+    nombre VARCHAR(200) NOT NULL,
+    total_visitas INTEGER NOT NULL DEFAULT 0,
+    primera_visita TIMESTAMP WITH TIME ZONE,
+    ultima_visita TIMESTAMP WITH TIME ZONE,
+    ultima_area_key VARCHAR(100),
+    ultimo_motivo_key VARCHAR(100),
+    ultimo_motivo_texto VARCHAR(300),
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_visitor_updated_at ON visitor(updated_at);
+
+-- Catálogo de áreas (se carga desde config.py al iniciar la app si está vacío)
+CREATE TABLE IF NOT EXISTS area (
+    id SERIAL PRIMARY KEY,
+    key VARCHAR(100) UNIQUE NOT NULL,
+    nombre VARCHAR(200) NOT NULL,
+    piso VARCHAR(20),
+    icon VARCHAR(20),
+    orden INTEGER DEFAULT 0,
+    is_active BOOLEAN DEFAULT TRUE,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_area_piso ON area(piso);
+
+-- Variantes de texto libre para normalizar áreas y motivos
+CREATE TABLE IF NOT EXISTS catalog_variant (
+    id SERIAL PRIMARY KEY,
+    tipo VARCHAR(20) NOT NULL,
+    variante VARCHAR(300) NOT NULL,
+    clave VARCHAR(100) NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    CONSTRAINT uq_catalog_variant_tipo_variante UNIQUE (tipo, variante)
+);
+
+-- Versión de cada catálogo cacheado en memoria
+CREATE TABLE IF NOT EXISTS catalog_version (
+    nombre VARCHAR(50) PRIMARY KEY,
+    version INTEGER NOT NULL DEFAULT 1,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Turnos programados: plantillas semanales por área
+CREATE TABLE IF NOT EXISTS appointment_template (
+    id SERIAL PRIMARY KEY,
+    area_key VARCHAR(100) NOT NULL,
+    dia_semana INTEGER NOT NULL,
+    hora_inicio TIME NOT NULL,
+    hora_fin TIME NOT NULL,
+    duracion_minutos INTEGER NOT NULL DEFAULT 15,
+    capacidad INTEGER NOT NULL DEFAULT 1,
+    is_active BOOLEAN DEFAULT TRUE,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS ix_appointment_template_area_key ON appointment_template(area_key);
+
+-- Franjas reservables (hora local); 'completo' alimenta el índice de disponibilidad
+CREATE TABLE IF NOT EXISTS appointment_slot (
+    id SERIAL PRIMARY KEY,
+    area_key VARCHAR(100) NOT NULL,
+    template_id INTEGER REFERENCES appointment_template(id),
+    inicio TIMESTAMP NOT NULL,
+    fin TIMESTAMP NOT NULL,
+    capacidad INTEGER NOT NULL DEFAULT 1,
+    reservados INTEGER NOT NULL DEFAULT 0,
+    completo BOOLEAN NOT NULL DEFAULT FALSE,
+    CONSTRAINT uq_appointment_slot_area_inicio UNIQUE (area_key, inicio)
+);
+
+CREATE INDEX IF NOT EXISTS ix_appointment_slot_disponibilidad ON appointment_slot(area_key, completo, inicio);
+
+-- Reservas de visitantes
+CREATE TABLE IF NOT EXISTS appointment (
+    id SERIAL PRIMARY KEY,
+    slot_id INTEGER NOT NULL REFERENCES appointment_slot(id),
+    area_key VARCHAR(100) NOT NULL,
+    nombre VARCHAR(200) NOT NULL,
+    dni VARCHAR(20),
+    motivo_texto VARCHAR(300),
+    estado VARCHAR(20) NOT NULL DEFAULT 'RESERVADA',
+    turno_id INTEGER REFERENCES visitor_turn(id),
+    creado_por VARCHAR(150),
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS ix_appointment_slot_estado ON appointment(slot_id, estado);
+CREATE INDEX IF NOT EXISTS ix_appointment_dni ON appointment(dni);
+
+-- Tokens de dispositivos para notificaciones push
+CREATE TABLE IF NOT EXISTS device_token (
+    id SERIAL PRIMARY KEY,
+    user_id INTEGER NOT NULL REFERENCES "user"(id),
+    token VARCHAR(500) UNIQUE NOT NULL,
+    platform VARCHAR(20) NOT NULL,
+    created_at TIMESTAMP,
+    updated_at TIMESTAMP,
+    is_active BOOLEAN DEFAULT TRUE,
+    last_push_at TIMESTAMP
+);
+
+ALTER TABLE device_token ADD COLUMN IF NOT EXISTS last_push_at TIMESTAMP;
+
+-- Tickets de Expo pendientes de recibo de entrega
+CREATE TABLE IF NOT EXISTS push_ticket (
+    id SERIAL PRIMARY KEY,
+    ticket_id VARCHAR(100) UNIQUE NOT NULL,
+    token VARCHAR(500) NOT NULL,
+    tipo VARCHAR(50),
+    estado VARCHAR(20) NOT NULL DEFAULT 'PENDIENTE',
+    error VARCHAR(100),
+    enviado_at TIMESTAMP NOT NULL,
+    procesado_at TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS ix_push_ticket_estado_enviado ON push_ticket(estado, enviado_at);
+
+-- Tokens firmados revocados antes de vencer (se purgan al pasar expira_at)
+CREATE TABLE IF NOT EXISTS revoked_token (
+    jti VARCHAR(64) PRIMARY KEY,
+    tipo VARCHAR(10),
+    user_id INTEGER,
+    expira_at TIMESTAMP NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS ix_revoked_token_expira_at ON revoked_token(expira_at);
+
+-- Cubo de estadísticas históricas (flask build-stats); piso/motivo sin dato = ''
+CREATE TABLE IF NOT EXISTS turn_stats_hourly (
+    fecha DATE NOT NULL,
+    hora SMALLINT NOT NULL,
+    area_key VARCHAR(100) NOT NULL,
+    piso VARCHAR(20) NOT NULL,
+    motivo_key VARCHAR(100) NOT NULL,
+    estado VARCHAR(30) NOT NULL,
+    total INTEGER NOT NULL DEFAULT 0,
+    con_espera INTEGER NOT NULL DEFAULT 0,
+    espera_segundos BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (fecha, hora, area_key, piso, motivo_key, estado)
+);
+
+CREATE TABLE IF NOT EXISTS turn_stats_daily (
+    fecha DATE NOT NULL,
+    area_key VARCHAR(100) NOT NULL,
+    piso VARCHAR(20) NOT NULL,
+    motivo_key VARCHAR(100) NOT NULL,
+    estado VARCHAR(30) NOT NULL,
+    total INTEGER NOT NULL DEFAULT 0,
+    con_espera INTEGER NOT NULL DEFAULT 0,
+    espera_segundos BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (fecha, area_key, piso, motivo_key, estado)
+);
+
+-- Días construidos del cubo (los no construidos se agregan en vivo); los días con filas
+-- en el cubo ya estaban construidos
+CREATE TABLE IF NOT EXISTS turn_stats_day (
+    fecha DATE PRIMARY KEY,
+    construido_at TIMESTAMP
+);
+
+INSERT INTO turn_stats_day (fecha, construido_at)
+SELECT DISTINCT fecha, CURRENT_TIMESTAMP FROM turn_stats_daily
+ON CONFLICT (fecha) DO NOTHING;
+
+-- Progreso de procesos batch reanudables (flask renormalize)
+CREATE TABLE IF NOT EXISTS job_checkpoint (
+    nombre VARCHAR(50) PRIMARY KEY,
+    ultimo_id BIGINT NOT NULL DEFAULT 0,
+    version INTEGER,
+    updated_at TIMESTAMP
+);
+
+ALTER TABLE job_checkpoint ADD COLUMN IF NOT EXISTS pendiente_desde DATE;
+ALTER TABLE job_checkpoint ADD COLUMN IF NOT EXISTS pendiente_hasta DATE;
+
+-- Puestos de atención por piso y su rendimiento diario (app/desks.py)
+CREATE TABLE IF NOT EXISTS desk (
+    id SERIAL PRIMARY KEY,
+    nombre VARCHAR(100) NOT NULL UNIQUE,
+    piso VARCHAR(20) NOT NULL,
+    areas TEXT,
+    agente VARCHAR(150),
+    estado VARCHAR(20) NOT NULL DEFAULT 'CERRADO',
+    estado_desde TIMESTAMP,
+    turno_id INTEGER,
+    version INTEGER NOT NULL DEFAULT 0,
+    is_active BOOLEAN DEFAULT TRUE,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS ix_desk_piso ON desk(piso);
+
+CREATE TABLE IF NOT EXISTS desk_stats_daily (
+    desk_id INTEGER NOT NULL REFERENCES desk(id),
+    fecha DATE NOT NULL,
+    atendidos INTEGER NOT NULL DEFAULT 0,
+    ausentes INTEGER NOT NULL DEFAULT 0,
+    segundos_libre INTEGER NOT NULL DEFAULT 0,
+    segundos_ocupado INTEGER NOT NULL DEFAULT 0,
+    segundos_pausa INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (desk_id, fecha)
+);
+
+ALTER TABLE visitor_turn ADD COLUMN IF NOT EXISTS puesto_id INTEGER REFERENCES desk(id);
+CREATE INDEX IF NOT EXISTS ix_visitor_turn_puesto_id ON visitor_turn(puesto_id);
+
+-- Historial append-only de transiciones de turnos (flask replay-events)
+CREATE TABLE IF NOT EXISTS turn_event (
+    id SERIAL PRIMARY KEY,
+    turno_id INTEGER NOT NULL REFERENCES visitor_turn(id),
+    tipo VARCHAR(20) NOT NULL,
+    actor VARCHAR(150),
+    ts TIMESTAMP NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS ix_turn_event_turno_id ON turn_event(turno_id);
+CREATE INDEX IF NOT EXISTS ix_turn_event_ts_id ON turn_event(ts, id);
+
+-- Cambios de turnos desde la última marca de los snapshots incrementales (flask snapshot)
+CREATE INDEX IF NOT EXISTS ix_visitor_turn_updated_at ON visitor_turn(updated_at);
+
 -- ============================================
 -- Insertar usuarios por defecto
 -- ============================================
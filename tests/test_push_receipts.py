@@ -0,0 +1,134 @@
+"""
+Recibos de entrega de Expo contra un gateway local (http.server) que imita /send y
+/getReceipts: marcado OK/ERROR/EXPIRADO y desactivación de los dispositivos muertos.
+"""
+import json
+import threading
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import config
+from app import create_app, db
+from app.models import User
+from app.notifications import DeviceToken, PushTicket, send_push_notification
+from app.push_receipts import procesar_recibos
+
+VIVO = 'ExponentPushToken[vivo]'
+FALLA = 'ExponentPushToken[falla]'
+MUERTO = 'ExponentPushToken[muerto]'
+VIEJO = 'ExponentPushToken[viejo]'
+
+class _Expo(BaseHTTPRequestHandler):
+    """Gateway de prueba: un ticket 'ok' por mensaje y los recibos configurados en el servidor"""
+    
+    def do_POST(self):
+        cuerpo = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        if self.path == '/send':
+            self.server.enviados.extend(cuerpo)
+            datos = [{'status': 'ok', 'id': f"ticket-{m['to']}"} for m in cuerpo]
+        elif self.path == '/getReceipts':
+            self.server.consultados.append(cuerpo['ids'])
+            datos = {i: self.server.recibos[i] for i in cuerpo['ids'] if i in self.server.recibos}
+        else:
+            self.send_error(404)
+            return
+        respuesta = json.dumps({'data': datos}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(respuesta)))
+        self.end_headers()
+        self.wfile.write(respuesta)
+    
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def expo():
+    servidor = ThreadingHTTPServer(('127.0.0.1', 0), _Expo)
+    servidor.enviados, servidor.consultados, servidor.recibos = [], [], {}
+    hilo = threading.Thread(target=servidor.serve_forever, daemon=True)
+    hilo.start()
+    yield servidor
+    servidor.shutdown()
+    servidor.server_close()
+
+@pytest.fixture
+def app(expo, tmp_path, monkeypatch):
+    base = f'http://127.0.0.1:{expo.server_address[1]}'
+    monkeypatch.setattr(config.TestingConfig, 'SQLALCHEMY_DATABASE_URI', f"sqlite:///{tmp_path / 'test.db'}", raising=False)
+    monkeypatch.setattr(config.TestingConfig, 'EXPO_PUSH_URL', f'{base}/send', raising=False)
+    monkeypatch.setattr(config.TestingConfig, 'EXPO_RECEIPTS_URL', f'{base}/getReceipts', raising=False)
+    monkeypatch.setattr(config.TestingConfig, 'RATELIMIT_ENABLED', False, raising=False)
+    app = create_app('testing')
+    with app.app_context():
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+@pytest.fixture
+def usuario(app):
+    user = User(username='piso1', email='piso1@municipio.gob.ar', role='piso1')
+    user.set_password('piso1')
+    db.session.add(user)
+    db.session.flush()
+    for token in (VIVO, FALLA, MUERTO, VIEJO):
+        db.session.add(DeviceToken(user_id=user.id, token=token, platform='android'))
+    db.session.commit()
+    return user
+
+def _estado(token):
+    ticket = PushTicket.query.filter_by(token=token).one()
+    return ticket.estado, ticket.error
+
+def test_recibos_marcan_tickets_y_desactivan_dispositivos_muertos(app, expo, usuario):
+    resultado = send_push_notification(usuario.id, 'Nuevo turno', 'Prueba', data={'type': 'new_turn'})
+    assert resultado['success']
+    assert {m['to'] for m in expo.enviados} == {VIVO, FALLA, MUERTO, VIEJO}
+    assert PushTicket.query.filter_by(estado='PENDIENTE').count() == 4
+    
+    # El recibo del ticket viejo ya no está en Expo: pasado el vencimiento queda EXPIRADO
+    PushTicket.query.filter_by(token=VIEJO).update({'enviado_at': datetime.utcnow() - timedelta(days=2)})
+    db.session.commit()
+    expo.recibos.update({
+        f'ticket-{VIVO}': {'status': 'ok'},
+        f'ticket-{FALLA}': {'status': 'error', 'message': 'Límite', 'details': {'error': 'MessageRateExceeded'}},
+        f'ticket-{MUERTO}': {'status': 'error', 'message': 'Sin registro', 'details': {'error': 'DeviceNotRegistered'}},
+    })
+    
+    totales = procesar_recibos(app.config, ahora=datetime.utcnow() + timedelta(hours=1))
+    
+    assert totales == {'ok': 1, 'errores': 2, 'expirados': 1, 'desactivados': 1, 'lotes': 1}
+    assert _estado(VIVO) == ('OK', None)
+    assert _estado(FALLA) == ('ERROR', 'MessageRateExceeded')
+    assert _estado(MUERTO) == ('ERROR', 'DeviceNotRegistered')
+    assert _estado(VIEJO) == ('EXPIRADO', None)
+    activos = {d.token: d.is_active for d in DeviceToken.query.all()}
+    assert activos == {VIVO: True, FALLA: True, MUERTO: False, VIEJO: True}
+
+def test_recibos_respetan_demora_y_lote(app, expo, usuario):
+    send_push_notification(usuario.id, 'Nuevo turno', 'Prueba')
+    
+    # Antes de la demora mínima no se consulta nada
+    assert procesar_recibos(app.config)['lotes'] == 0
+    assert expo.consultados == []
+    
+    # Sin recibo todavía y sin vencer: siguen pendientes para la próxima corrida
+    totales = procesar_recibos(app.config, lote=3, ahora=datetime.utcnow() + timedelta(hours=1))
+    assert totales['lotes'] == 2
+    assert [len(ids) for ids in expo.consultados] == [3, 1]
+    assert PushTicket.query.filter_by(estado='PENDIENTE').count() == 4
+
+def test_desactivacion_masiva_de_muertos(app, expo, usuario):
+    send_push_notification(usuario.id, 'Nuevo turno', 'Prueba')
+    expo.recibos.update({
+        f'ticket-{token}': {'status': 'error', 'details': {'error': 'DeviceNotRegistered'}}
+        for token in (VIVO, FALLA, MUERTO, VIEJO)
+    })
+    
+    totales = procesar_recibos(app.config, ahora=datetime.utcnow() + timedelta(hours=1))
+    
+    assert totales['desactivados'] == 4
+    assert DeviceToken.query.filter_by(is_active=True).count() == 0
+    assert PushTicket.query.filter_by(estado='ERROR', error='DeviceNotRegistered').count() == 4